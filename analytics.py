@@ -0,0 +1,186 @@
+# analytics.py
+
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import config
+import quotes
+import stock_cache
+import upstream
+from holdings import group_by_symbol, lot_cost, lot_quantity
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_SECTOR = 'Unknown'
+
+# Overviews missing from the cache are fetched off the request path, one at a
+# time at background priority, so analytics never spends interactive quota on
+# sector labels.
+_overview_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics-overview')
+_overview_pending = set()
+_overview_lock = threading.Lock()
+
+
+def _fetch_overview(symbol, apikey):
+    try:
+        with upstream.default_priority(upstream.BACKGROUND):
+            data = upstream.fetch_json({'function': 'OVERVIEW', 'symbol': symbol,
+                                        'apikey': apikey or config.API_KEY})
+        if data.get('Symbol'):
+            stock_cache.set_json('overview', symbol, data)
+    except Exception as e:
+        logger.warning('Overview fetch for %s failed: %s', symbol, e)
+    finally:
+        with _overview_lock:
+            _overview_pending.discard(symbol)
+
+
+def sector_of(symbol, apikey=None):
+    """Sector from the cached OVERVIEW for ``symbol`` and when it was cached.
+    On a miss the overview is queued for a background fetch."""
+    data, stored_at = stock_cache.get_json('overview', symbol)
+    if data is not None:
+        return data.get('Sector') or UNKNOWN_SECTOR, stored_at
+    with _overview_lock:
+        if symbol in _overview_pending:
+            return UNKNOWN_SECTOR, None
+        _overview_pending.add(symbol)
+    _overview_pool.submit(_fetch_overview, symbol, apikey)
+    return UNKNOWN_SECTOR, None
+
+
+def memo_key(email):
+    return stock_cache.cache_key('analytics_positions', email)
+
+
+def result_key(email, stamp):
+    return stock_cache.cache_key('analytics', email, {'v': stamp})
+
+
+class PortfolioAnalytics:
+    """Market value, weights, unrealized P&L and sector exposure for a
+    user's portfolio.
+
+    Positions are summarised (shares, cost) per symbol and memoized by
+    version: the holding document's ``_etag`` plus the user document's for
+    lots still embedded there. Only positions whose version changed have
+    their lots read again; the rest come from the memo after one cheap
+    ``symbol, _etag`` query.
+
+    Prices come from the quote cache via ``quotes.get_many`` and sectors
+    from cached overviews. The finished result is cached under a digest of
+    every position's version, quote time and sector, so an unchanged
+    portfolio with unchanged prices is answered from one cache read, and a
+    change to one holding or one price re-reads only that position before
+    the aggregates are recomputed.
+    """
+
+    def __init__(self, holdings, apikey=None):
+        self.holdings = holdings
+        self.apikey = apikey
+
+    def _positions(self, email, legacy_lots, legacy_version):
+        versions = self.holdings.versions(email)
+        legacy = group_by_symbol(legacy_lots or [])
+        legacy.pop('', None)
+        memo = stock_cache.cache.get(memo_key(email)) or {}
+
+        positions, reread = {}, 0
+        for symbol in sorted(set(versions) | set(legacy)):
+            version = [versions.get(symbol), legacy_version if symbol in legacy else None]
+            cached = memo.get(symbol)
+            if cached is not None and cached['version'] == version:
+                positions[symbol] = cached
+                continue
+
+            lots = list(legacy.get(symbol, []))
+            if symbol in versions:
+                holding = self.holdings.get(email, symbol)
+                lots += holding.get('lots', []) if holding else []
+            costs = [lot_cost(lot) for lot in lots]
+            positions[symbol] = {
+                'version': version,
+                'quantity': sum(lot_quantity(lot) for lot in lots),
+                # Cost is only known if every lot says what it cost.
+                'cost': sum(costs) if costs and None not in costs else None,
+            }
+            reread += 1
+
+        if reread or len(positions) != len(memo):
+            stock_cache.cache.set(memo_key(email), positions, timeout=config.PORTFOLIO_MEMO_TTL)
+        return positions, reread
+
+    def compute(self, email, legacy_lots=(), legacy_version=None):
+        positions, reread = self._positions(email, legacy_lots, legacy_version)
+        symbols = list(positions)
+        prices = quotes.get_many(symbols, self.apikey) if symbols else {}
+        sectors = {symbol: sector_of(symbol, self.apikey) for symbol in symbols}
+
+        stamp = hashlib.sha1(json.dumps([
+            [symbol, positions[symbol]['version'], prices[symbol].get('asOf'), sectors[symbol][1]]
+            for symbol in symbols
+        ]).encode('utf-8')).hexdigest()
+        result = stock_cache.cache.get(result_key(email, stamp))
+        if result is None:
+            result = aggregate(email, positions, prices, sectors)
+            stock_cache.cache.set(result_key(email, stamp), result, timeout=stock_cache.ttl_for('quote'))
+        return dict(result, recomputedPositions=reread)
+
+
+def _nan_to_none(values):
+    return [None if v != v else v for v in values.tolist()]
+
+
+def aggregate(email, positions, prices, sectors):
+    symbols = list(positions)
+    quantity = np.array([positions[s]['quantity'] for s in symbols], dtype=np.float64)
+    cost = np.array([np.nan if positions[s]['cost'] is None else positions[s]['cost'] for s in symbols],
+                    dtype=np.float64)
+    price = np.array([quotes.price_of(prices[s]) for s in symbols], dtype=np.float64)
+
+    value = quantity * price
+    total_value = float(np.nansum(value))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        weight = value / total_value if total_value else np.full(len(symbols), np.nan)
+        pnl = value - cost
+        pnl_pct = pnl / cost * 100.0
+
+    # P&L totals only cover positions where both price and cost are known.
+    known = ~np.isnan(pnl)
+    total_cost = float(cost[known].sum())
+    total_pnl = float(pnl[known].sum())
+
+    names = [sectors[s][0] for s in symbols]
+    sector_names, index = np.unique(names, return_inverse=True) if symbols else ([], np.array([], int))
+    sector_value = np.bincount(index, weights=np.nan_to_num(value), minlength=len(sector_names))
+
+    rows = zip(symbols, quantity.tolist(), _nan_to_none(price), _nan_to_none(value),
+               _nan_to_none(cost), _nan_to_none(pnl), _nan_to_none(pnl_pct), _nan_to_none(weight), names)
+    return {
+        'email': email,
+        'asOf': time.time(),
+        'totals': {
+            'marketValue': total_value,
+            'costBasis': total_cost,
+            'unrealizedPnl': total_pnl,
+            'unrealizedPnlPct': total_pnl / total_cost * 100.0 if total_cost else None,
+            'positions': len(symbols),
+            'priced': int((~np.isnan(price)).sum()),
+        },
+        'positions': [
+            {'symbol': symbol, 'quantity': qty, 'price': p, 'marketValue': v, 'costBasis': c,
+             'unrealizedPnl': g, 'unrealizedPnlPct': gp, 'weight': w, 'sector': sector,
+             'quoteStatus': prices[symbol]['status']}
+            for symbol, qty, p, v, c, g, gp, w, sector in rows
+        ],
+        'sectors': [
+            {'sector': name, 'marketValue': float(v), 'weight': float(v) / total_value if total_value else None}
+            for name, v in sorted(zip(list(sector_names), sector_value.tolist()), key=lambda item: -item[1])
+        ],
+    }
@@ -1,6 +1,4 @@
 from flask import Flask, request, jsonify, session
-import requests
-from flask_caching import Cache
 from flask_cors import CORS
 import logging
 # from sentence_transformers import SentenceTransformer
@@ -12,15 +10,26 @@ import os
 import numpy as np
 import datetime
 from datetime import timedelta
-import bcrypt
 
 # Azure Cosmos DB
-import azure.cosmos.cosmos_client as cosmos_client_module
 import azure.cosmos.exceptions as exceptions
-from azure.cosmos.partition_key import PartitionKey
 import datetime
 
 from config import settings
+from db import collection, container
+import logging_setup
+import upstream
+import stock_cache
+import timeseries
+import indicators
+import news_ranking
+import quotes
+import retrieval
+import utils
+from analytics import PortfolioAnalytics
+from users import UserRepository
+import passwords
+from holdings import HoldingsConflict, HoldingsRepository, lot_quantity, lot_symbol
 
 def create_app():
     app = Flask(__name__)
@@ -32,8 +41,8 @@ def create_app():
     # app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=1)
     # jwt = JWTManager(app)
 
-    cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})
-    logging.basicConfig(level=logging.DEBUG)
+    stock_cache.init_app(app)
+    logging_setup.configure()
     # Initializing Embeddings model
     # embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
 
@@ -52,48 +61,17 @@ def create_app():
     # check_password_hash(hashed_password, password)
 
     # ------------- Logging ------------------
-
-    @app.before_request
-    def log_request_info():
-        app.logger.debug('--- Incoming Request ---')
-        app.logger.debug('Request Method: %s', request.method)
-        app.logger.debug('Request URL: %s', request.url)
-        app.logger.debug('Request Headers: %s', request.headers)
-        app.logger.debug('Request Body: %s', request.get_data())
-
-    @app.after_request
-    def log_response_info(response):
-        app.logger.debug('--- Outgoing Response ---')
-        app.logger.debug('Response Status: %s', response.status)
-        app.logger.debug('Response Headers: %s', response.headers)
-        app.logger.debug('Response Body: %s', response.get_data(as_text=True))
-        return response
+    # One structured access-log line per request; see logging_setup.py
+    logging_setup.init_app(app)
 
     #  -------------- Azure Initialization --------------
-    # Azure Cosmos DB settings
-    HOST = os.environ.get('ACCOUNT_HOST')
-    ACCOUNT_KEY = os.environ.get('ACCOUNT_KEY')
-    COSMOS_DATABASE = os.environ.get('COSMOS_DATABASE')
-    CONTAINER_ID = os.environ.get('COSMOS_CONTAINER')
-
-    # Initialize the Cosmos client
-    cosmos_client = cosmos_client_module.CosmosClient(HOST, {'masterKey': ACCOUNT_KEY})
-
-    # Get or create the database
-    try:
-        db = cosmos_client.create_database(id=COSMOS_DATABASE)
-        print('Database with id \'{0}\' created'.format(COSMOS_DATABASE))
-    except exceptions.CosmosResourceExistsError:
-        db = cosmos_client.get_database_client(COSMOS_DATABASE)
-        print('Database with id \'{0}\' was found'.format(COSMOS_DATABASE))
-
-    # Get or create the container
-    try:
-        container = db.create_container(id=CONTAINER_ID, partition_key=PartitionKey(path='/partitionKey'))
-        print('Container with id \'{0}\' created'.format(CONTAINER_ID))
-    except exceptions.CosmosResourceExistsError:
-        container = db.get_container_client(CONTAINER_ID)
-        print('Container with id \'{0}\' was found'.format(CONTAINER_ID))
+    # The container is opened on first use (see db.py); the database and
+    # container themselves are created once with `python provision.py`.
+    users = UserRepository(container)
+    holdings = HoldingsRepository(container)
+
+    # Semantic search over the Chroma collection the stock routes fill
+    retriever = retrieval.Retriever(collection, retrieval.QueryEmbeddings(utils.encode_batch))
 
     # -------------- Auth Routes --------------
 
@@ -106,6 +84,20 @@ def create_app():
     def not_found(e):
         return "<h1>404 Not Found</h1><p>The requested resource could not be found.</p>", 404
 
+    @app.errorhandler(passwords.PasswordPoolBusy)
+    def password_pool_busy(e):
+        response = jsonify({'message': str(e)})
+        response.status_code = 503
+        response.headers['Retry-After'] = e.retry_after_header
+        return response
+
+    @app.errorhandler(upstream.RateLimited)
+    def upstream_rate_limited(e):
+        response = jsonify({'error': str(e)})
+        response.status_code = 429
+        response.headers['Retry-After'] = e.retry_after_header
+        return response
+
 
 
     @app.route('/signup', methods=['POST'])
@@ -122,18 +114,13 @@ def create_app():
 
         # Check if user already exists
         try:
-            existing_user = list(container.query_items(
-                query="SELECT * FROM c WHERE c.email = @email",
-                parameters=[{"name": "@email", "value": email}],
-                enable_cross_partition_query=True
-            ))
-            if existing_user:
+            if users.exists(email):
                 return jsonify({"message": "Email already exists"}), 400
         except exceptions.CosmosHttpResponseError as e:
             return jsonify({"message": "Error checking user existence", "error": str(e)}), 500
 
-        # Hash the password
-        hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+        # Hash the password in the bcrypt pool, off the request thread
+        hashed_password = passwords.get_hasher().hash(password)
 
         # Create new user document with partitionKey
         new_user = {
@@ -141,7 +128,7 @@ def create_app():
             "partitionKey": email,  # Setting partitionKey to email
             "username": username,
             "email": email,
-            "password": hashed_password.decode('utf-8'),
+            "password": hashed_password,
             "gender": gender,
             "age": age,
             "investmentGoal": investment_goal,
@@ -151,8 +138,11 @@ def create_app():
 
         try:
             # Insert new user into Cosmos DB container
-            container.create_item(body=new_user)
+            users.create(new_user)
             return jsonify({"message": "User signed up successfully"}), 201
+        except exceptions.CosmosResourceExistsError:
+            # Lost a race with a concurrent signup for the same email
+            return jsonify({"message": "Email already exists"}), 400
         except exceptions.CosmosHttpResponseError as e:
             return jsonify({"message": "Error creating user", "error": str(e)}), 500
 
@@ -165,19 +155,21 @@ def create_app():
 
         # Retrieve user by email
         try:
-            user = list(container.query_items(
-                query=f"SELECT * FROM c WHERE c.email = '{email}'", enable_cross_partition_query=True
-            ))
+            user = users.get(email)
             if not user:
                 return jsonify({"message": "User not found"}), 400
-            user = user[0]  # There should be only one user with a unique email
         except exceptions.CosmosHttpResponseError as e:
             return jsonify({"message": "Error retrieving user", "error": str(e)}), 500
 
         # Check if password matches
-        if not bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+        hasher = passwords.get_hasher()
+        if not hasher.verify(password, user['password']):
             return jsonify({"message": "Invalid credentials"}), 400
 
+        # Upgrade hashes made at an old cost once we know the plaintext is right
+        if hasher.needs_rehash(user['password']):
+            hasher.rehash_later(password, lambda hashed: users.update_password(user, hashed))
+
         # Return user details in the response
         response_data = {
             "message": "Login successful",
@@ -189,6 +181,14 @@ def create_app():
 
     # API Key from environment variable
     API_KEY = os.environ.get('API_KEY', '9ZQUXAH9JOQRSQDV')
+    # Read by the async routes in asgi.py, which mount this app
+    app.config['ALPHA_VANTAGE_API_KEY'] = API_KEY
+
+    # News ranking weights and source credibility, loaded once
+    news_ranker = news_ranking.get_ranker()
+
+    # Portfolio analytics over holdings, cached quotes and overviews
+    portfolio_analytics = PortfolioAnalytics(holdings, API_KEY)
 
     # -------------- User Account Routes --------------
 
@@ -196,12 +196,9 @@ def create_app():
     def get_user_details(email):
         # Retrieve user by email
         try:
-            user = list(container.query_items(
-                query=f"SELECT * FROM c WHERE c.email = '{email}'", enable_cross_partition_query=True
-            ))
+            user = users.get(email)
             if not user:
                 return jsonify({"message": "User not found"}), 404
-            user = user[0]  # There should be only one user with a unique email
             # Exclude sensitive data like password
             user_details = {
                 "email": user['email'],
@@ -211,12 +208,66 @@ def create_app():
                 "investmentGoal": user['investmentGoal'],
                 "riskAppetite": user['riskAppetite'],
                 "timeHorizon": user['timeHorizon'],
-                "portfolio": user.get('portfolio', [])  # Include portfolio
             }
+            # Holdings live in their own documents; ?portfolio=false skips them
+            # for callers that page through /user/<email>/holdings instead.
+            if request.args.get('portfolio', 'true').lower() != 'false':
+                # Users not yet moved by migrate_holdings.py still carry an embedded array
+                user_details["portfolio"] = user.get('portfolio', []) + holdings.lots(email)
+                if request.args.get('valuation', 'false').lower() == 'true':
+                    user_details["valuation"] = value_portfolio(user_details["portfolio"])
             return jsonify(user_details), 200
         except exceptions.CosmosHttpResponseError as e:
             return jsonify({"message": "Error retrieving user details", "error": str(e)}), 500
 
+    def value_portfolio(lots):
+        shares = {}
+        for lot in lots:
+            symbol = lot_symbol(lot)
+            if symbol:
+                shares[symbol] = shares.get(symbol, 0.0) + lot_quantity(lot)
+
+        results = quotes.get_many(list(shares), API_KEY)
+        positions, total = [], 0.0
+        for symbol, quantity in shares.items():
+            price = quotes.price_of(results[symbol])
+            value = price * quantity if price is not None else None
+            total += value or 0.0
+            positions.append({"symbol": symbol, "quantity": quantity, "price": price,
+                              "value": value, "status": results[symbol]['status']})
+        return {"positions": positions, "totalValue": total,
+                "complete": all(p["price"] is not None for p in positions)}
+
+    @app.route('/user/<email>/holdings', methods=['GET'])
+    def list_holdings(email):
+        try:
+            limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        except ValueError:
+            return jsonify({"message": "limit must be an integer"}), 400
+
+        try:
+            page, continuation = holdings.list(email, limit=limit, continuation=request.args.get('continuation'))
+            return jsonify({"holdings": page, "continuation": continuation}), 200
+        except exceptions.CosmosHttpResponseError as e:
+            return jsonify({"message": "Error retrieving holdings", "error": str(e)}), 500
+
+    @app.route('/user/<email>/holdings/summary', methods=['GET'])
+    def get_holdings_summary(email):
+        try:
+            return jsonify(holdings.summary(email)), 200
+        except exceptions.CosmosHttpResponseError as e:
+            return jsonify({"message": "Error retrieving holdings", "error": str(e)}), 500
+
+    @app.route('/user/<email>/holdings/<symbol>', methods=['GET'])
+    def get_holding(email, symbol):
+        try:
+            holding = holdings.get(email, symbol)
+            if not holding:
+                return jsonify({"message": "Holding not found"}), 404
+            return jsonify(holding), 200
+        except exceptions.CosmosHttpResponseError as e:
+            return jsonify({"message": "Error retrieving holding", "error": str(e)}), 500
+
     @app.route('/user/<email>/portfolio', methods=['POST'])
     def add_stock_to_portfolio(email):
         data = request.get_json()
@@ -226,115 +277,140 @@ def create_app():
             return jsonify({"message": "No stock data provided"}), 400
 
         try:
-            # Retrieve user by id (which is the email)
-            user = list(container.query_items(
-                query=f"SELECT * FROM c WHERE c.id = '{email}'",
-                enable_cross_partition_query=True
-            ))
-            if not user:
+            if not users.exists(email):
                 return jsonify({"message": "User not found"}), 404
 
-            user = user[0]  # Assuming id (email) is unique
+            # Append a lot to the symbol's holding document
+            holdings.add(email, new_stock)
+            return jsonify({"message": "Stock added to portfolio successfully", "portfolio": holdings.lots(email)}), 200
 
-            # Update user's portfolio
-            portfolio = user.get('portfolio', [])
-            portfolio.append(new_stock)
-            user['portfolio'] = portfolio
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except HoldingsConflict as e:
+            return jsonify({"message": "Portfolio was modified concurrently, please retry", "error": str(e)}), 409
+        except exceptions.CosmosHttpResponseError as e:
+            return jsonify({"message": "Error updating portfolio", "error": str(e)}), 500
 
-            # Replace the user document in the database
-            container.replace_item(item=user, body=user)
+    @app.route('/user/<email>/portfolio/batch', methods=['POST'])
+    def batch_update_portfolio(email):
+        data = request.get_json() or {}
+        to_add = data.get('add', [])
+        to_remove = data.get('remove', [])
 
-            return jsonify({"message": "Stock added to portfolio successfully", "portfolio": portfolio}), 200
+        if not isinstance(to_add, list) or not isinstance(to_remove, list):
+            return jsonify({"message": "'add' and 'remove' must be lists"}), 400
+        if not to_add and not to_remove:
+            return jsonify({"message": "No portfolio changes provided"}), 400
 
+        try:
+            if not users.exists(email):
+                return jsonify({"message": "User not found"}), 404
+
+            # One transactional batch in the user's partition
+            holdings.apply(email, add=to_add, remove=to_remove)
+            return jsonify({"message": "Portfolio updated successfully", "portfolio": holdings.lots(email)}), 200
+
+        except ValueError as e:
+            return jsonify({"message": str(e)}), 400
+        except HoldingsConflict as e:
+            return jsonify({"message": "Portfolio was modified concurrently, please retry", "error": str(e)}), 409
         except exceptions.CosmosHttpResponseError as e:
             return jsonify({"message": "Error updating portfolio", "error": str(e)}), 500
 
+    @app.route('/user/<email>/portfolio/analytics', methods=['GET'])
+    def get_portfolio_analytics(email):
+        try:
+            user = users.get(email)
+            if not user:
+                return jsonify({"message": "User not found"}), 404
+
+            # Lots still embedded in the user document are versioned by its etag
+            legacy_lots = user.get('portfolio', [])
+            result = portfolio_analytics.compute(email, legacy_lots, user.get('_etag') if legacy_lots else None)
+            return jsonify(result), 200
+        except exceptions.CosmosHttpResponseError as e:
+            return jsonify({"message": "Error retrieving portfolio", "error": str(e)}), 500
+
     @app.route('/delete-portfolio/<email>', methods=['DELETE'])
     def delete_portfolio(email):
         try:
-            # Retrieve user by email
-            user_query = f"SELECT * FROM c WHERE c.email = '{email}'"
-            users = list(container.query_items(
-                query=user_query, enable_cross_partition_query=True
-            ))
-            if not users:
+            user = users.get(email)
+            if not user:
                 return jsonify({"message": "User not found"}), 404
-            user = users[0]  # There should be only one user with a unique email
-
-            # Set user's portfolio to an empty list
-            user['portfolio'] = []
 
-            # Update the user in the database
-            container.replace_item(item=user, body=user)
+            holdings.clear(email)
+            if 'portfolio' in user:
+                # Not migrated yet: drop the embedded array as well
+                users.remove_portfolio(user)
 
             return jsonify({"message": "User portfolio deleted successfully"}), 200
 
+        except exceptions.CosmosBatchOperationError as e:
+            # A position was added or removed while the batch ran.
+            return jsonify({"message": "Portfolio was modified concurrently, please retry", "error": str(e)}), 409
         except exceptions.CosmosHttpResponseError as e:
             return jsonify({"message": "Error deleting user portfolio", "error": str(e)}), 500
 
     # -------------- Stock Routes --------------
 
-    @cache.cached()
     @app.route('/stocks/quote', methods=['GET'])
+    @stock_cache.cached('quote')
     def get_stock_quote():
         symbol = request.args.get('symbol')
 
         if not symbol:
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        url = 'https://www.alphavantage.co/query'
-        params = {
-            'function': 'GLOBAL_QUOTE',
-            'symbol': symbol.upper(),
-            'apikey': API_KEY
-        }
-
-        response = requests.get(url, params=params)
-
-        if response.status_code != 200:
+        try:
+            data = quotes.fetch(symbol, API_KEY)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
-        # Generate embedding
-        data_text = json.dumps(data)  # Convert data to string
-        # embedding = generate_embedding(data_text)
-
         # Store in Chroma
         # collection.add(
         #     # embeddings=[embedding],
-        #     documents=[data_text],
+        #     documents=[json.dumps(data)],
         #     metadatas=[{'symbol': symbol}],
         #     ids=[symbol]  # Use the stock symbol as the ID
         # )
 
-        if 'Error Message' in data or 'Note' in data:
-            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        if 'Error Message' in data:
+            return jsonify({'error': data['Error Message']}), 400
 
         return jsonify(data)
 
-    @cache.cached()
+    @app.route('/stocks/quotes', methods=['GET'])
+    def get_stock_quotes():
+        try:
+            symbols = quotes.parse_symbols(request.args.get('symbols'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if not symbols:
+            return jsonify({'error': 'Please provide one or more comma-separated symbols.'}), 400
+
+        results = quotes.get_many(symbols, API_KEY)
+        return jsonify({'quotes': results}), 200
+
     @app.route('/stocks/overview', methods=['GET'])
+    @stock_cache.cached('overview')
     def get_stock_overview():
         symbol = request.args.get('symbol')
 
         if not symbol:
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        url = 'https://www.alphavantage.co/query'
         params = {
             'function': 'OVERVIEW',
             'symbol': symbol.upper(),
             'apikey': API_KEY
         }
 
-        response = requests.get(url, params=params)
-
-        if response.status_code != 200:
+        try:
+            data = upstream.fetch_json(params)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
         # Generate embedding
         data_text = json.dumps(data)  # Convert data to string
         # embedding = generate_embedding(data_text)
@@ -347,33 +423,30 @@ def create_app():
         #     ids=[f"{symbol}_overview"]
         # )
 
-        if 'Error Message' in data or 'Note' in data:
-            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        if 'Error Message' in data:
+            return jsonify({'error': data['Error Message']}), 400
 
         return jsonify(data)
 
-    @cache.cached()
     @app.route('/stocks/income_statement', methods=['GET'])
+    @stock_cache.cached('income_statement')
     def get_income_statement():
         symbol = request.args.get('symbol')
 
         if not symbol:
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        url = 'https://www.alphavantage.co/query'
         params = {
             'function': 'INCOME_STATEMENT',
             'symbol': symbol.upper(),
             'apikey': API_KEY
         }
 
-        response = requests.get(url, params=params)
-
-        if response.status_code != 200:
+        try:
+            data = upstream.fetch_json(params)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
         # Generate embedding
         data_text = json.dumps(data)  # Convert data to string
         # embedding = generate_embedding(data_text)
@@ -386,72 +459,58 @@ def create_app():
         #     ids=[f"{symbol}_income_statement"]
         # )
 
-        if 'Error Message' in data or 'Note' in data:
-            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        if 'Error Message' in data:
+            return jsonify({'error': data['Error Message']}), 400
 
         return jsonify(data)
 
-    @cache.cached()
     @app.route('/stocks/news', methods=['GET'])
+    @stock_cache.cached('news')
     def get_stock_news():
         symbol = request.args.get('symbol')
 
         if not symbol:
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        url = 'https://www.alphavantage.co/query'
-        params = {
-            'function': 'NEWS_SENTIMENT',
-            'tickers': symbol.upper(),
-            'apikey': API_KEY
-        }
-
-        response = requests.get(url, params=params)
+        rank = request.args.get('rank', 'false').lower() == 'true'
+        top_k = request.args.get('top_k')
+        try:
+            top_k = int(top_k) if top_k else None
+        except ValueError:
+            return jsonify({'error': f'Invalid top_k: {top_k}'}), 400
 
-        if response.status_code != 200:
+        try:
+            if rank:
+                data = news_ranking.ranked_feed(symbol, top_k, API_KEY, ranker=news_ranker)
+            else:
+                data = news_ranking.load_feed(symbol, API_KEY)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
-        # Generate embedding
-        data_text = json.dumps(data)  # Convert data to string
-        # embedding = generate_embedding(data_text)
-
-        # Store in Chroma
-        # collection.add(
-        #     # embeddings=[embedding],
-        #     documents=[data_text],
-        #     metadatas=[{'symbol': symbol}],
-        #     ids=[f"{symbol}_news"]
-        # )
-
-        if 'Error Message' in data or 'Note' in data:
-            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        if 'Error Message' in data:
+            return jsonify({'error': data['Error Message']}), 400
 
         return jsonify(data)
 
-    @cache.cached()
     @app.route('/stocks/insider_transactions', methods=['GET'])
+    @stock_cache.cached('insider_transactions')
     def get_insider_transactions():
         symbol = request.args.get('symbol')
 
         if not symbol:
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        url = 'https://www.alphavantage.co/query'
         params = {
             'function': 'INSIDER_TRANSACTIONS',
             'symbol': symbol.upper(),
             'apikey': API_KEY
         }
 
-        response = requests.get(url, params=params)
-
-        if response.status_code != 200:
+        try:
+            data = upstream.fetch_json(params)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
         # Generate embedding
         data_text = json.dumps(data)  # Convert data to string
         # embedding = generate_embedding(data_text)
@@ -464,60 +523,43 @@ def create_app():
         #     ids=[f"{symbol}_insider_transactions"]
         # )
 
-        if 'Error Message' in data or 'Note' in data:
-            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        if 'Error Message' in data:
+            return jsonify({'error': data['Error Message']}), 400
 
         return jsonify(data)
 
     @app.route('/stocks/time_series_monthly', methods=['GET'])
-    @cache.cached(timeout=300, query_string=True)  # Cache for 5 minutes
+    @stock_cache.cached('time_series_monthly')
     def get_stock_time_series_monthly():
         symbol = request.args.get('symbol')
         if not symbol:
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        url = 'https://www.alphavantage.co/query'
-        params = {
-            'function': 'TIME_SERIES_MONTHLY_ADJUSTED',
-            'symbol': symbol.upper(),
-            'apikey': API_KEY
-        }
+        layout = request.args.get('format', 'rows')
+        if layout not in timeseries.FORMATS:
+            return jsonify({'error': f'Invalid format: {layout}'}), 400
 
-        response = requests.get(url, params=params)
+        try:
+            window = timeseries.parse_window(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if window.get('resample') == 'W':
+            return jsonify({'error': 'Monthly bars cannot be resampled to weekly.'}), 400
 
-        if response.status_code != 200:
+        try:
+            bars = timeseries.load('TIME_SERIES_MONTHLY_ADJUSTED', symbol, API_KEY,
+                                   endpoint='time_series_monthly')
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
-        time_series_key = 'Monthly Adjusted Time Series'
-        if time_series_key not in data:
+        if bars is None:
             return jsonify({'error': 'No data found for the requested time series.'}), 400
 
-        time_series = data[time_series_key]
-
-        # Transform the data into a usable format
-        processed_data = [
-            {
-                'time': date,
-                'open': float(values['1. open']),
-                'high': float(values['2. high']),
-                'low': float(values['3. low']),
-                'close': float(values['4. close']),
-                'adjusted_close': float(values['5. adjusted close']),
-                'volume': int(values['6. volume']),
-                'dividend_amount': float(values['7. dividend amount']),
-            }
-            for date, values in time_series.items()
-        ]
-
-        # Sort by date ascending
-        processed_data.sort(key=lambda x: x['time'])
-
-        return jsonify({'symbol': symbol, 'data': processed_data})
+        bars = timeseries.apply_window(bars, **window)
+        return app.response_class(bars.to_json(symbol, layout), mimetype='application/json')
 
     @app.route('/stocks/time_series', methods=['GET'])
-    @cache.cached()
+    @stock_cache.cached('time_series')
     def get_stock_time_series():
         symbol = request.args.get('symbol')
         time_series_function = request.args.get('function', 'TIME_SERIES_DAILY')
@@ -530,52 +572,91 @@ def create_app():
         if time_series_function not in ['TIME_SERIES_DAILY', 'TIME_SERIES_WEEKLY', 'TIME_SERIES_MONTHLY']:
             return jsonify({'error': f'Invalid time series function: {time_series_function}'}), 400
 
-        url = 'https://www.alphavantage.co/query'
-        params = {
-            'function': time_series_function,
-            'symbol': symbol.upper(),
-            'apikey': API_KEY
-        }
+        outputsize = request.args.get('outputsize', 'compact')
+        if outputsize not in ['compact', 'full']:
+            return jsonify({'error': f'Invalid outputsize: {outputsize}'}), 400
 
-        response = requests.get(url, params=params)
+        layout = request.args.get('format', 'rows')
+        if layout not in timeseries.FORMATS:
+            return jsonify({'error': f'Invalid format: {layout}'}), 400
+
+        try:
+            window = timeseries.parse_window(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if window.get('resample') and time_series_function != 'TIME_SERIES_DAILY':
+            return jsonify({'error': 'resample is only supported on TIME_SERIES_DAILY.'}), 400
 
-        if response.status_code != 200:
+        try:
+            bars = timeseries.load(time_series_function, symbol, API_KEY, outputsize)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
+        if bars is None:
+            return jsonify({'error': 'No data found for the requested time series.'}), 400
+
+        bars = timeseries.apply_window(bars, **window)
+        return app.response_class(bars.to_json(symbol, layout), mimetype='application/json')
+
+    @app.route('/stocks/indicators', methods=['GET'])
+    @stock_cache.cached('indicators')
+    def get_stock_indicators():
+        symbol = request.args.get('symbol')
+        if not symbol:
+            return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-        # Extract relevant time-series data
-        time_series_key = {
-            'TIME_SERIES_DAILY': 'Time Series (Daily)',
-            'TIME_SERIES_WEEKLY': 'Weekly Time Series',
-            'TIME_SERIES_MONTHLY': 'Monthly Time Series'
-        }.get(time_series_function, 'Time Series (Daily)')
+        interval = request.args.get('interval', 'daily')
+        if interval not in indicators.INTERVALS:
+            return jsonify({'error': f'Invalid interval: {interval}'}), 400
+
+        outputsize = request.args.get('outputsize', 'compact')
+        if outputsize not in ['compact', 'full']:
+            return jsonify({'error': f'Invalid outputsize: {outputsize}'}), 400
 
-        if time_series_key not in data:
+        try:
+            requested = [indicators.parse_spec(spec)
+                         for spec in request.args.get('indicators', 'sma').split(',') if spec.strip()]
+            window = timeseries.parse_window(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not requested:
+            return jsonify({'error': 'Please provide at least one indicator.'}), 400
+        window.pop('resample', None)
+
+        try:
+            bars = timeseries.load('TIME_SERIES_DAILY', symbol, API_KEY, outputsize)
+        except upstream.UpstreamError:
+            return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
+
+        if bars is None:
             return jsonify({'error': 'No data found for the requested time series.'}), 400
 
-        time_series = data[time_series_key]
-
-        # Transform the data into a usable format
-        processed_data = [
-            {
-                'time': date,
-                'open': float(values['1. open']),
-                'high': float(values['2. high']),
-                'low': float(values['3. low']),
-                'close': float(values['4. close']),
-                'volume': int(values['5. volume']),
+        rule = indicators.INTERVALS[interval]
+        if rule:
+            bars = bars.resample(rule)
+
+        # Indicators run over the whole cached history; start/end/limit only
+        # trim what is returned, so the first points aren't warm-up NaNs.
+        shown = timeseries.apply_window(bars, **window)
+        offset = int(np.searchsorted(bars.dates, shown.dates[0])) if len(shown) else 0
+
+        results = {}
+        for indicator in requested:
+            columns = indicators.evaluate(symbol, interval, outputsize, indicator, bars)
+            results[indicator.spec] = {
+                name: indicators.column_json(values[offset:offset + len(shown)])
+                for name, values in columns.items()
             }
-            for date, values in time_series.items()
-        ]
-
-        # Sort by date ascending
-        processed_data.sort(key=lambda x: x['time'])
 
-        return jsonify({'symbol': symbol, 'data': processed_data})
+        return jsonify({
+            'symbol': symbol.upper(),
+            'interval': interval,
+            'time': shown.date_strings(),
+            'indicators': results,
+        })
 
-    @cache.cached()
     @app.route('/stocks/daily', methods=['GET'])
+    @stock_cache.cached('daily')
     def get_stock_daily():
         symbol = request.args.get('symbol')
         outputsize = request.args.get('outputsize', 'compact')
@@ -586,7 +667,6 @@ def create_app():
             return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
         # Prepare the API request to Alpha Vantage
-        url = 'https://www.alphavantage.co/query'
         params = {
             'function': 'TIME_SERIES_DAILY',
             'symbol': symbol.upper(),
@@ -595,15 +675,11 @@ def create_app():
             'apikey': API_KEY
         }
 
-        # Make the API request
-        response = requests.get(url, params=params)
-
-        # Check for request errors
-        if response.status_code != 200:
+        try:
+            data = upstream.fetch_json(params)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
         # Generate embedding
         data_text = json.dumps(data)
         # embedding = generate_embedding(data_text)
@@ -617,35 +693,29 @@ def create_app():
         # )
 
         # Check for API errors in the response
-        if 'Error Message' in data or 'Note' in data:
-            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        if 'Error Message' in data:
+            return jsonify({'error': data['Error Message']}), 400
 
         # Return the fetched data as JSON
         return jsonify(data)
 
     # -------------- Top Stocks & Chat Routes --------------
 
-    @cache.cached()
     @app.route('/stocks/top_movers', methods=['GET'])
+    @stock_cache.cached('top_movers')
     def get_top_movers():
-        url = 'https://www.alphavantage.co/query'
         params = {
             'function': 'TOP_GAINERS_LOSERS',
             'apikey': API_KEY
         }
 
-        app.logger.debug('Requesting Alpha Vantage API: %s', url)
-        app.logger.debug('Parameters: %s', params)
-
-        response = requests.get(url, params=params)
-        if response.status_code != 200:
+        # Top movers feed persistence rather than a user waiting on a quote,
+        # so let interactive routes go first when the quota is tight.
+        try:
+            data = upstream.fetch_json(params, priority=upstream.BACKGROUND)
+        except upstream.UpstreamError:
             return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-        data = response.json()
-
-        app.logger.debug('Alpha Vantage Response Status: %s', response.status_code)
-        app.logger.debug('Alpha Vantage Response Body: %s', response.text)
-
         # Top gainers, Top losers, and Top traders
         if 'top_gainers' in data and 'top_losers' in data and 'most_actively_traded' in data:
             top_gainers = data['top_gainers'][:10]
@@ -688,6 +758,24 @@ def create_app():
         else:
             return jsonify({'error': 'No data found for top gainers, losers, or most active.'}), 400
 
+    # -------------- Metrics Routes --------------
+
+    @app.route('/metrics/upstream', methods=['GET'])
+    def get_upstream_metrics():
+        return jsonify(upstream.stats())
+
+    @app.route('/metrics/cache', methods=['GET'])
+    def get_cache_metrics():
+        return jsonify(stock_cache.stats())
+
+    @app.route('/metrics/passwords', methods=['GET'])
+    def get_password_metrics():
+        return jsonify(passwords.get_hasher().stats())
+
+    @app.route('/metrics/query', methods=['GET'])
+    def get_query_metrics():
+        return jsonify(retriever.embeddings.stats())
+
     @app.after_request
     def after_request(response):
         response.headers.add('Access-Control-Allow-Origin', '*')
@@ -695,25 +783,24 @@ def create_app():
         response.headers.add('Access-Control-Allow-Methods', 'GET,POST,OPTIONS')
         return response
 
-    # @app.route('/query', methods=['POST'])
-    # def query_data():
-    #     data = request.get_json()
-    #     query_text = data.get('query')
-
-    #     if not query_text:
-    #         return jsonify({'error': 'Please provide a query in the request body.'}), 400
-
-    #     # Generate embedding for the query
-    #     # query_embedding = generate_embedding(query_text)
+    @app.route('/query', methods=['POST'])
+    def query_data():
+        data = request.get_json(silent=True)
+        try:
+            specs = retrieval.parse_queries(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-    #     # Query the vector database
-    #     # results = collection.query(
-    #     #     # query_embeddings=[query_embedding],
-    #     #     n_results=5,  # Number of results to return
-    #     #     include=['documents', 'metadatas']  # Include documents and metadata in the response
-    #     # )
+        try:
+            results = retriever.search(specs)
+        except Exception:
+            app.logger.exception('Vector search failed')
+            return jsonify({'error': 'Failed to query the vector database.'}), 500
 
-    #     return jsonify(results)
+        if 'queries' not in data:
+            return jsonify({'query': specs[0]['query'], 'results': results[0]})
+        return jsonify({'results': [{'query': spec['query'], 'results': hits}
+                                    for spec, hits in zip(specs, results)]})
 
     # -------------- ML Processing Routes --------------
 
@@ -726,74 +813,21 @@ def create_app():
         if not news_articles:
             return jsonify({'error': 'No news articles provided.'}), 400
 
+        top_k = data.get('topK', request.args.get('top_k'))
+        try:
+            top_k = int(top_k) if top_k is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': f'Invalid top_k: {top_k}'}), 400
+
         # Perform ranking
-        ranked_articles = rank_news_by_impact(news_articles)
+        ranked_articles = rank_news_by_impact(news_articles, top_k=top_k)
 
         return jsonify(ranked_articles), 200
 
-    def rank_news_by_impact(news_articles):
-        # Define weights for different factors
-        SENTIMENT_WEIGHT = 0.5
-        RECENCY_WEIGHT = 0.3
-        SOURCE_WEIGHT = 0.2
-
-        # Current date for recency calculation
-        current_time = datetime.datetime.utcnow()
-
-        # Predefined credibility scores for sources (example values)
-        source_credibility = {
-            'Reuters': 1.0,
-            'Bloomberg': 0.9,
-            'Wall Street Journal': 0.9,
-            'CNBC': 0.8,
-            'Yahoo Finance': 0.7,
-            'Motley Fool': 0.6,
-            'Seeking Alpha': 0.6,
-            'Benzinga': 0.5,
-            # Add more sources as needed
-        }
-
-        ranked_articles = []
-
-        for idx, article in enumerate(news_articles):
-            try:
-                # Sentiment score: Convert to absolute value to capture extreme sentiments
-                sentiment_score = abs(float(article.get('overall_sentiment_score', 0)))
-
-                # Recency score: Inverse of the time difference in hours
-                time_published = article.get('time_published')
-                # Parse time_published, expected format: '20241023T224500'
-                try:
-                    article_time = datetime.datetime.strptime(time_published, '%Y%m%dT%H%M%S')
-                    time_diff = (current_time - article_time).total_seconds() / 3600  # Time difference in hours
-                    recency_score = 1 / (1 + time_diff)
-                except ValueError as ve:
-                    app.logger.warning(f"Article {idx} has invalid time_published format: {time_published}. Setting recency_score to 0.")
-                    recency_score = 0  # If parsing fails, set recency to 0
-
-                # Source credibility score
-                source = article.get('source', '').strip()
-                credibility_score = source_credibility.get(source, 0.5)  # Default credibility is 0.5
-
-                # Calculate overall impact score
-                impact_score = (SENTIMENT_WEIGHT * sentiment_score +
-                                RECENCY_WEIGHT * recency_score +
-                                SOURCE_WEIGHT * credibility_score)
-
-                # Add impact_score to the article
-                ranked_article = article.copy()
-                ranked_article['impact_score'] = impact_score
-
-                ranked_articles.append(ranked_article)
-
-            except Exception as e:
-                app.logger.error(f"Error processing article {idx}: {e}")
-                continue  # Skip this article and proceed with others
-
-        # Sort articles by impact_score in descending order
-        ranked_articles = sorted(ranked_articles, key=lambda x: x.get('impact_score', 0), reverse=True)
-
-        return ranked_articles
+    def rank_news_by_impact(news_articles, top_k=None):
+        # news_ranker (built with the other services above) holds the weights
+        # and source credibility table, loaded once per app.
+        return news_ranker.rank(news_articles, top_k=top_k)
 
     return app
 
@@ -0,0 +1,234 @@
+# asgi.py
+#
+# Async serving mode: the I/O-bound stock proxy routes run as coroutines on
+# one event loop, with their upstream calls going through
+# async_upstream.AsyncUpstreamClient, so a single worker holds hundreds of
+# in-flight Alpha Vantage requests instead of one per thread. Every other
+# route is served by the Flask app, mounted underneath.
+#
+#   uvicorn asgi:create_app --factory --host 0.0.0.0 --port 5000
+
+import asyncio
+import contextlib
+import logging
+import time
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.wsgi import WSGIMiddleware
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+import config
+import logging_setup
+import quotes
+import stock_cache
+import upstream
+from async_upstream import AsyncUpstreamClient
+from ratelimit import BACKGROUND, INTERACTIVE, RateLimited
+
+logger = logging.getLogger(__name__)
+
+# Same headers app.py's after_request adds.
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Headers': 'Content-Type,Authorization',
+    'Access-Control-Allow-Methods': 'GET,POST,OPTIONS',
+}
+
+# endpoint -> (path, Alpha Vantage function, extra query parameters with defaults)
+PROXY_ROUTES = {
+    'quote': ('/stocks/quote', 'GLOBAL_QUOTE', {}),
+    'overview': ('/stocks/overview', 'OVERVIEW', {}),
+    'income_statement': ('/stocks/income_statement', 'INCOME_STATEMENT', {}),
+    'insider_transactions': ('/stocks/insider_transactions', 'INSIDER_TRANSACTIONS', {}),
+    'daily': ('/stocks/daily', 'TIME_SERIES_DAILY', {'outputsize': 'compact', 'datatype': 'json'}),
+}
+
+# The event loop only holds weak references to tasks; background refreshes
+# and quote fetches outliving their request are kept here until they finish.
+_background_tasks = set()
+
+
+def spawn(coro):
+    task = asyncio.ensure_future(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+def create_app(flask_app=None, client=None):
+    """The ASGI app: async stock routes in front of ``flask_app``.
+
+    Responses, error bodies, cache keys and cache entries are the ones the
+    Flask routes use, so both serving modes can share a cache backend and
+    clients can't tell them apart. Cache reads and writes run in the
+    threadpool, inside the Flask app context, which is where Flask-Caching
+    keeps its backend: the sqlite and redis backends block on I/O.
+    """
+    if flask_app is None:
+        from app import app as flask_app
+    client = client or AsyncUpstreamClient()
+    api_key = flask_app.config.get('ALPHA_VANTAGE_API_KEY') or config.API_KEY
+    refreshing = set()
+
+    def in_context(fn, *args):
+        with flask_app.app_context():
+            return fn(*args)
+
+    async def off_loop(fn, *args):
+        return await run_in_threadpool(in_context, fn, *args)
+
+    def json_body(data):
+        # Same bytes as jsonify.
+        with flask_app.app_context():
+            return (flask_app.json.dumps(data) + '\n').encode('utf-8')
+
+    def respond(body, status_code=200, media_type='application/json', headers=None):
+        return Response(body, status_code=status_code, media_type=media_type,
+                        headers=dict(CORS_HEADERS, **(headers or {})))
+
+    def error(message, status_code):
+        return respond(json_body({'error': message}), status_code)
+
+    def from_entry(entry, status):
+        headers = {'Age': str(int(time.time() - entry['stored_at'])), 'X-Cache': status}
+        if status != 'HIT':
+            headers['Warning'] = '110 - "Response is Stale"'
+        return respond(entry['body'], media_type=entry['mimetype'], headers=headers)
+
+    def proxy(function, extra):
+        async def produce(args, priority):
+            symbol = args.get('symbol')
+            if not symbol:
+                return error('Please provide the stock symbol as a parameter.', 400)
+
+            params = {'function': function, 'symbol': stock_cache.normalize_symbol(symbol)}
+            params.update({name: args.get(name, default) for name, default in extra.items()})
+            params['apikey'] = api_key
+
+            try:
+                data = await client.fetch_json(params, priority=priority)
+            except upstream.UpstreamError:
+                return error('Failed to fetch data from Alpha Vantage API.', 500)
+
+            if 'Error Message' in data:
+                return error(data['Error Message'], 400)
+            return respond(json_body(data))
+        return produce
+
+    async def refresh(key, endpoint, produce, args):
+        try:
+            response = await produce(args, BACKGROUND)
+            if response.status_code == 200:
+                await off_loop(stock_cache.store, key, endpoint, response.body, response.media_type)
+                stock_cache.record(endpoint, 'refreshes')
+            else:
+                stock_cache.record(endpoint, 'refresh_failures')
+        except Exception:
+            stock_cache.record(endpoint, 'refresh_failures')
+            logger.exception('Background refresh of %s failed', key)
+        finally:
+            refreshing.discard(key)
+
+    def cached(endpoint, produce):
+        # stock_cache.cached for coroutines; see there for the stale rules.
+        async def view(request):
+            args = request.query_params
+            key = stock_cache.args_cache_key(endpoint, args)
+            ttl = stock_cache.ttl_for(endpoint)
+            entry = await off_loop(stock_cache.cache.get, key)
+
+            if entry is not None:
+                age = time.time() - entry['stored_at']
+                if age < ttl:
+                    stock_cache.record(endpoint, 'hits')
+                    return from_entry(entry, 'HIT')
+                if age < 2 * ttl:
+                    stock_cache.record(endpoint, 'stale')
+                    if key not in refreshing:
+                        refreshing.add(key)
+                        spawn(refresh(key, endpoint, produce, args))
+                    return from_entry(entry, 'STALE')
+
+            try:
+                response = await produce(args, INTERACTIVE)
+            except RateLimited:
+                if entry is None:
+                    raise
+                response = None
+
+            if response is not None and response.status_code == 200:
+                stock_cache.record(endpoint, 'misses')
+                await off_loop(stock_cache.store, key, endpoint, response.body, response.media_type)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            if entry is not None:
+                stock_cache.record(endpoint, 'stale_if_error')
+                return from_entry(entry, 'STALE-IF-ERROR')
+
+            stock_cache.record(endpoint, 'misses')
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return view
+
+    async def fetch_quote(symbol, semaphore):
+        async with semaphore:
+            try:
+                data = await client.fetch_json({'function': 'GLOBAL_QUOTE', 'symbol': symbol,
+                                                'apikey': api_key})
+            except RateLimited as e:
+                return quotes.RATE_LIMITED, None, str(e), None
+            except upstream.UpstreamError as e:
+                return quotes.ERROR, None, str(e), None
+            except Exception as e:
+                logger.exception('Quote fetch for %s failed', symbol)
+                return quotes.ERROR, None, str(e), None
+        return await off_loop(quotes.outcome, symbol, data)
+
+    async def get_stock_quotes(request):
+        try:
+            symbols = quotes.parse_symbols(request.query_params.get('symbols'))
+        except ValueError as e:
+            return error(str(e), 400)
+
+        if not symbols:
+            return error('Please provide one or more comma-separated symbols.', 400)
+
+        # quotes.get_many with tasks instead of pool threads; unfinished
+        # fetches keep running after the timeout and still fill the cache.
+        results, stale, misses = await off_loop(quotes.lookup, symbols)
+        semaphore = asyncio.Semaphore(config.QUOTE_FANOUT_WORKERS)
+        tasks = {symbol: spawn(fetch_quote(symbol, semaphore)) for symbol in misses}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=config.QUOTE_BATCH_TIMEOUT)
+
+        outcomes = {symbol: task.result() for symbol, task in tasks.items() if task.done()}
+        results = await off_loop(quotes.merge, symbols, results, stale, outcomes)
+        return respond(json_body({'quotes': results}))
+
+    async def get_upstream_metrics(request):
+        return respond(json_body(client.stats()))
+
+    async def upstream_rate_limited(request, e):
+        return respond(json_body({'error': str(e)}), 429, headers={'Retry-After': e.retry_after_header})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        yield
+        await client.aclose()
+
+    flask_wsgi = WSGIMiddleware(flask_app)
+    routes = [Route(path, cached(endpoint, proxy(function, extra)), methods=['GET'])
+              for endpoint, (path, function, extra) in PROXY_ROUTES.items()]
+    routes += [
+        Route('/stocks/quotes', get_stock_quotes, methods=['GET']),
+        Route('/metrics/upstream/async', get_upstream_metrics, methods=['GET']),
+        Mount('/', app=flask_wsgi),
+    ]
+    # The mounted Flask app access-logs its own requests.
+    middleware = [Middleware(logging_setup.AccessLogMiddleware, exclude=[flask_wsgi])]
+    return Starlette(routes=routes, exception_handlers={RateLimited: upstream_rate_limited},
+                     middleware=middleware, lifespan=lifespan)
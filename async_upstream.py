@@ -0,0 +1,107 @@
+# async_upstream.py
+
+import asyncio
+import json
+import logging
+
+import aiohttp
+
+import config
+import upstream
+from ratelimit import INTERACTIVE, RateLimited
+from singleflight import AsyncSingleFlight
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class AsyncUpstreamClient:
+    """``upstream.UpstreamClient`` for the ASGI app.
+
+    One ``aiohttp`` session keeps up to ``UPSTREAM_ASYNC_MAX_CONNECTIONS``
+    keep-alive connections, so a single worker can have hundreds of Alpha
+    Vantage calls in flight while its event loop serves other requests. The
+    behaviour otherwise matches the sync client: connection errors and 5xx
+    are retried with exponential backoff, identical concurrent calls are
+    coalesced, every call takes a token from the same rate-limit scheduler
+    as the sync client in this process, and a quota response blocks the
+    scheduler and raises ``RateLimited``.
+    """
+
+    def __init__(self, base_url=None, max_connections=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None, scheduler=None):
+        self.base_url = base_url or config.ALPHA_VANTAGE_URL
+        self.max_connections = max_connections or config.UPSTREAM_ASYNC_MAX_CONNECTIONS
+        self.max_retries = max_retries if max_retries is not None else config.UPSTREAM_MAX_RETRIES
+        self.backoff_factor = backoff_factor if backoff_factor is not None else config.UPSTREAM_BACKOFF_FACTOR
+        self.timeout = aiohttp.ClientTimeout(
+            sock_connect=connect_timeout if connect_timeout is not None else config.UPSTREAM_CONNECT_TIMEOUT,
+            sock_read=read_timeout if read_timeout is not None else config.UPSTREAM_READ_TIMEOUT,
+        )
+        self.flight = AsyncSingleFlight()
+        self.scheduler = scheduler if scheduler is not None else upstream.get_client().scheduler
+        self._session = None
+
+    def session(self):
+        # Created on first use: an aiohttp session belongs to the running loop.
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def get(self, params):
+        """``(status, body)`` for a GET with ``params``, retrying connection
+        errors, timeouts and 5xx with exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session().get(self.base_url, params=params) as response:
+                    status, body = response.status, await response.read()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt == self.max_retries:
+                    raise upstream.UpstreamError(str(e) or type(e).__name__) from e
+            else:
+                if status not in RETRY_STATUSES or attempt == self.max_retries:
+                    return status, body
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+
+    async def fetch_json(self, params, coalesce=True, priority=INTERACTIVE):
+        if not coalesce:
+            return await self._fetch_json(params, priority)
+        return await self.flight.do(upstream.request_key(params), lambda: self._fetch_json(params, priority))
+
+    async def _fetch_json(self, params, priority):
+        if self.scheduler is not None:
+            await self.scheduler.acquire_async(priority)
+
+        status, body = await self.get(params)
+
+        logger.debug('Alpha Vantage %s -> %s', params.get('function'), status)
+
+        if status != 200:
+            raise upstream.UpstreamError(f'Alpha Vantage returned HTTP {status}')
+
+        try:
+            data = json.loads(body)
+        except ValueError as e:
+            raise upstream.UpstreamError('Alpha Vantage returned a non-JSON body') from e
+
+        if upstream.is_quota_response(data):
+            cooldown = config.UPSTREAM_QUOTA_COOLDOWN
+            if self.scheduler is not None:
+                await self.scheduler.block_async(cooldown)
+            raise RateLimited(data.get('Note') or data.get('Information'), cooldown)
+
+        return data
+
+    def stats(self):
+        stats = {'singleflight': self.flight.stats()}
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.stats()
+        return stats
+
+    async def aclose(self):
+        if self._session is not None:
+            await self._session.close()
@@ -1,12 +1,22 @@
 # auth.py
 
 from flask import Blueprint, request, jsonify, session
-import bcrypt
 from db import container
+from users import UserRepository
+import passwords
 import azure.cosmos.exceptions as exceptions
 
 auth_bp = Blueprint('auth', __name__)
 
+users = UserRepository(container)
+
+@auth_bp.errorhandler(passwords.PasswordPoolBusy)
+def password_pool_busy(e):
+    response = jsonify({"message": str(e)})
+    response.status_code = 503
+    response.headers['Retry-After'] = e.retry_after_header
+    return response
+
 @auth_bp.route('/signup', methods=['POST'])
 def signup():
     data = request.get_json()
@@ -21,23 +31,19 @@ def signup():
 
     # Check if user already exists
     try:
-        existing_user = list(container.query_items(
-            query=f"SELECT * FROM c WHERE c.email = '{email}'", enable_cross_partition_query=True
-        ))
-        if existing_user:
+        if users.exists(email):
             return jsonify({"message": "Email already exists"}), 400
     except exceptions.CosmosHttpResponseError as e:
         return jsonify({"message": "Error checking user existence", "error": str(e)}), 500
 
-    # Hash the password
-    hashed_password = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
+    # Hash the password in the bcrypt pool, off the request thread
+    hashed_password = passwords.get_hasher().hash(password)
 
-    # Create new user document
+    # Create new user document (id and partitionKey are both the email)
     new_user = {
-        "id": email,  # Using email as the unique identifier
         "username": username,
         "email": email,
-        "password": hashed_password.decode('utf-8'),
+        "password": hashed_password,
         "gender": gender,
         "age": age,
         "investmentGoal": investment_goal,
@@ -47,8 +53,10 @@ def signup():
 
     try:
         # Insert new user into Cosmos DB container
-        container.create_item(body=new_user)
+        users.create(new_user)
         return jsonify({"message": "User signed up successfully"}), 201
+    except exceptions.CosmosResourceExistsError:
+        return jsonify({"message": "Email already exists"}), 400
     except exceptions.CosmosHttpResponseError as e:
         return jsonify({"message": "Error creating user", "error": str(e)}), 500
 
@@ -61,19 +69,21 @@ def login():
 
     # Retrieve user by email
     try:
-        user = list(container.query_items(
-            query=f"SELECT * FROM c WHERE c.email = '{email}'", enable_cross_partition_query=True
-        ))
+        user = users.get(email)
         if not user:
             return jsonify({"message": "User not found"}), 400
-        user = user[0]  # There should be only one user with a unique email
     except exceptions.CosmosHttpResponseError as e:
         return jsonify({"message": "Error retrieving user", "error": str(e)}), 500
 
     # Check if password matches
-    if not bcrypt.checkpw(password.encode('utf-8'), user['password'].encode('utf-8')):
+    hasher = passwords.get_hasher()
+    if not hasher.verify(password, user['password']):
         return jsonify({"message": "Invalid credentials"}), 400
 
+    # Upgrade hashes made at an old cost once we know the plaintext is right
+    if hasher.needs_rehash(user['password']):
+        hasher.rehash_later(password, lambda hashed: users.update_password(user, hashed))
+
     # Store user information in session
     session['user_id'] = user['email']
     session['username'] = user['username']
@@ -0,0 +1,113 @@
+# benchmarks/bench_access_log.py
+#
+# Per-request overhead of request logging on a small JSON route and on a
+# ~2 MB one (a full daily time series is about that size), for:
+#
+#   off       no logging hooks
+#   legacy    the old before/after_request hooks at DEBUG, logging headers
+#             and whole bodies through a synchronous handler
+#   access    logging_setup: one JSON line per request via the queue
+#   sampled   the same with ACCESS_LOG_SAMPLE_RATE=0.1
+#
+# Log output goes to /dev/null. Each mode runs in its own interpreter so
+# their logging configurations don't mix; times are the best of 5 rounds.
+# The access log's writer thread is included: on a single core its JSON
+# encoding still competes with the request threads.
+#
+#   python benchmarks/bench_access_log.py [requests]
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ('off', 'legacy', 'access', 'sampled')
+
+PROBE = r'''
+import json, logging, os, sys, time
+from flask import Flask, jsonify, request
+
+import logging_setup
+
+mode, count = sys.argv[1], int(sys.argv[2])
+app = Flask(__name__)
+sink = open(os.devnull, 'w')
+
+if mode == 'legacy':
+    logging.basicConfig(level=logging.DEBUG, stream=sink)
+
+    @app.before_request
+    def log_request_info():
+        app.logger.debug('--- Incoming Request ---')
+        app.logger.debug('Request Method: %s', request.method)
+        app.logger.debug('Request URL: %s', request.url)
+        app.logger.debug('Request Headers: %s', request.headers)
+        app.logger.debug('Request Body: %s', request.get_data())
+
+    @app.after_request
+    def log_response_info(response):
+        app.logger.debug('--- Outgoing Response ---')
+        app.logger.debug('Response Status: %s', response.status)
+        app.logger.debug('Response Headers: %s', response.headers)
+        app.logger.debug('Response Body: %s', response.get_data(as_text=True))
+        return response
+elif mode in ('access', 'sampled'):
+    logging_setup.configure(stream=sink)
+    logging_setup.init_app(app, logging_setup.AccessLog(sample_rate=0.1 if mode == 'sampled' else 1.0))
+
+small = json.dumps({'Global Quote': {'01. symbol': 'AAPL', '05. price': '123.45'}}).encode()
+bar = {'1. open': '123.4500', '2. high': '125.0000', '3. low': '122.1000', '4. close': '124.3300', '5. volume': '51234567'}
+large = json.dumps({'Time Series (Daily)': {f'day-{i:05d}': bar for i in range(13000)}}).encode()
+
+@app.route('/small')
+def small_route():
+    return app.response_class(small, mimetype='application/json')
+
+@app.route('/large')
+def large_route():
+    return app.response_class(large, mimetype='application/json')
+
+client = app.test_client()
+result = {'large_bytes': len(large)}
+for path in ('/small', '/large'):
+    n = count if path == '/small' else max(count // 20, 20)
+    for _ in range(min(n, 50)):
+        client.get(path)
+    best = float('inf')
+    for _ in range(5):
+        start = time.perf_counter()
+        for _ in range(n):
+            client.get(path)
+        best = min(best, (time.perf_counter() - start) / n * 1e6)
+        logging_setup.flush()
+    result[path] = best
+
+result['dropped'] = logging_setup.dropped()
+print(json.dumps(result))
+'''
+
+
+def probe(mode, count):
+    out = subprocess.run([sys.executable, '-c', PROBE, mode, str(count)], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    # Interleave the modes over a few runs and keep each one's best, so a
+    # noisy moment doesn't land on a single mode.
+    runs = [{mode: probe(mode, count) for mode in MODES} for _ in range(3)]
+    results = {mode: {key: min(run[mode][key] for run in runs) for key in runs[0][mode]} for mode in MODES}
+    size = results['off']['large_bytes'] / 1e6
+
+    print(f'{"mode":<10} {"small us/req":>13} {"overhead":>9} {f"{size:.1f} MB us/req":>15} {"overhead":>9}')
+    for mode in MODES:
+        r, base = results[mode], results['off']
+        print(f'{mode:<10} {r["/small"]:13.1f} {r["/small"] - base["/small"]:9.1f} '
+              f'{r["/large"]:15.1f} {r["/large"] - base["/large"]:9.1f}')
+
+
+if __name__ == '__main__':
+    main()
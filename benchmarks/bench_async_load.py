@@ -0,0 +1,187 @@
+# benchmarks/bench_async_load.py
+#
+# Load test of /stocks/quote served by the sync deployment (Flask, one
+# worker with GUNICORN_THREADS request threads, like the Procfile's gthread
+# worker) and by the async serving mode (asgi.py under uvicorn, one worker),
+# against a local upstream stub that answers after a fixed delay. The stub
+# and the load generator are event-loop based, so neither needs a thread per
+# connection and the numbers are about the servers under test.
+#
+# Every request asks for a new symbol, so each one misses the cache and
+# waits on the stub; throughput is then bounded by how many upstream calls a
+# worker can hold in flight. gunicorn isn't needed: the sync server is
+# werkzeug with a fixed pool of handler threads, which is what gthread does.
+#
+#   python benchmarks/bench_async_load.py [requests] [concurrency] [latency_ms]
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'simple')
+
+import aiohttp
+
+from stub_server import serve_async_stub
+
+SYNC_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+STUB_PORT = 5100
+
+
+def run_stub(latency, ready):
+    asyncio.run(serve_async_stub(STUB_PORT, latency, ready=ready))
+
+
+def flask_app(stub_url):
+    from flask import Flask, jsonify, request
+
+    import quotes
+    import stock_cache
+    import upstream
+
+    upstream._client = upstream.UpstreamClient(base_url=stub_url, pool_size=SYNC_THREADS)
+    app = Flask(__name__)
+    stock_cache.init_app(app)
+    app.config['ALPHA_VANTAGE_API_KEY'] = 'bench'
+
+    # Same view as app.py's /stocks/quote.
+    @app.route('/stocks/quote')
+    @stock_cache.cached('quote')
+    def get_stock_quote():
+        symbol = request.args.get('symbol')
+        if not symbol:
+            return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
+        try:
+            data = quotes.fetch(symbol, 'bench')
+        except upstream.UpstreamError:
+            return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
+        if 'Error Message' in data or 'Note' in data:
+            return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+        return jsonify(data)
+
+    return app
+
+
+def serve_sync(port, stub_url, ready):
+    from werkzeug.serving import BaseWSGIServer
+
+    class PooledServer(BaseWSGIServer):
+        # A fixed number of request threads; further connections wait.
+        pool = ThreadPoolExecutor(max_workers=SYNC_THREADS)
+        request_queue_size = 1024
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = PooledServer('127.0.0.1', port, flask_app(stub_url))
+    ready.set()
+    server.serve_forever()
+
+
+def serve_async(port, stub_url, ready):
+    import uvicorn
+
+    import asgi
+    from async_upstream import AsyncUpstreamClient
+
+    app = asgi.create_app(flask_app(stub_url), client=AsyncUpstreamClient(base_url=stub_url))
+    config = uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning',
+                            access_log=False, backlog=1024)
+    server = uvicorn.Server(config)
+
+    async def main():
+        task = asyncio.ensure_future(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.05)
+        ready.set()
+        await task
+
+    asyncio.run(main())
+
+
+async def load(base, total, concurrency, tag):
+    latencies, failures = [], 0
+    symbols = iter(range(total))
+    connector = aiohttp.TCPConnector(limit=concurrency)
+
+    async with aiohttp.ClientSession(base, connector=connector) as session:
+        async def worker():
+            nonlocal failures
+            for i in symbols:
+                start = time.perf_counter()
+                async with session.get('/stocks/quote', params={'symbol': f'{tag}{i}'}) as response:
+                    await response.read()
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status != 200 or response.headers.get('X-Cache') != 'MISS':
+                    failures += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'rps': total / elapsed,
+        'p50': statistics.median(latencies),
+        'p99': latencies[int(len(latencies) * 0.99) - 1],
+        'failures': failures,
+    }
+
+
+def run(target, port, stub_url, total, concurrency, tag):
+    ready = multiprocessing.Event()
+    proc = multiprocessing.Process(target=target, args=(port, stub_url, ready), daemon=True)
+    proc.start()
+    ready.wait()
+    try:
+        return asyncio.run(load(f'http://127.0.0.1:{port}', total, concurrency, tag))
+    finally:
+        proc.terminate()
+        proc.join()
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    latency = (int(sys.argv[3]) if len(sys.argv) > 3 else 200) / 1000
+
+    ready = multiprocessing.Event()
+    stub = multiprocessing.Process(target=run_stub, args=(latency, ready), daemon=True)
+    stub.start()
+    ready.wait()
+    stub_url = f'http://127.0.0.1:{STUB_PORT}/query'
+
+    try:
+        # The sync server is slow enough that a fraction of the requests shows its ceiling.
+        sync = run(serve_sync, 5101, stub_url, max(total // 10, concurrency), concurrency, 'SYNC')
+        async_ = run(serve_async, 5102, stub_url, total, concurrency, 'ASYNC')
+    finally:
+        stub.terminate()
+        stub.join()
+
+    print(f'{concurrency} concurrent clients, upstream latency {latency * 1000:.0f} ms, all cache misses')
+    print(f'{"mode":<28} {"req/s":>8} {"p50 ms":>9} {"p99 ms":>9} {"errors":>7}')
+    for name, r in ((f'sync ({SYNC_THREADS} threads)', sync), ('async (uvicorn, 1 worker)', async_)):
+        print(f'{name:<28} {r["rps"]:8.1f} {r["p50"]:9.1f} {r["p99"]:9.1f} {r["failures"]:7d}')
+
+
+if __name__ == '__main__':
+    main()
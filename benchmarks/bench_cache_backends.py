@@ -0,0 +1,70 @@
+# benchmarks/bench_cache_backends.py
+#
+# Compares the stock cache backends on a realistic cached response (a daily
+# time-series body): set/get latency, bytes stored per entry, and that the
+# SQLite store stays under its size bound. The Redis backend runs against an
+# in-memory stand-in with the redis-py API (tests/redis_standin.py), so no
+# server is needed.
+#
+#   python benchmarks/bench_cache_backends.py [entries]
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from cachelib import SimpleCache
+
+from cache_backends import CompactRedisCache, SQLiteLRUCache, compact_dumps
+from redis_standin import RedisStandIn
+
+
+def sample_entry(symbol, rng):
+    rows = [
+        {'time': f'2024-{m:02d}-{d:02d}', 'open': rng.uniform(100, 200), 'high': rng.uniform(100, 200),
+         'low': rng.uniform(100, 200), 'close': rng.uniform(100, 200), 'volume': rng.randint(1e6, 9e7)}
+        for m in range(1, 13) for d in range(1, 29)
+    ]
+    body = json.dumps({'symbol': symbol, 'data': rows}).encode('utf-8')
+    return {'body': body, 'mimetype': 'application/json'}
+
+
+def run(name, cache, entries):
+    start = time.perf_counter()
+    for key, value in entries:
+        cache.set(key, value, timeout=300)
+    set_ms = (time.perf_counter() - start) * 1000 / len(entries)
+
+    start = time.perf_counter()
+    hits = sum(cache.get(key) is not None for key, _ in entries)
+    get_ms = (time.perf_counter() - start) * 1000 / len(entries)
+    print(f'{name:24} set={set_ms:.3f}ms get={get_ms:.3f}ms hits={hits}/{len(entries)}')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rng = random.Random(3)
+    entries = [(f'stock:time_series:SYM{i}', sample_entry(f'SYM{i}', rng)) for i in range(count)]
+
+    raw = len(entries[0][1]['body'])
+    print(f'payload: raw body {raw} bytes, compact serialized {len(compact_dumps(entries[0][1]))} bytes')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run('simple (per worker)', SimpleCache(threshold=count * 2), entries)
+        run('redis (stand-in)', CompactRedisCache(host=RedisStandIn()), entries)
+        run('sqlite (shared)', SQLiteLRUCache(os.path.join(tmp, 'cache.sqlite3')), entries)
+
+        bound = 20 * len(compact_dumps(entries[0][1]))
+        bounded = SQLiteLRUCache(os.path.join(tmp, 'bounded.sqlite3'), max_bytes=bound)
+        run('sqlite (20-entry bound)', bounded, entries)
+        print(f'bounded store: {bounded.size_bytes()} bytes used of {bound}')
+
+
+if __name__ == '__main__':
+    main()
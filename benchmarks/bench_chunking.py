@@ -0,0 +1,165 @@
+# benchmarks/bench_chunking.py
+#
+# Embed calls per hour for the stored stock data of a watchlist kept warm by
+# the stock cache, which refetches each endpoint once per TTL (30 s quotes,
+# 15 min news, 1 h daily series, 6 h overviews, 12 h income statements).
+# Between fetches, quotes move, each news feed gains two articles and drops
+# its two oldest, and everything else is unchanged.
+#
+# Each fetch goes through embedding_pipeline with chunking.chunk_payload and
+# ContentHashes, into an in-memory store. Only calls are counted; nothing is
+# encoded. Three strategies are compared:
+#
+#   whole      the old behaviour: json.dumps of each payload, one per fetch
+#   chunked    chunk_payload without dedup: every chunk of every fetch
+#   deduped    chunk_payload with ContentHashes: changed chunks only
+#
+# The first simulated hour fills the store and is reported separately; the
+# steady state is the average of the 12 hours after it, which include the
+# overview and income statement refetches. With --model (and --offline, see
+# embedding_fixture.py), the deduped hour's chunks are also encoded for a
+# CPU-time estimate.
+#
+#   python benchmarks/bench_chunking.py [symbols] [--model] [--offline]
+
+import argparse
+import json
+import random
+import time
+
+import embedding_fixture
+
+import chunking
+from config import STOCK_CACHE_TTLS
+from embedding_pipeline import EmbeddingPipeline
+
+FEED_SIZE = 50
+NEW_ARTICLES = 2
+
+ENDPOINTS = (
+    ('GLOBAL_QUOTE', 'quote'),
+    ('NEWS_SENTIMENT', 'news'),
+    ('TIME_SERIES_DAILY', 'daily'),
+    ('OVERVIEW', 'overview'),
+    ('INCOME_STATEMENT', 'income_statement'),
+)
+
+
+class Source:
+    """Upstream payloads for one symbol as they evolve over time."""
+
+    def __init__(self, symbol, seed):
+        rng = random.Random(seed)
+        self.symbol = symbol
+        self.rng = rng
+        self.articles = embedding_fixture.news_feed(rng, symbol, articles=FEED_SIZE + 400)['feed']
+        self.fixed = {
+            'OVERVIEW': embedding_fixture.overview(rng, symbol),
+            'INCOME_STATEMENT': embedding_fixture.income_statement(rng, symbol),
+            'TIME_SERIES_DAILY': embedding_fixture.daily_series(rng, symbol),
+        }
+
+    def payload(self, function, fetch):
+        if function == 'GLOBAL_QUOTE':
+            return {'Global Quote': {'01. symbol': self.symbol, '05. price': f'{self.rng.uniform(50, 400):.4f}',
+                                     '06. volume': str(self.rng.randint(10**6, 10**8))}}
+        if function == 'NEWS_SENTIMENT':
+            start = fetch * NEW_ARTICLES
+            return {'items': str(FEED_SIZE), 'feed': self.articles[start:start + FEED_SIZE][::-1]}
+        return self.fixed[function]
+
+
+def fetches(symbols, hour):
+    """(function, symbol, fetch number) for every refetch during ``hour``."""
+    for function, endpoint in ENDPOINTS:
+        ttl = STOCK_CACHE_TTLS[endpoint]
+        for fetch in range(-(-hour * 3600 // ttl), -(-(hour + 1) * 3600 // ttl)):
+            for symbol in symbols:
+                yield function, symbol, fetch
+
+
+def simulate(sources, hours):
+    store = {}
+    encoded = []
+
+    def encode_batch(texts):
+        encoded.extend(texts)
+        return [None] * len(texts)
+
+    def write_batch(ids, embeddings, documents, metadatas):
+        for chunk_id, metadata in zip(ids, metadatas):
+            store[chunk_id] = metadata[chunking.HASH_FIELD]
+
+    def lookup(ids):
+        return {chunk_id: store[chunk_id] for chunk_id in ids if chunk_id in store}
+
+    pipeline = EmbeddingPipeline(encode_batch, write_batch, batch_size=64, max_wait=0, queue_size=100000,
+                                 prepare=chunking.chunk_payload, hashes=chunking.ContentHashes(lookup))
+    per_hour = []
+    for hour in range(hours):
+        counts = {'fetches': 0, 'whole': 0, 'chunked': 0, 'deduped': 0}
+        before = len(encoded)
+        start = time.perf_counter()
+        for function, symbol, fetch in fetches(list(sources), hour):
+            data = sources[symbol].payload(function, fetch)
+            metadata = {'symbol': symbol, 'function': function}
+            doc_id = f'{symbol}_{function}'
+            counts['fetches'] += 1
+            counts['whole'] += 1
+            counts['chunked'] += len(chunking.chunk_payload(doc_id, data, metadata))
+            pipeline.submit(doc_id, data, metadata)
+        pipeline.join()
+        counts['deduped'] = len(encoded) - before
+        counts['prepare_ms'] = (time.perf_counter() - start) * 1000
+        counts['texts'] = encoded[before:]
+        per_hour.append(counts)
+    return per_hour, pipeline.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('symbols', type=int, nargs='?', default=20)
+    parser.add_argument('--model', action='store_true')
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    names = embedding_fixture.SYMBOLS
+    symbols = [f'{names[i % len(names)]}{i // len(names) or ""}' for i in range(args.symbols)]
+    sources = {symbol: Source(symbol, seed) for seed, symbol in enumerate(symbols)}
+    per_hour, stats = simulate(sources, hours=13)
+
+    keys = ('fetches', 'whole', 'chunked', 'deduped', 'prepare_ms')
+    steady = {key: sum(counts[key] for counts in per_hour[1:]) / len(per_hour[1:]) for key in keys}
+    texts = [text for counts in per_hour[1:] for text in counts['texts']]
+
+    print(f'{len(sources)} symbols, embed calls per hour')
+    print(f'{"hour":<14} {"fetches":>8} {"whole":>8} {"chunked":>8} {"deduped":>8} {"saved":>8}')
+    for label, counts in (('first (cold)', per_hour[0]), ('steady (avg)', steady)):
+        print(f'{label:<14} {counts["fetches"]:8.0f} {counts["whole"]:8.0f} {counts["chunked"]:8.0f} '
+              f'{counts["deduped"]:8.0f} {counts["chunked"] - counts["deduped"]:8.0f}')
+    print(f'steady hour prepare + dedup time: {steady["prepare_ms"]:.0f} ms')
+    print(f'pipeline counters: {json.dumps({key: stats[key] for key in ("chunks", "unchanged", "embedded")})}')
+
+    if args.model:
+        model = embedding_fixture.load_model(args.offline)
+        # One steady hour's worth of chunks, sampled across the simulated hours.
+        sample = random.Random(1).sample(texts, round(steady['deduped']))
+        model.encode(sample[:8])
+        start = time.perf_counter()
+        model.encode(sample, batch_size=32)
+        elapsed = time.perf_counter() - start
+        rate = len(sample) / elapsed
+        print(f'encode, deduped chunks: {elapsed:.1f} CPU s/hour ({rate:.1f} chunks/s); '
+              f'without dedup about {steady["chunked"] / rate:.0f} CPU s/hour')
+
+        wholes = [json.dumps(sources[symbol].payload(function, fetch))
+                  for function, symbol, fetch in fetches(list(sources), 1)]
+        sample = random.Random(1).sample(wholes, 128)
+        start = time.perf_counter()
+        model.encode(sample, batch_size=32)
+        rate = len(sample) / (time.perf_counter() - start)
+        print(f'encode, whole payloads: about {steady["whole"] / rate:.0f} CPU s/hour ({rate:.1f} docs/s)')
+
+
+if __name__ == '__main__':
+    main()
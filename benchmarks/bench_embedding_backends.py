@@ -0,0 +1,181 @@
+# benchmarks/bench_embedding_backends.py
+#
+# Accuracy against latency for each EMBED_BACKEND (see embedding_backends.py)
+# on the documents the app stores: fixture payloads split by
+# chunking.chunk_payload, and short search queries against them.
+#
+#   accuracy   cosine similarity of each document's embedding to the torch
+#              fp32 one (mean and worst), and recall@10: how many of each
+#              query's 10 nearest documents under torch the backend also
+#              ranks in its top 10
+#   latency    one query embedded at a time (what /query pays), p50 and p95
+#   throughput documents per second at EMBED_BATCH_SIZE (what the
+#              background pipeline gets)
+#   memory     peak RSS of a process holding only that backend, and the
+#              model file's size
+#
+# Each backend and thread count runs in its own process, so memory and
+# thread pools are measured in isolation. The ONNX export is written to a
+# temporary directory unless --onnx-dir is given.
+#
+#   python benchmarks/bench_embedding_backends.py [documents] [--threads 1,4] [--offline]
+#
+# With --offline (see embedding_fixture.py) the model has random weights:
+# latency, throughput and memory stand in for the real model's, and the
+# accuracy figures measure only how far each backend drifts from torch.
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import embedding_fixture
+
+import chunking
+import config
+import embedding_backends
+
+QUERIES = ('revenue growth guidance for next quarter', 'insider selling by executives',
+           'analyst downgrade after earnings miss', 'dividend increase and buyback',
+           'chip demand from cloud customers', 'regulators open antitrust lawsuit',
+           'price target raised on ai demand', 'consumer spending slowdown hurts margins',
+           'AAPL annual income statement', 'NVDA daily prices', 'MSFT company profile',
+           'net income fell year over year')
+RECALL_AT = 10
+
+
+def stored_documents(count):
+    texts = []
+    for function, symbol, payload in embedding_fixture.payloads(count):
+        doc_id = f'{symbol}_{function.lower()}'
+        texts += [chunk.text for chunk in chunking.chunk_payload(doc_id, payload, {'symbol': symbol,
+                                                                                   'function': function})]
+    return texts
+
+
+def model_size(backend, model_dir):
+    if backend == 'torch':
+        return None
+    return os.path.getsize(os.path.join(model_dir, embedding_backends.ONNX_FILES[backend])) / 2**20
+
+
+def peak_rss_mb():
+    # ru_maxrss survives exec on Linux, so it would report the parent's peak.
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(args):
+    """Runs in a child process: load one backend, time it, save its
+    embeddings for the parent to compare."""
+    with open(os.path.join(args.workdir, 'texts.json')) as f:
+        texts = json.load(f)
+    start = time.perf_counter()
+    backend = embedding_backends.load_backend(args.worker, args.worker_threads, model_name=args.model,
+                                              model_dir=args.onnx_dir)
+    loaded = time.perf_counter() - start
+
+    backend.encode(texts['documents'][:config.EMBED_BATCH_SIZE], config.EMBED_BATCH_SIZE)
+    start = time.perf_counter()
+    documents = backend.encode(texts['documents'], config.EMBED_BATCH_SIZE)
+    throughput = len(texts['documents']) / (time.perf_counter() - start)
+
+    latencies = []
+    for _ in range(args.repeat):
+        for query in QUERIES:
+            start = time.perf_counter()
+            backend.encode([query], 1)
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    out = os.path.join(args.workdir, f'{args.worker}-{args.worker_threads}.npz')
+    np.savez(out, documents=documents, queries=backend.encode(list(QUERIES), len(QUERIES)))
+    print(json.dumps({
+        'load_s': loaded, 'throughput': throughput,
+        'p50_ms': statistics.median(latencies), 'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'rss_mb': peak_rss_mb(), 'threads': backend.threads,
+        'embeddings': out,
+    }))
+
+
+def run(args, backend, threads):
+    command = [sys.executable, os.path.abspath(__file__), '--worker', backend, '--worker-threads', str(threads),
+               '--model', args.model, '--onnx-dir', args.onnx_dir, '--workdir', args.workdir,
+               '--repeat', str(args.repeat)]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def accuracy(reference, result):
+    documents = np.load(result['embeddings'])
+    cosines = np.sum(reference['documents'] * documents['documents'], axis=1)
+    top = lambda embeddings: np.argsort(-(embeddings['queries'] @ embeddings['documents'].T), axis=1)[:, :RECALL_AT]
+    recall = np.mean([len(set(a) & set(b)) / RECALL_AT for a, b in zip(top(reference), top(documents))])
+    return float(np.mean(cosines)), float(np.min(cosines)), float(recall)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('documents', nargs='?', type=int, default=40, help='fixture payloads to chunk')
+    parser.add_argument('--threads', default=','.join(str(n) for n in sorted({1, os.cpu_count() or 1})))
+    parser.add_argument('--backends', default=','.join(embedding_backends.BACKENDS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--onnx-dir')
+    parser.add_argument('--offline', action='store_true')
+    # Internal: one backend, run by the parent in a child process.
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-threads', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--model', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        return worker(args)
+
+    args.workdir = tempfile.mkdtemp(prefix='bench-backends-')
+    if args.offline:
+        args.model = os.path.join(args.workdir, 'model')
+        embedding_fixture.offline_model().save(args.model)
+    else:
+        args.model = config.EMBED_MODEL
+    args.onnx_dir = args.onnx_dir or os.path.join(args.workdir, 'onnx')
+    if not os.path.exists(os.path.join(args.onnx_dir, embedding_backends.ONNX_FILES['onnx-int8'])):
+        embedding_backends.export_onnx(args.model, args.onnx_dir)
+
+    documents = stored_documents(args.documents)
+    with open(os.path.join(args.workdir, 'texts.json'), 'w') as f:
+        json.dump({'documents': documents}, f)
+    print(f'{len(documents)} stored chunks from {args.documents} payloads, {len(QUERIES)} queries, '
+          f'{os.cpu_count()} CPUs')
+
+    thread_counts = [int(n) for n in args.threads.split(',')]
+    backends = args.backends.split(',')
+    results = {('torch', thread_counts[0]): run(args, 'torch', thread_counts[0])}
+    reference = np.load(results['torch', thread_counts[0]]['embeddings'])
+
+    print(f'{"backend":<10} {"threads":>7} {"cos mean":>9} {"cos min":>9} {"recall@10":>9} {"p50 ms":>7} '
+          f'{"p95 ms":>7} {"docs/s":>7} {"load s":>6} {"RSS MB":>7} {"file MB":>7}')
+    for backend in backends:
+        for threads in thread_counts:
+            result = results.get((backend, threads)) or run(args, backend, threads)
+            mean, worst, recall = accuracy(reference, result)
+            size = model_size(backend, args.onnx_dir)
+            print(f'{backend:<10} {result["threads"]:>7} {mean:9.5f} {worst:9.5f} {recall:9.3f} '
+                  f'{result["p50_ms"]:7.1f} {result["p95_ms"]:7.1f} {result["throughput"]:7.1f} '
+                  f'{result["load_s"]:6.1f} {result["rss_mb"]:7.0f} {"-" if size is None else f"{size:.1f}":>7}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# benchmarks/bench_embedding_pipeline.py
+#
+# Embedding throughput on CPU at batch sizes 1, 16 and 64, first for bare
+# encode calls and then end to end through embedding_pipeline into an
+# in-memory Chroma collection. Also compares what a request pays for
+# storing its upstream response: the old inline encode + add, against
+# queueing it for the pipeline.
+#
+#   python benchmarks/bench_embedding_pipeline.py [documents] [--offline]
+#
+# --offline uses a random-weight model with MiniLM's architecture (see
+# embedding_fixture.py) for machines without access to the model hub.
+
+import argparse
+import statistics
+import time
+
+import embedding_fixture
+
+from embedding_pipeline import EmbeddingPipeline
+
+BATCH_SIZES = (1, 16, 64)
+
+
+def encode_throughput(model, docs, batch_size):
+    start = time.perf_counter()
+    for i in range(0, len(docs), batch_size):
+        model.encode(docs[i:i + batch_size], batch_size=batch_size)
+    return len(docs) / (time.perf_counter() - start)
+
+
+def pipeline_throughput(model, collection, docs, batch_size):
+    def encode_batch(texts):
+        return model.encode(texts, batch_size=len(texts)).tolist()
+
+    def write_batch(ids, embeddings, documents, metadatas):
+        collection.add(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    pipeline = EmbeddingPipeline(encode_batch, write_batch, batch_size=batch_size,
+                                 max_wait=0.05, queue_size=len(docs))
+    start = time.perf_counter()
+    for i, doc in enumerate(docs):
+        pipeline.submit(f'b{batch_size}-{i}', doc, {'symbol': 'TEST'})
+    pipeline.join()
+    elapsed = time.perf_counter() - start
+    assert pipeline.stats()['embedded'] == len(docs)
+    return len(docs) / elapsed
+
+
+def request_cost(model, collection, docs):
+    inline = []
+    for i, doc in enumerate(docs):
+        start = time.perf_counter()
+        embedding = model.encode([doc])[0].tolist()
+        collection.add(ids=[f'inline-{i}'], embeddings=[embedding], documents=[doc], metadatas=[{'symbol': 'TEST'}])
+        inline.append((time.perf_counter() - start) * 1000)
+
+    # Nothing consumes this pipeline: only the enqueue is measured.
+    pipeline = EmbeddingPipeline(lambda texts: None, lambda *args: None, queue_size=len(docs) + 1)
+    pipeline._thread = object()
+    queued = []
+    for i, doc in enumerate(docs):
+        start = time.perf_counter()
+        pipeline.submit(f'queued-{i}', doc, {'symbol': 'TEST'})
+        queued.append((time.perf_counter() - start) * 1000)
+    return statistics.median(inline), statistics.median(queued)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('documents', type=int, nargs='?', default=256)
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    import chromadb
+    import torch
+
+    docs = embedding_fixture.documents(args.documents)
+    model = embedding_fixture.load_model(args.offline)
+    model.encode(docs[:8])  # warm up
+    collection = chromadb.EphemeralClient().get_or_create_collection('bench')
+
+    print(f'{len(docs)} documents, torch threads={torch.get_num_threads()}'
+          f'{", offline model" if args.offline else ""}')
+    print(f'{"batch size":>10} {"encode docs/s":>14} {"pipeline docs/s":>16}')
+    for batch_size in BATCH_SIZES:
+        encode = encode_throughput(model, docs, batch_size)
+        piped = pipeline_throughput(model, collection, docs, batch_size)
+        print(f'{batch_size:>10} {encode:14.1f} {piped:16.1f}')
+
+    inline_ms, queued_ms = request_cost(model, collection, docs[:32])
+    print(f'request thread, inline encode + add: {inline_ms:8.2f} ms (median)')
+    print(f'request thread, queued for pipeline: {queued_ms:8.4f} ms (median)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# benchmarks/bench_login_storm.py
+#
+# Measures /stocks/quote latency while a storm of logins runs against the same
+# server, with bcrypt on the request thread ("inline", the old behaviour)
+# and with the passwords.PasswordHasher process pool.
+#
+# The server is a threaded werkzeug server in a child process. The stock route
+# stands in for a cache hit (small JSON, no I/O), and login verifies a
+# bcrypt hash at the configured cost.
+#
+#   python benchmarks/bench_login_storm.py [login_threads] [seconds]
+
+import logging
+import multiprocessing
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bcrypt
+import requests
+
+ROUNDS = 12
+PASSWORD = 'correct horse battery staple'
+
+
+def serve(port, mode, ready, stop):
+    from flask import Flask, jsonify
+    from werkzeug.serving import make_server
+
+    import passwords
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    hashed = bcrypt.hashpw(PASSWORD.encode('utf-8'), bcrypt.gensalt(ROUNDS)).decode('utf-8')
+    hasher = passwords.PasswordHasher(workers=2, max_pending=64, rounds=ROUNDS)
+    app = Flask(__name__)
+
+    @app.errorhandler(passwords.PasswordPoolBusy)
+    def busy(e):
+        return jsonify({'message': str(e)}), 503
+
+    @app.route('/login', methods=['POST'])
+    def login():
+        if mode == 'inline':
+            ok = bcrypt.checkpw(PASSWORD.encode('utf-8'), hashed.encode('utf-8'))
+        else:
+            ok = hasher.verify(PASSWORD, hashed)
+        return jsonify({'ok': ok})
+
+    @app.route('/stocks/quote')
+    def quote():
+        return jsonify({'Global Quote': {'01. symbol': 'AAPL', '05. price': '123.45'}})
+
+    server = make_server('127.0.0.1', port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    ready.set()
+    stop.wait()
+    # Shut the pool down explicitly: its workers inherit our stdout and would
+    # otherwise outlive the server.
+    server.shutdown()
+    hasher.close()
+
+
+def run(mode, login_threads, seconds, port):
+    ready = multiprocessing.Event()
+    halt = multiprocessing.Event()
+    proc = multiprocessing.Process(target=serve, args=(port, mode, ready, halt))
+    proc.start()
+    ready.wait()
+    base = f'http://127.0.0.1:{port}'
+    stop = time.monotonic() + seconds
+    logins = {'ok': 0, 'busy': 0}
+
+    def storm():
+        session = requests.Session()
+        while time.monotonic() < stop:
+            status = session.post(f'{base}/login', timeout=30).status_code
+            logins['ok' if status == 200 else 'busy'] += 1
+
+    threads = [threading.Thread(target=storm) for _ in range(login_threads)]
+    for t in threads:
+        t.start()
+
+    latencies = []
+    session = requests.Session()
+    while time.monotonic() < stop:
+        start = time.perf_counter()
+        session.get(f'{base}/stocks/quote', timeout=30)
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.01)
+
+    for t in threads:
+        t.join()
+    halt.set()
+    proc.join()
+
+    latencies.sort()
+    print(f'{mode:7} quote p50={statistics.median(latencies):7.1f}ms '
+          f'p99={latencies[int(len(latencies) * 0.99) - 1]:7.1f}ms '
+          f'logins ok={logins["ok"]} rejected={logins["busy"]}')
+
+
+def main():
+    login_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f'{os.cpu_count()} CPUs, {login_threads} login threads, bcrypt cost {ROUNDS}')
+    run('inline', login_threads, seconds, 5731)
+    run('pool', login_threads, seconds, 5732)
+
+
+if __name__ == '__main__':
+    main()
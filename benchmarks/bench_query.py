@@ -0,0 +1,131 @@
+# benchmarks/bench_query.py
+#
+# /query latency at 100k stored documents in a local persistent Chroma
+# directory, through retrieval.Retriever:
+#
+#   embed      query embedding, first time (a forward pass) and repeated
+#              (an LRU hit)
+#   search     no filter, one symbol, one symbol + function; filtered
+#              searches both ranked exactly over the candidates (the
+#              default) and through Chroma's filtered collection.query.
+#              Also, for comparison, a where clause excluding history
+#              versions (/query drops them from results instead)
+#   batch      16 queries in one request answered together, against 16
+#              separate searches, unfiltered and for one symbol
+#
+# Stored vectors are random unit vectors (embedding 100k documents on a CPU
+# takes hours and doesn't change search cost); metadata is spread over 500
+# symbols and 5 functions, with 10% of documents superseded history
+# versions. The directory is built once and reused.
+#
+#   python benchmarks/bench_query.py [--documents N] [--path DIR] [--offline]
+
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+import embedding_fixture
+
+import retrieval
+
+DIMENSIONS = 384
+FUNCTIONS = ('OVERVIEW', 'INCOME_STATEMENT', 'NEWS_SENTIMENT', 'TIME_SERIES_DAILY', 'INSIDER_TRANSACTIONS')
+SYMBOLS = [f'{symbol}{i or ""}' for i in range(25) for symbol in embedding_fixture.SYMBOLS]
+QUESTIONS = ('revenue growth guidance for next quarter', 'insider selling by executives',
+             'analyst downgrade after earnings miss', 'dividend increase and buyback',
+             'chip demand from cloud customers', 'regulators open antitrust lawsuit',
+             'price target raised on ai demand', 'consumer spending slowdown hurts margins')
+
+
+def build(collection, count, batch=5000):
+    rng = np.random.default_rng(7)
+    start = time.perf_counter()
+    for offset in range(collection.count(), count, batch):
+        n = min(batch, count - offset)
+        vectors = rng.standard_normal((n, DIMENSIONS)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [f'doc-{offset + i}' for i in range(n)]
+        metadatas = [{
+            'symbol': SYMBOLS[(offset + i) % len(SYMBOLS)],
+            'function': FUNCTIONS[(offset + i) // len(SYMBOLS) % len(FUNCTIONS)],
+            'doc_id': f'doc-{(offset + i) // 10}',
+            'current': bool(current),
+        } for i, current in enumerate(rng.random(n) >= 0.1)]
+        collection.add(ids=ids, embeddings=vectors.tolist(), metadatas=metadatas,
+                       documents=[f'{m["symbol"]} {m["function"]} document {i}' for i, m in zip(ids, metadatas)])
+    return time.perf_counter() - start
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--documents', type=int, default=100000)
+    parser.add_argument('--path', default=os.path.join('/tmp', 'bench_query_chroma'))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--offline', action='store_true')
+    args = parser.parse_args()
+
+    import chromadb
+
+    collection = chromadb.PersistentClient(path=args.path).get_or_create_collection('bench_query')
+    built = build(collection, args.documents)
+    print(f'{collection.count()} documents in {args.path} (built in {built:.0f} s)')
+
+    model = embedding_fixture.load_model(args.offline)
+    embeddings = retrieval.QueryEmbeddings(lambda texts: model.encode(texts).tolist())
+    # One history version per id, as with VECTOR_STORE_VERSIONS=1.
+    retriever = retrieval.Retriever(collection, embeddings, versions=1)
+    chroma_filtered = retrieval.Retriever(collection, embeddings, versions=1, max_candidates=0)
+
+    print(f'{"":<36} {"p50 ms":>8} {"p95 ms":>8}')
+    cold = iter(f'{q} variant {i}' for i in range(10**6) for q in QUESTIONS)
+    rows = [
+        ('embed, first time', lambda: embeddings.get_many([next(cold)])),
+        ('embed, repeated (LRU hit)', lambda: embeddings.get_many([QUESTIONS[0]])),
+    ]
+    filters = [
+        ('search, no filter', retriever, None),
+        ('search, symbol', retriever, retrieval.build_where(symbol='aapl')),
+        ('search, symbol (Chroma filter)', chroma_filtered, retrieval.build_where(symbol='aapl')),
+        ('search, symbol + function', retriever, retrieval.build_where(symbol='AAPL', function='news_sentiment')),
+        ('search, symbol + function (Chroma)', chroma_filtered,
+         retrieval.build_where(symbol='AAPL', function='news_sentiment')),
+        ('search, where current=True', retriever, {'current': True}),
+    ]
+    for label, searcher, where in filters:
+        spec = {'query': QUESTIONS[1], 'where': where, 'n_results': 5}
+        rows.append((label, lambda searcher=searcher, spec=spec: searcher.search([spec])))
+
+    for label, where in (('unfiltered', None), ('symbol', retrieval.build_where(symbol='MSFT'))):
+        batch = [{'query': QUESTIONS[i % len(QUESTIONS)], 'where': where, 'n_results': 5} for i in range(16)]
+        rows.append((f'16 queries, {label}, together', lambda batch=batch: retriever.search(batch)))
+        rows.append((f'16 queries, {label}, one by one',
+                     lambda batch=batch: [retriever.search([spec]) for spec in batch]))
+
+    for label, fn in rows:
+        fn()
+        p50, p95 = timed(fn, args.repeat)
+        print(f'{label:<36} {p50:8.2f} {p95:8.2f}')
+
+    spec = {'query': QUESTIONS[1], 'where': retrieval.build_where(symbol='AAPL'), 'n_results': 5}
+    hits = retriever.search([spec])[0]
+    assert len(hits) == 5
+    assert all(hit['metadata']['symbol'] == 'AAPL' and hit['metadata']['current'] for hit in hits)
+    assert [hit['id'] for hit in hits] == [hit['id'] for hit in chroma_filtered.search([spec])[0]]
+    print(f'query embedding cache: {embeddings.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+# benchmarks/bench_ratelimit.py
+#
+# Drives a mixed interactive/background load through the token-bucket scheduler
+# against the local stub and prints upstream calls, fast-fails and the
+# per-priority queue/wait statistics.
+#
+#   python benchmarks/bench_ratelimit.py [rate_per_minute] [clients] [shared_store_path]
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratelimit import BACKGROUND, INTERACTIVE, RateLimited, Scheduler, SharedTokenBucket, TokenBucket
+from upstream import UpstreamClient
+from stub_server import StubServer
+
+
+def main():
+    per_minute = float(sys.argv[1]) if len(sys.argv) > 1 else 120
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+    store = sys.argv[3] if len(sys.argv) > 3 else None
+
+    rate = per_minute / 60.0
+    bucket = SharedTokenBucket(store, rate, 5) if store else TokenBucket(rate, 5)
+    scheduler = Scheduler(bucket, max_wait={INTERACTIVE: 5.0, BACKGROUND: 10.0})
+
+    def call(i):
+        priority = BACKGROUND if i % 2 else INTERACTIVE
+        params = {'function': 'GLOBAL_QUOTE', 'symbol': f'SYM{i}', 'apikey': 'bench'}
+        start = time.perf_counter()
+        try:
+            client.fetch_json(params, priority=priority)
+            outcome = 'ok'
+        except RateLimited as e:
+            outcome = f'429 retry_after={e.retry_after_header}'
+        return priority, outcome, time.perf_counter() - start
+
+    with StubServer() as stub:
+        client = UpstreamClient(base_url=stub.url, scheduler=scheduler)
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            results = list(pool.map(call, range(clients)))
+
+    for priority, name in ((INTERACTIVE, 'interactive'), (BACKGROUND, 'background')):
+        mine = [r for r in results if r[0] == priority]
+        ok = [r for r in mine if r[1] == 'ok']
+        print(f'{name:12} ok={len(ok)} fast_failed={len(mine) - len(ok)} '
+              f'max_wait={max((r[2] for r in ok), default=0):.2f}s')
+    print(f'upstream calls: {stub.calls}')
+    print(scheduler.stats())
+
+
+if __name__ == '__main__':
+    main()
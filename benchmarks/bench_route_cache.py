@@ -0,0 +1,66 @@
+# benchmarks/bench_route_cache.py
+#
+# Replays a skewed symbol mix against a minimal app whose routes use the same
+# stock_cache.cached decorator and upstream client as app.py, then prints the
+# per-endpoint hit rates and how many calls reached the local stub.
+#
+#   python benchmarks/bench_route_cache.py [requests]
+
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+
+from flask import Flask, jsonify, request
+
+import stock_cache
+import upstream
+from stub_server import StubServer
+
+ENDPOINTS = {
+    'quote': 'GLOBAL_QUOTE',
+    'overview': 'OVERVIEW',
+    'income_statement': 'INCOME_STATEMENT',
+    'time_series_monthly': 'TIME_SERIES_MONTHLY_ADJUSTED',
+}
+SYMBOLS = ['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN', 'GOOG', 'META', 'AMD', 'INTC', 'IBM']
+
+
+def build_app(client):
+    app = Flask(__name__)
+    stock_cache.init_app(app)
+
+    for endpoint, function in ENDPOINTS.items():
+        def view(function=function):
+            params = {'function': function, 'symbol': request.args['symbol'].upper()}
+            return jsonify(client.fetch_json(params))
+        app.add_url_rule(f'/stocks/{endpoint}', endpoint, stock_cache.cached(endpoint)(view))
+    return app
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = random.Random(7)
+    weights = [1 / (rank + 1) for rank in range(len(SYMBOLS))]
+
+    with StubServer() as stub:
+        client = upstream.UpstreamClient(base_url=stub.url)
+        app = build_app(client)
+        with app.test_client() as http:
+            for _ in range(total):
+                endpoint = rng.choice(list(ENDPOINTS))
+                symbol = rng.choices(SYMBOLS, weights)[0]
+                if rng.random() < 0.3:
+                    symbol = symbol.lower()
+                http.get(f'/stocks/{endpoint}?symbol={symbol}')
+
+    for endpoint, counters in sorted(stock_cache.stats().items()):
+        print(f"{endpoint:20} hits={counters['hits']:5} misses={counters['misses']:3} "
+              f"hit_rate={counters['hit_rate']:.1%}")
+    print(f'upstream calls: {stub.calls} for {total} requests')
+
+
+if __name__ == '__main__':
+    main()
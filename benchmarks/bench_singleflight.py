@@ -0,0 +1,43 @@
+# benchmarks/bench_singleflight.py
+#
+# Load test: N concurrent clients ask for the same quote on a cold cache.
+# Without coalescing every client reaches the upstream; with it, one does.
+#
+#   python benchmarks/bench_singleflight.py [clients]
+
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+
+from upstream import UpstreamClient
+from stub_server import StubServer
+
+PARAMS = {'function': 'GLOBAL_QUOTE', 'symbol': 'NVDA', 'apikey': 'bench'}
+
+
+def burst(client, clients, coalesce):
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        start = time.perf_counter()
+        list(pool.map(lambda _: client.fetch_json(dict(PARAMS), coalesce=coalesce), range(clients)))
+        return (time.perf_counter() - start) * 1000
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+
+    for coalesce in (False, True):
+        with StubServer(latency=0.2) as stub:
+            client = UpstreamClient(base_url=stub.url, pool_size=clients)
+            elapsed = burst(client, clients, coalesce)
+            label = 'single-flight' if coalesce else 'uncoalesced  '
+            print(f'{label} clients={clients} upstream_calls={stub.calls} '
+                  f'wall={elapsed:.0f}ms stats={client.flight.stats()}')
+            client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# benchmarks/bench_startup.py
+#
+# Worker cold start: in a fresh interpreter, the time to import app.py
+# (which builds the Flask app) and to serve the first request, plus the same
+# for the ASGI app. Also checks that nothing reached for Cosmos DB, Chroma
+# or the embedding model along the way. Each measurement is repeated in new
+# processes and the median is reported.
+#
+#   python benchmarks/bench_startup.py [runs] [--budget SECONDS]
+#
+# With --budget the script exits non-zero when import plus first request
+# takes longer, so it can guard cold starts in CI.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = r'''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+status = client.get('/').status_code
+first = time.perf_counter()
+
+import asgi
+from starlette.testclient import TestClient
+asgi_start = time.perf_counter()
+with TestClient(asgi.create_app(app.app)) as asgi_client:
+    asgi_status = asgi_client.get('/').status_code
+asgi_first = time.perf_counter()
+
+import db, utils
+print(json.dumps({
+    'import': imported - start,
+    'first_request': first - imported,
+    'asgi_first_request': asgi_first - asgi_start,
+    'status': [status, asgi_status],
+    'initialized': {
+        'cosmos': db.container.initialized,
+        'chroma': db.collection.initialized,
+        'embedding_model': utils.embedding_model.initialized,
+    },
+    'loaded': sorted(m for m in ('chromadb', 'sentence_transformers', 'torch') if m in sys.modules),
+}))
+'''
+
+
+def probe():
+    env = dict(os.environ, UPSTREAM_RATE_PER_MINUTE='0', STOCK_CACHE_BACKEND='simple')
+    out = subprocess.run([sys.executable, '-c', PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('runs', type=int, nargs='?', default=5)
+    parser.add_argument('--budget', type=float, help='max seconds for import + first request')
+    args = parser.parse_args()
+
+    probe()  # warm the filesystem cache and .pyc files
+    results = [probe() for _ in range(args.runs)]
+
+    def median_ms(field):
+        return statistics.median(r[field] for r in results) * 1000
+
+    total = median_ms('import') + median_ms('first_request')
+    print(f'{args.runs} cold starts (median)')
+    print(f'import app                 {median_ms("import"):8.1f} ms')
+    print(f'first request (Flask)      {median_ms("first_request"):8.1f} ms')
+    print(f'first request (ASGI app)   {median_ms("asgi_first_request"):8.1f} ms')
+    print(f'import + first request     {total:8.1f} ms')
+    print(f'initialized at startup     {results[-1]["initialized"]}')
+    print(f'heavy modules imported     {results[-1]["loaded"] or "none"}')
+
+    assert all(r['status'] == [200, 200] for r in results)
+    assert not any(any(r['initialized'].values()) or r['loaded'] for r in results), \
+        'startup touched Cosmos, Chroma or the embedding model'
+    if args.budget is not None and total > args.budget * 1000:
+        sys.exit(f'cold start {total:.0f} ms is over the {args.budget * 1000:.0f} ms budget')
+
+
+if __name__ == '__main__':
+    main()
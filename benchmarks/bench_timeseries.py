@@ -0,0 +1,101 @@
+# benchmarks/bench_timeseries.py
+#
+# Compares the old per-row transform of a TIME_SERIES_DAILY payload (dict per
+# bar, float()/int() per field, lambda sort) with timeseries.Bars: parsing
+# once into NumPy columns, then serving rows or columns from the parsed form
+# as a cache hit would. Uses a synthetic 25-year daily series shaped like
+# Alpha Vantage's outputsize=full response. The last rows show server-side
+# trimming (limit=252) and monthly resampling on the same cached bars.
+#
+#   python benchmarks/bench_timeseries.py [years] [repeats]
+
+import datetime
+import json
+import os
+import pickle
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import timeseries
+
+
+def synthetic_series(years):
+    rng = random.Random(7)
+    day = datetime.date.today() - datetime.timedelta(days=365 * years)
+    price = 40.0
+    series = {}
+    while day <= datetime.date.today():
+        if day.weekday() < 5:
+            open_ = price
+            price = max(1.0, price * (1 + rng.gauss(0.0003, 0.015)))
+            series[day.isoformat()] = {
+                '1. open': f'{open_:.4f}',
+                '2. high': f'{max(open_, price) * 1.01:.4f}',
+                '3. low': f'{min(open_, price) * 0.99:.4f}',
+                '4. close': f'{price:.4f}',
+                '5. volume': str(rng.randint(1_000_000, 90_000_000)),
+            }
+        day += datetime.timedelta(days=1)
+    # Alpha Vantage lists newest first.
+    return dict(reversed(list(series.items())))
+
+
+def legacy(series):
+    processed_data = [
+        {
+            'time': date,
+            'open': float(values['1. open']),
+            'high': float(values['2. high']),
+            'low': float(values['3. low']),
+            'close': float(values['4. close']),
+            'volume': int(values['5. volume']),
+        }
+        for date, values in series.items()
+    ]
+    processed_data.sort(key=lambda x: x['time'])
+    return json.dumps({'symbol': 'SYN', 'data': processed_data})
+
+
+def timed(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def main():
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 25
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    series = synthetic_series(years)
+    fields = timeseries.OHLCV_FIELDS
+    bars = timeseries.parse(series, fields)
+    print(f'{len(series)} daily bars over {years} years, best of {repeats}')
+
+    results = [
+        ('legacy transform + dumps', lambda: legacy(series)),
+        ('parse only', lambda: timeseries.parse(series, fields)),
+        ('parse + rows json', lambda: timeseries.parse(series, fields).to_json('SYN')),
+        ('cached rows json', lambda: bars.to_json('SYN', 'rows')),
+        ('cached columns json', lambda: bars.to_json('SYN', 'columns')),
+        ('cached last 1y rows json', lambda: timeseries.apply_window(bars, limit=252).to_json('SYN')),
+        ('cached monthly resample', lambda: timeseries.apply_window(bars, resample='M').to_json('SYN')),
+    ]
+    outputs = {}
+    for name, fn in results:
+        ms, outputs[name] = timed(fn, repeats)
+        print(f'{name:26} {ms:8.2f} ms')
+
+    assert json.loads(outputs['legacy transform + dumps']) == json.loads(outputs['cached rows json'])
+    print(f'rows body      {len(outputs["cached rows json"]) / 1024:8.0f} KiB')
+    print(f'columns body   {len(outputs["cached columns json"]) / 1024:8.0f} KiB')
+    print(f'raw payload pickled  {len(pickle.dumps(series)) / 1024:8.0f} KiB')
+    print(f'Bars pickled         {len(pickle.dumps(bars)) / 1024:8.0f} KiB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+# benchmarks/bench_upstream_pool.py
+#
+# Compares a bare requests.get() per call (new connection every time) with the
+# pooled keep-alive UpstreamClient, both against the local stub server.
+#
+#   python benchmarks/bench_upstream_pool.py [calls]
+
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+
+import requests
+
+from upstream import UpstreamClient
+from stub_server import StubServer
+
+
+def timed(fn, calls):
+    samples = []
+    for i in range(calls):
+        start = time.perf_counter()
+        fn({'function': 'GLOBAL_QUOTE', 'symbol': f'SYM{i % 50}', 'apikey': 'bench'})
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main():
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    with StubServer() as stub:
+        bare = timed(lambda params: requests.get(stub.url, params=params).json(), calls)
+
+        client = UpstreamClient(base_url=stub.url, pool_size=4)
+        pooled = timed(client.fetch_json, calls)
+        client.close()
+
+    print(f'{calls} calls against {stub.url}')
+    print(f'bare requests.get   p50={bare[0]:.3f}ms  p99={bare[1]:.3f}ms')
+    print(f'pooled client       p50={pooled[0]:.3f}ms  p99={pooled[1]:.3f}ms')
+
+
+if __name__ == '__main__':
+    main()
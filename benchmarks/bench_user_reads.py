@@ -0,0 +1,114 @@
+# benchmarks/bench_user_reads.py
+#
+# RU and latency per user lookup: the old cross-partition email query vs the
+# UserRepository point read.
+#
+# With BENCH_COSMOS_HOST/BENCH_COSMOS_KEY set (e.g. the Cosmos emulator at
+# https://localhost:8081/) it runs against a scratch container and reads the
+# real x-ms-request-charge header. Otherwise it uses FakeContainer. That fake
+# models a container spread over N physical partitions, where a
+# cross-partition query pays a round trip and a base charge on every
+# partition and a point read touches exactly one.
+#
+#   python benchmarks/bench_user_reads.py [users] [physical_partitions]
+
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import azure.cosmos.exceptions as exceptions
+
+from users import UserRepository, request_charge
+
+# Rough per-partition costs used by the fake; they only need to be in the
+# right proportion to each other, not match a real account exactly.
+POINT_READ_RU = 1.0
+QUERY_RU_PER_PARTITION = 2.8
+ROUND_TRIP_SECONDS = 0.002
+
+
+class _Connection:
+    def __init__(self):
+        self.last_response_headers = {}
+
+
+class FakeContainer:
+    def __init__(self, physical_partitions):
+        self.partitions = [dict() for _ in range(physical_partitions)]
+        self.client_connection = _Connection()
+
+    def _charge(self, ru, round_trips):
+        time.sleep(ROUND_TRIP_SECONDS * round_trips)
+        self.client_connection.last_response_headers = {'x-ms-request-charge': str(ru)}
+
+    def _partition(self, key):
+        return self.partitions[hash(key) % len(self.partitions)]
+
+    def create_item(self, body):
+        self._partition(body.get('partitionKey'))[body['id']] = dict(body)
+        return body
+
+    def read_item(self, item, partition_key):
+        self._charge(POINT_READ_RU, 1)
+        doc = self._partition(partition_key).get(item)
+        if doc is None or doc.get('partitionKey') != partition_key:
+            raise exceptions.CosmosResourceNotFoundError(message='Not found')
+        return doc
+
+    def query_items(self, query, parameters=None, enable_cross_partition_query=False):
+        email = parameters[0]['value']
+        self._charge(QUERY_RU_PER_PARTITION * len(self.partitions), len(self.partitions))
+        return iter([doc for part in self.partitions for doc in part.values() if doc.get('email') == email])
+
+
+def real_container():
+    from azure.cosmos import CosmosClient, PartitionKey
+    client = CosmosClient(os.environ['BENCH_COSMOS_HOST'], os.environ['BENCH_COSMOS_KEY'],
+                          connection_verify=False)
+    db = client.create_database_if_not_exists('bench')
+    return db.create_container_if_not_exists(id=f'users-{uuid.uuid4().hex[:8]}',
+                                             partition_key=PartitionKey(path='/partitionKey'))
+
+
+def measure(name, container, fn, emails):
+    latencies, charges = [], []
+    for email in emails:
+        start = time.perf_counter()
+        fn(email)
+        latencies.append((time.perf_counter() - start) * 1000)
+        charges.append(request_charge(container))
+    print(f'{name:28} p50={statistics.median(latencies):7.2f}ms '
+          f'max={max(latencies):7.2f}ms RU/op={statistics.mean(charges):6.2f}')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    physical = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    if os.environ.get('BENCH_COSMOS_HOST'):
+        container = real_container()
+        print(f'Cosmos at {os.environ["BENCH_COSMOS_HOST"]}')
+    else:
+        container = FakeContainer(physical)
+        print(f'FakeContainer with {physical} physical partitions')
+
+    repo = UserRepository(container, legacy_fallback=False)
+    emails = [f'user{i}@example.com' for i in range(count)]
+    for email in emails:
+        repo.create({'email': email, 'username': email.split('@')[0], 'portfolio': []})
+
+    sample = emails[::max(1, count // 50)]
+    measure('cross-partition email query', container, lambda email: list(container.query_items(
+        query='SELECT * FROM c WHERE c.email = @email',
+        parameters=[{'name': '@email', 'value': email}],
+        enable_cross_partition_query=True,
+    )), sample)
+    measure('UserRepository.get', container, repo.get, sample)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# benchmarks/embedding_fixture.py
+#
+# Shared by the embedding benchmarks: realistic stock-data documents, and
+# the embedding model to time them with.
+#
+# With --offline (for machines that can't reach the Hugging Face hub) the
+# model is a randomly initialised encoder with all-MiniLM-L6-v2's exact
+# architecture and sequence length, and a WordPiece vocabulary trained on
+# the synthetic documents. Its timings stand in for the real model's; its
+# embeddings mean nothing, so accuracy numbers need the real model.
+
+import json
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SYMBOLS = ['AAPL', 'MSFT', 'NVDA', 'TSLA', 'AMZN', 'GOOG', 'META', 'AMD', 'INTC', 'IBM',
+           'ORCL', 'CRM', 'ADBE', 'NFLX', 'PYPL', 'QCOM', 'TXN', 'AVGO', 'CSCO', 'PEP']
+SECTORS = ['TECHNOLOGY', 'CONSUMER CYCLICAL', 'COMMUNICATION SERVICES', 'FINANCIAL SERVICES']
+WORDS = ('revenue guidance beat estimates shares rallied analysts margin outlook quarter growth '
+         'demand supply chain earnings call dividend buyback regulators lawsuit chip cloud ai '
+         'subscribers downgrade upgrade target price inflation rates consumer spending').split()
+
+
+def _sentence(rng, n):
+    return ' '.join(rng.choice(WORDS) for _ in range(n)).capitalize() + '.'
+
+
+def overview(rng, symbol):
+    return {
+        'Symbol': symbol, 'AssetType': 'Common Stock', 'Name': f'{symbol} Inc',
+        'Description': ' '.join(_sentence(rng, 14) for _ in range(6)),
+        'Exchange': 'NASDAQ', 'Currency': 'USD', 'Sector': rng.choice(SECTORS),
+        'MarketCapitalization': str(rng.randint(10**9, 3 * 10**12)),
+        'PERatio': f'{rng.uniform(5, 80):.2f}', 'EPS': f'{rng.uniform(-2, 12):.2f}',
+        'DividendYield': f'{rng.uniform(0, 0.04):.4f}', '52WeekHigh': f'{rng.uniform(100, 500):.2f}',
+    }
+
+
+def income_statement(rng, symbol, years=5):
+    reports = [{
+        'fiscalDateEnding': f'{2024 - i}-09-30', 'reportedCurrency': 'USD',
+        'totalRevenue': str(rng.randint(10**9, 4 * 10**11)), 'grossProfit': str(rng.randint(10**8, 10**11)),
+        'operatingIncome': str(rng.randint(10**8, 10**11)), 'netIncome': str(rng.randint(-10**9, 10**11)),
+        'ebitda': str(rng.randint(10**8, 10**11)), 'researchAndDevelopment': str(rng.randint(10**7, 10**10)),
+    } for i in range(years)]
+    return {'symbol': symbol, 'annualReports': reports, 'quarterlyReports': reports[:4]}
+
+
+def news_feed(rng, symbol, articles=20):
+    return {'items': str(articles), 'feed': [{
+        'title': _sentence(rng, 9), 'url': f'https://example.com/{symbol}/{i}',
+        'time_published': f'202410{rng.randint(10, 28)}T{rng.randint(10, 23)}0000',
+        'summary': ' '.join(_sentence(rng, 12) for _ in range(3)),
+        'source': rng.choice(['Reuters', 'Bloomberg', 'CNBC', 'Benzinga', 'Motley Fool']),
+        'overall_sentiment_score': round(rng.uniform(-0.6, 0.6), 4),
+        'ticker_sentiment': [{'ticker': symbol, 'relevance_score': f'{rng.random():.4f}'}],
+    } for i in range(articles)]}
+
+
+def daily_series(rng, symbol, days=100):
+    price = rng.uniform(50, 400)
+    series = {}
+    for i in range(days):
+        price *= 1 + rng.gauss(0, 0.02)
+        series[f'2024-{1 + i // 28:02d}-{1 + i % 28:02d}'] = {
+            '1. open': f'{price:.4f}', '2. high': f'{price * 1.01:.4f}', '3. low': f'{price * 0.99:.4f}',
+            '4. close': f'{price:.4f}', '5. volume': str(rng.randint(10**6, 10**8)),
+        }
+    return {'Meta Data': {'2. Symbol': symbol}, 'Time Series (Daily)': series}
+
+
+PAYLOADS = {
+    'OVERVIEW': overview,
+    'INCOME_STATEMENT': income_statement,
+    'NEWS_SENTIMENT': news_feed,
+    'TIME_SERIES_DAILY': daily_series,
+}
+
+
+def payloads(count, seed=7):
+    """``count`` (function, symbol, payload) triples cycling through the
+    upstream functions the routes store."""
+    rng = random.Random(seed)
+    functions = list(PAYLOADS)
+    for i in range(count):
+        function = functions[i % len(functions)]
+        symbol = SYMBOLS[(i // len(functions)) % len(SYMBOLS)]
+        yield function, symbol, PAYLOADS[function](rng, symbol)
+
+
+def documents(count, seed=7):
+    """``json.dumps`` of ``payloads`` -- what the routes embed today."""
+    return [json.dumps(payload) for _, _, payload in payloads(count, seed)]
+
+
+def offline_model(corpus=None):
+    """A SentenceTransformer shaped exactly like all-MiniLM-L6-v2 (6 layers,
+    384 hidden, 12 heads, mean pooling, normalised, 256 tokens) with random
+    weights. ``corpus`` trains its vocabulary."""
+    from sentence_transformers import SentenceTransformer, models
+    from tokenizers import BertWordPieceTokenizer
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    path = tempfile.mkdtemp(prefix='minilm-offline-')
+    wordpiece = BertWordPieceTokenizer(lowercase=True)
+    wordpiece.train_from_iterator(corpus or documents(400), vocab_size=30522, min_frequency=1)
+    wordpiece.save_model(path)
+    BertTokenizerFast(os.path.join(path, 'vocab.txt'), do_lower_case=True).save_pretrained(path)
+    config = BertConfig(vocab_size=30522, hidden_size=384, num_hidden_layers=6, num_attention_heads=12,
+                        intermediate_size=1536, max_position_embeddings=512)
+    BertModel(config).save_pretrained(path)
+
+    transformer = models.Transformer(path, max_seq_length=256)
+    pooling = models.Pooling(transformer.get_word_embedding_dimension(), 'mean')
+    return SentenceTransformer(modules=[transformer, pooling, models.Normalize()], device='cpu')
+
+
+def load_model(offline):
+    if offline:
+        return offline_model()
+    import utils
+    return utils.embedding_model.resolve()
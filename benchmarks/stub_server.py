@@ -0,0 +1,103 @@
+# benchmarks/stub_server.py
+#
+# Local stand-in for the Alpha Vantage /query endpoint so benchmarks never
+# touch the real API or spend quota.
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def default_payload(params):
+    symbol = params.get('symbol', params.get('tickers', 'TEST'))
+    return {
+        'Global Quote': {
+            '01. symbol': symbol,
+            '05. price': '123.4500',
+            '07. latest trading day': '2024-11-15',
+        }
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Load tests open hundreds of connections at once.
+    request_queue_size = 1024
+
+
+class StubServer:
+    """Threaded HTTP/1.1 server answering every GET with ``payload_fn(params)``.
+
+    ``latency`` adds a fixed server-side delay per request, ``calls`` counts the
+    requests that actually reached the stub.
+    """
+
+    def __init__(self, payload_fn=default_payload, latency=0.0, status=200):
+        self.payload_fn = payload_fn
+        self.latency = latency
+        self.status = status
+        self.calls = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.calls += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                params = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+                body = json.dumps(stub.payload_fn(params)).encode('utf-8')
+                self.send_response(stub.status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = _Server(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.httpd.server_port}/query'
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+async def serve_async_stub(port, latency=0.0, payload_fn=default_payload, ready=None):
+    """Event-loop version of ``StubServer`` for load tests: hundreds of
+    connections waiting out ``latency`` cost no threads. Runs until cancelled."""
+    import asyncio
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                target = head.split(b' ', 2)[1].decode('latin-1')
+                if latency:
+                    await asyncio.sleep(latency)
+                params = {k: v[0] for k, v in parse_qs(urlparse(target).query).items()}
+                body = json.dumps(payload_fn(params)).encode('utf-8')
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                             b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=1024)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
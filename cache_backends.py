@@ -0,0 +1,178 @@
+# cache_backends.py
+#
+# Cache backends that every gunicorn worker on a host can share. Selected for
+# the stock routes by STOCK_CACHE_BACKEND (see stock_cache.cache_config).
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+
+from cachelib.serializers import RedisSerializer
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache
+
+# Payloads smaller than this aren't worth the zlib header and CPU.
+COMPRESS_THRESHOLD = 1024
+
+_RAW = b'!'
+_ZLIB = b'z'
+
+
+def compact_dumps(value):
+    data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(data, 1)
+    return _RAW + data
+
+
+def compact_loads(blob):
+    if blob is None:
+        return None
+    blob = bytes(blob)
+    if blob[:1] == _ZLIB:
+        return pickle.loads(zlib.decompress(blob[1:]))
+    if blob[:1] == _RAW:
+        return pickle.loads(blob[1:])
+    return int(blob)
+
+
+class CompactRedisSerializer(RedisSerializer):
+    def dumps(self, value, protocol=pickle.HIGHEST_PROTOCOL):
+        if type(value) is int:
+            return str(value).encode('ascii')
+        return compact_dumps(value)
+
+    def loads(self, value):
+        return compact_loads(value)
+
+
+class CompactRedisCache(RedisCache):
+    """Flask-Caching's RedisCache with zlib-compressed pickles.
+
+    Eviction is left to the server (``maxmemory`` + ``allkeys-lru``). Any object
+    with the redis-py ``get``/``set``/``delete`` API can be passed as ``host``,
+    which is how it runs against a local stand-in.
+    """
+
+    serializer = CompactRedisSerializer()
+
+
+class SQLiteLRUCache(BaseCache):
+    """Size-bounded LRU cache in a single SQLite file on local disk.
+
+    Every worker opens the same file, so one worker's upstream fetch is a hit
+    for the others. WAL mode lets readers proceed while a writer commits. Once
+    the stored payload bytes exceed ``max_bytes`` the least recently read
+    entries are evicted; expired entries go first.
+    """
+
+    def __init__(self, path, max_bytes=64 * 1024 * 1024, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL, '
+            'accessed REAL NOT NULL, size INTEGER NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)')
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            path=config['CACHE_SQLITE_PATH'],
+            max_bytes=config['CACHE_MAX_BYTES'],
+        )
+        return cls(*args, **kwargs)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _expires(self, timeout):
+        timeout = self._normalize_timeout(timeout)
+        return time.time() + timeout if timeout > 0 else float('inf')
+
+    def get(self, key):
+        conn = self._conn()
+        now = time.time()
+        row = conn.execute('SELECT value, expires FROM cache WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute('DELETE FROM cache WHERE key = ? AND expires <= ?', (key, now))
+            return None
+        # Only rewrite the recency stamp once a second to keep hits read-mostly.
+        conn.execute('UPDATE cache SET accessed = ? WHERE key = ? AND accessed < ?', (now, key, now - 1))
+        return compact_loads(row[0])
+
+    def has(self, key):
+        row = self._conn().execute('SELECT expires FROM cache WHERE key = ?', (key,)).fetchone()
+        return row is not None and row[0] > time.time()
+
+    def set(self, key, value, timeout=None):
+        return self._write('INSERT OR REPLACE', key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self._write('INSERT OR IGNORE', key, value, timeout)
+
+    def _write(self, verb, key, value, timeout):
+        blob = compact_dumps(value)
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cur = conn.execute(
+                f'{verb} INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)',
+                (key, blob, self._expires(timeout), now, len(blob)),
+            )
+            self._evict(conn, now)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return cur.rowcount > 0
+
+    def _evict(self, conn, now):
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        total -= conn.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM cache WHERE expires <= ?', (now,)
+        ).fetchone()[0]
+        conn.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM cache ORDER BY accessed'):
+            if total <= self.max_bytes:
+                break
+            victims.append((key,))
+            total -= size
+        conn.executemany('DELETE FROM cache WHERE key = ?', victims)
+
+    def delete(self, key):
+        return self._conn().execute('DELETE FROM cache WHERE key = ?', (key,)).rowcount > 0
+
+    def clear(self):
+        self._conn().execute('DELETE FROM cache')
+        return True
+
+    def size_bytes(self):
+        return self._conn().execute('SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()[0]
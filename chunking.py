@@ -0,0 +1,271 @@
+# chunking.py
+#
+# Turns an upstream payload into the documents that get embedded.
+#
+# Embedding json.dumps of a whole response wastes the model: it reads only
+# the first 256 tokens, so most of a news feed or an income statement never
+# reaches the vector. chunk_payload splits each payload along its natural
+# seams instead (one chunk per article, per fiscal period, a summary per
+# price series), each rendered as short readable text.
+#
+# Every chunk carries a content hash. ContentHashes remembers the hash last
+# stored under each chunk id, so a refetched payload only costs embeddings
+# for the chunks that actually changed.
+
+import collections
+import hashlib
+import json
+import logging
+import threading
+import time
+
+import numpy as np
+
+import config
+import timeseries
+
+logger = logging.getLogger(__name__)
+
+HASH_FIELD = 'content_hash'
+
+# Statement payloads: report list key -> period label.
+REPORT_LISTS = {
+    'annualReports': 'annual',
+    'quarterlyReports': 'quarterly',
+    'annualEarnings': 'annual',
+    'quarterlyEarnings': 'quarterly',
+}
+
+STATEMENT_NAMES = {
+    'INCOME_STATEMENT': 'income statement',
+    'BALANCE_SHEET': 'balance sheet',
+    'CASH_FLOW': 'cash flow statement',
+    'EARNINGS': 'earnings',
+}
+
+# OVERVIEW fields that describe the company; the rest are metrics.
+PROFILE_FIELDS = ('Name', 'AssetType', 'Exchange', 'Country', 'Sector', 'Industry', 'Description')
+
+# Price series summaries list this many of the most recent monthly closes.
+SUMMARY_MONTHS = 12
+
+
+def content_hash(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+class Chunk:
+    """One document to embed: a Chroma id, its text and metadata."""
+
+    __slots__ = ('id', 'text', 'metadata', 'hash')
+
+    def __init__(self, chunk_id, text, metadata):
+        self.id = chunk_id
+        self.text = text
+        self.hash = content_hash(text)
+        self.metadata = dict(metadata, **{HASH_FIELD: self.hash})
+
+    def __repr__(self):
+        return f'Chunk({self.id!r}, {len(self.text)} chars)'
+
+
+def _present(value):
+    return value not in (None, '', 'None', '-')
+
+
+def _fields(record, skip=()):
+    return '\n'.join(f'{name}: {value}' for name, value in record.items()
+                     if name not in skip and _present(value) and not isinstance(value, (dict, list)))
+
+
+def _overview(doc_id, data, metadata):
+    symbol = metadata['symbol']
+    profile = {name: data[name] for name in PROFILE_FIELDS if _present(data.get(name))}
+    chunks = [Chunk(doc_id, f'{symbol} company profile\n{_fields(profile)}', dict(metadata, section='profile'))]
+    metrics = _fields(data, skip=PROFILE_FIELDS + ('Symbol',))
+    if metrics:
+        chunks.append(Chunk(f'{doc_id}_metrics', f'{symbol} key metrics\n{metrics}',
+                            dict(metadata, section='metrics')))
+    return chunks
+
+
+def _statement(doc_id, data, metadata):
+    symbol = metadata['symbol']
+    name = STATEMENT_NAMES.get(metadata.get('function'), 'financial statement')
+    chunks = []
+    for key, period in REPORT_LISTS.items():
+        for report in data.get(key) or ():
+            ending = report.get('fiscalDateEnding')
+            if not ending:
+                continue
+            text = f'{symbol} {period} {name}, fiscal period ending {ending}\n{_fields(report, skip=("fiscalDateEnding",))}'
+            chunks.append(Chunk(f'{doc_id}_{period}_{ending}', text,
+                                dict(metadata, period=period, fiscal_date_ending=ending)))
+    return chunks
+
+
+def _news(doc_id, data, metadata):
+    symbol = metadata['symbol']
+    chunks = []
+    for article in data.get('feed') or ():
+        title = article.get('title')
+        if not title:
+            continue
+        # The URL identifies an article across feeds; its text may be revised.
+        key = content_hash(article.get('url') or title)[:16]
+        lines = [f'{symbol} news: {title}']
+        if _present(article.get('summary')):
+            lines.append(article['summary'])
+        lines.append(f'Source: {article.get("source", "unknown")}, published {article.get("time_published", "unknown")}, '
+                     f'sentiment {article.get("overall_sentiment_label", article.get("overall_sentiment_score", "n/a"))}')
+        chunks.append(Chunk(f'{doc_id}_{key}', '\n'.join(lines), dict(
+            metadata,
+            url=article.get('url') or '',
+            published=article.get('time_published') or '',
+            source=article.get('source') or '',
+        )))
+    return chunks
+
+
+def _series(doc_id, data, metadata):
+    bars = timeseries.from_payload(data, metadata['function'])
+    if bars is None or not len(bars):
+        return []
+    symbol = metadata['symbol']
+    dates = bars.date_strings()
+    close, volume = bars.columns['close'], bars.columns['volume']
+    first_open = bars.columns['open'][0]
+    change = (close[-1] / first_open - 1) * 100 if first_open else 0.0
+    name = metadata['function'].replace('TIME_SERIES_', '').replace('_', ' ').lower()
+
+    monthly = bars.resample('M').tail(SUMMARY_MONTHS)
+    closes = ', '.join(f'{date[:7]} {value:.2f}' for date, value in zip(monthly.date_strings(),
+                                                                        monthly.columns['close'].tolist()))
+    text = (f'{symbol} {name} prices from {dates[0]} to {dates[-1]} ({len(bars)} bars)\n'
+            f'open {first_open:.2f}, last close {close[-1]:.2f} ({change:+.1f}%), '
+            f'high {np.max(bars.columns["high"]):.2f}, low {np.min(bars.columns["low"]):.2f}, '
+            f'average volume {np.mean(volume):,.0f}\n'
+            f'monthly closes: {closes}')
+    return [Chunk(doc_id, text, dict(metadata, start=dates[0], end=dates[-1]))]
+
+
+def _insider(doc_id, data, metadata):
+    symbol = metadata['symbol']
+    by_date = {}
+    for trade in data.get('data') or ():
+        by_date.setdefault(trade.get('transaction_date') or 'unknown', []).append(trade)
+    chunks = []
+    for date, trades in by_date.items():
+        lines = [f'{symbol} insider transactions on {date}']
+        for trade in trades:
+            side = 'acquired' if trade.get('acquisition_or_disposal') == 'A' else 'disposed of'
+            lines.append(f'{trade.get("executive", "unknown")} ({trade.get("executive_title", "")}) {side} '
+                         f'{trade.get("shares", "?")} {trade.get("security_type", "shares")} '
+                         f'at {trade.get("share_price", "?")}')
+        chunks.append(Chunk(f'{doc_id}_{date}', '\n'.join(lines), dict(metadata, transaction_date=date)))
+    return chunks
+
+
+CHUNKERS = {
+    'OVERVIEW': _overview,
+    'NEWS_SENTIMENT': _news,
+    'INSIDER_TRANSACTIONS': _insider,
+}
+CHUNKERS.update(dict.fromkeys(STATEMENT_NAMES, _statement))
+CHUNKERS.update(dict.fromkeys(timeseries.SERIES, _series))
+
+
+def chunk_payload(doc_id, data, metadata):
+    """The chunks to embed for upstream payload ``data``.
+
+    ``metadata`` must name the payload's ``symbol`` and ``function``; it is
+    copied onto every chunk, along with ``doc_id``. Payloads with no
+    chunker, or that a chunker can't split, become one chunk of their JSON
+    under ``doc_id``.
+    """
+    metadata = dict(metadata, doc_id=doc_id)
+    if isinstance(data, str):
+        return [Chunk(doc_id, data, metadata)]
+    chunker = CHUNKERS.get(metadata.get('function'))
+    chunks = []
+    if chunker is not None:
+        try:
+            chunks = chunker(doc_id, data, metadata)
+        except (KeyError, TypeError, ValueError, ZeroDivisionError):
+            logger.warning('Could not chunk %s payload for %s; embedding it whole',
+                           metadata.get('function'), metadata.get('symbol'), exc_info=True)
+    return chunks or [Chunk(doc_id, json.dumps(data), metadata)]
+
+
+class ContentHashes:
+    """The content hash stored under each chunk id, to skip unchanged chunks.
+
+    Hashes are kept in an LRU of ``max_entries`` ids. Ids it doesn't know
+    are looked up in the store with ``lookup(ids) -> {id: hash}`` (chunks
+    are written with their hash in metadata), so a restarted process still
+    skips what an earlier one stored. Skipped chunks are counted per minute
+    for ``stats``'s hourly figure.
+    """
+
+    def __init__(self, lookup=None, max_entries=None):
+        self.lookup = lookup
+        self.max_entries = max_entries or config.EMBED_HASH_CACHE_SIZE
+        self._hashes = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._skipped = 0
+        self._minutes = collections.deque()
+        self._started = time.time()
+
+    def changed(self, chunks):
+        """The chunks whose text differs from what is stored under their id."""
+        with self._lock:
+            known = {chunk.id: self._hashes.get(chunk.id) for chunk in chunks}
+        unknown = [chunk_id for chunk_id, stored in known.items() if stored is None]
+        if unknown and self.lookup is not None:
+            try:
+                known.update(self.lookup(unknown))
+            except Exception:
+                logger.warning('Could not look up stored content hashes; re-embedding', exc_info=True)
+
+        fresh = [chunk for chunk in chunks if known.get(chunk.id) != chunk.hash]
+        unchanged = [chunk for chunk in chunks if known.get(chunk.id) == chunk.hash]
+        if unchanged:
+            self.remember(unchanged)
+            self._count(len(unchanged))
+        return fresh
+
+    def forget(self, ids):
+        with self._lock:
+            for chunk_id in ids:
+                self._hashes.pop(chunk_id, None)
+
+    def remember(self, chunks):
+        with self._lock:
+            for chunk in chunks:
+                self._hashes[chunk.id] = chunk.hash
+                self._hashes.move_to_end(chunk.id)
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+
+    def _count(self, n):
+        minute = int(time.time() // 60)
+        with self._lock:
+            self._skipped += n
+            if self._minutes and self._minutes[-1][0] == minute:
+                self._minutes[-1][1] += n
+            else:
+                self._minutes.append([minute, n])
+            while self._minutes[0][0] <= minute - 60:
+                self._minutes.popleft()
+
+    def stats(self):
+        minute = int(time.time() // 60)
+        with self._lock:
+            last_hour = sum(n for m, n in self._minutes if m > minute - 60)
+            hours = max((time.time() - self._started) / 3600, 1 / 60)
+            return {
+                'known_ids': len(self._hashes),
+                'embeds_saved': self._skipped,
+                'embeds_saved_last_hour': last_hour,
+                'embeds_saved_per_hour': round(self._skipped / hours, 1),
+            }
@@ -11,4 +11,140 @@ settings = {
     'container_id': os.environ.get('COSMOS_CONTAINER'),
 }
 
-API_KEY = os.environ.get('ALPHA_VANTAGE_API_KEY')
\ No newline at end of file
+API_KEY = os.environ.get('ALPHA_VANTAGE_API_KEY')
+
+# Alpha Vantage upstream client
+ALPHA_VANTAGE_URL = os.environ.get('ALPHA_VANTAGE_URL', 'https://www.alphavantage.co/query')
+UPSTREAM_POOL_SIZE = int(os.environ.get('UPSTREAM_POOL_SIZE', 10))
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.05))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 15))
+UPSTREAM_MAX_RETRIES = int(os.environ.get('UPSTREAM_MAX_RETRIES', 3))
+UPSTREAM_BACKOFF_FACTOR = float(os.environ.get('UPSTREAM_BACKOFF_FACTOR', 0.5))
+
+# Connections the async client (asgi.py) may hold open to Alpha Vantage
+UPSTREAM_ASYNC_MAX_CONNECTIONS = int(os.environ.get('UPSTREAM_ASYNC_MAX_CONNECTIONS', 200))
+
+# Upstream rate limiting (Alpha Vantage quota). A rate of 0 disables it; set
+# UPSTREAM_RATE_LIMIT_STORE to a file path to share the bucket across workers.
+UPSTREAM_RATE_PER_MINUTE = float(os.environ.get('UPSTREAM_RATE_PER_MINUTE', 5))
+UPSTREAM_BURST = int(os.environ.get('UPSTREAM_BURST', 0))
+UPSTREAM_RATE_LIMIT_STORE = os.environ.get('UPSTREAM_RATE_LIMIT_STORE')
+UPSTREAM_MAX_WAIT_INTERACTIVE = float(os.environ.get('UPSTREAM_MAX_WAIT_INTERACTIVE', 10))
+UPSTREAM_MAX_WAIT_BACKGROUND = float(os.environ.get('UPSTREAM_MAX_WAIT_BACKGROUND', 60))
+UPSTREAM_QUOTA_COOLDOWN = float(os.environ.get('UPSTREAM_QUOTA_COOLDOWN', 60))
+
+# Stock route cache TTLs in seconds, keyed by endpoint name
+STOCK_CACHE_TTLS = {
+    'default': 300,
+    'quote': int(os.environ.get('CACHE_TTL_QUOTE', 30)),
+    'top_movers': int(os.environ.get('CACHE_TTL_TOP_MOVERS', 300)),
+    'news': int(os.environ.get('CACHE_TTL_NEWS', 900)),
+    'daily': int(os.environ.get('CACHE_TTL_DAILY', 3600)),
+    'time_series': int(os.environ.get('CACHE_TTL_TIME_SERIES', 3600)),
+    'overview': int(os.environ.get('CACHE_TTL_OVERVIEW', 6 * 3600)),
+    'income_statement': int(os.environ.get('CACHE_TTL_INCOME_STATEMENT', 12 * 3600)),
+    'insider_transactions': int(os.environ.get('CACHE_TTL_INSIDER_TRANSACTIONS', 6 * 3600)),
+    'time_series_monthly': int(os.environ.get('CACHE_TTL_TIME_SERIES_MONTHLY', 24 * 3600)),
+    'indicators': int(os.environ.get('CACHE_TTL_INDICATORS', 3600)),
+}
+
+# How long computed indicator series are kept for incremental updates
+INDICATOR_MEMO_TTL = int(os.environ.get('INDICATOR_MEMO_TTL', 7 * 24 * 3600))
+
+# Stock route cache backend: 'simple' (per worker), 'sqlite' or 'redis' (shared)
+STOCK_CACHE_BACKEND = os.environ.get('STOCK_CACHE_BACKEND', 'simple')
+STOCK_CACHE_PATH = os.environ.get('STOCK_CACHE_PATH', 'cache_data/stock_cache.sqlite3')
+STOCK_CACHE_MAX_BYTES = int(os.environ.get('STOCK_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+STOCK_CACHE_REDIS_URL = os.environ.get('STOCK_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+# How long past its TTL a cached stock response may still be served when the
+# upstream fails, and how many threads refresh stale entries in the background
+STOCK_CACHE_STALE_IF_ERROR = int(os.environ.get('STOCK_CACHE_STALE_IF_ERROR', 24 * 3600))
+STOCK_CACHE_REFRESH_WORKERS = int(os.environ.get('STOCK_CACHE_REFRESH_WORKERS', 2))
+
+# Password hashing: bcrypt cost, processes in the hashing pool (0 = inline)
+# and how many hashes may be queued before logins get a 503
+BCRYPT_ROUNDS = int(os.environ.get('BCRYPT_ROUNDS', 12))
+BCRYPT_WORKERS = int(os.environ.get('BCRYPT_WORKERS', 2))
+BCRYPT_MAX_PENDING = int(os.environ.get('BCRYPT_MAX_PENDING', 32))
+
+# Batch quotes: most symbols per request, concurrent upstream fetches for
+# cache misses, and how long a batch waits for them before answering
+QUOTE_BATCH_MAX_SYMBOLS = int(os.environ.get('QUOTE_BATCH_MAX_SYMBOLS', 50))
+QUOTE_FANOUT_WORKERS = int(os.environ.get('QUOTE_FANOUT_WORKERS', 4))
+QUOTE_BATCH_TIMEOUT = float(os.environ.get('QUOTE_BATCH_TIMEOUT', 20))
+
+# How long per-position portfolio summaries are kept for analytics
+PORTFOLIO_MEMO_TTL = int(os.environ.get('PORTFOLIO_MEMO_TTL', 7 * 24 * 3600))
+
+# News impact ranking: score weights, and an optional JSON file of
+# {"source name": credibility} merged over the built-in table
+NEWS_RANK_WEIGHTS = {
+    'sentiment': float(os.environ.get('NEWS_RANK_SENTIMENT_WEIGHT', 0.5)),
+    'recency': float(os.environ.get('NEWS_RANK_RECENCY_WEIGHT', 0.3)),
+    'source': float(os.environ.get('NEWS_RANK_SOURCE_WEIGHT', 0.2)),
+}
+NEWS_SOURCE_CREDIBILITY_FILE = os.environ.get('NEWS_SOURCE_CREDIBILITY_FILE')
+
+# Ranked news is scored as of the start of a time bucket and cached for it;
+# by default the bucket matches the news cache TTL
+NEWS_RANK_BUCKET_SECONDS = int(os.environ.get('NEWS_RANK_BUCKET_SECONDS', STOCK_CACHE_TTLS['news']))
+
+# Logging: root level, JSON lines instead of plain text, and how many records
+# may wait for the writer thread before new ones are dropped
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+LOG_JSON = os.environ.get('LOG_JSON', 'false').lower() == 'true'
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+
+# Access log: share of successful requests logged (failures and slow requests
+# always are), what counts as slow, body excerpt size for routes at DEBUG, and
+# per-route thresholds as "path-prefix=LEVEL,..." where LEVEL may be OFF
+ACCESS_LOG_SAMPLE_RATE = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 1.0))
+ACCESS_LOG_SLOW_MS = float(os.environ.get('ACCESS_LOG_SLOW_MS', 1000))
+ACCESS_LOG_BODY_BYTES = int(os.environ.get('ACCESS_LOG_BODY_BYTES', 1024))
+ACCESS_LOG_ROUTE_LEVELS = os.environ.get('ACCESS_LOG_ROUTE_LEVELS', '/metrics=WARNING')
+
+# Background embedding of stored stock data: most documents per encode call,
+# how long a batch waits to fill once it has one, and how many documents may
+# wait before new ones are dropped
+EMBED_BATCH_SIZE = int(os.environ.get('EMBED_BATCH_SIZE', 32))
+EMBED_BATCH_WAIT = float(os.environ.get('EMBED_BATCH_WAIT', 0.5))
+EMBED_QUEUE_SIZE = int(os.environ.get('EMBED_QUEUE_SIZE', 1000))
+
+# How many chunk ids' content hashes are remembered, so chunks unchanged
+# since they were last stored aren't embedded again
+EMBED_HASH_CACHE_SIZE = int(os.environ.get('EMBED_HASH_CACHE_SIZE', 100000))
+
+# Embedding model and how it runs: 'torch', 'onnx' or 'onnx-int8' (see
+# embedding_backends.py), intra-op threads (0 = one per core) and where the
+# ONNX export lives
+EMBED_MODEL = os.environ.get('EMBED_MODEL', 'all-MiniLM-L6-v2')
+EMBED_BACKEND = os.environ.get('EMBED_BACKEND', 'torch')
+EMBED_THREADS = int(os.environ.get('EMBED_THREADS', 0))
+EMBED_ONNX_DIR = os.environ.get('EMBED_ONNX_DIR', os.path.join('models', 'onnx'))
+
+# Embedding server (embedding_server.py): a Unix socket path (or "host:port",
+# only with an authkey of 32+ characters) at which one process holds the
+# model for every worker. Empty loads the model in each worker instead.
+# gunicorn.conf.py generates a random authkey when none is set
+EMBED_SERVER_ADDRESS = os.environ.get('EMBED_SERVER_ADDRESS', '')
+EMBED_SERVER_AUTHKEY = os.environ.get('EMBED_SERVER_AUTHKEY', '')
+
+# Chroma history: how many earlier versions of each stored chunk to keep
+# (0 keeps only the current one), how long a superseded version is kept, in
+# seconds, and how often expired versions are swept
+VECTOR_STORE_VERSIONS = int(os.environ.get('VECTOR_STORE_VERSIONS', 0))
+VECTOR_STORE_HISTORY_TTL = int(os.environ.get('VECTOR_STORE_HISTORY_TTL', 30 * 24 * 3600))
+VECTOR_STORE_PRUNE_INTERVAL = int(os.environ.get('VECTOR_STORE_PRUNE_INTERVAL', 3600))
+
+# /query: how many query embeddings each worker memoizes, results per query
+# by default and at most, and queries per request at most
+QUERY_EMBED_CACHE_SIZE = int(os.environ.get('QUERY_EMBED_CACHE_SIZE', 4096))
+QUERY_DEFAULT_RESULTS = int(os.environ.get('QUERY_DEFAULT_RESULTS', 5))
+QUERY_MAX_RESULTS = int(os.environ.get('QUERY_MAX_RESULTS', 50))
+QUERY_MAX_BATCH = int(os.environ.get('QUERY_MAX_BATCH', 32))
+
+# Symbol-filtered queries rank their candidates exactly, in process, when a
+# symbol has at most this many stored documents (0 always uses Chroma's
+# filtered search)
+QUERY_EXACT_MAX_CANDIDATES = int(os.environ.get('QUERY_EXACT_MAX_CANDIDATES', 2000))
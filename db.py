@@ -1,11 +1,12 @@
 # db.py
+#
+# The Cosmos DB container and the Chroma collection, opened on first use.
+# Nothing here touches the network or imports the client libraries at
+# import time; creating the Cosmos database and container is a one-time
+# step (python provision.py), not something every worker does on boot.
 
-import azure.cosmos.cosmos_client as cosmos_client
-import azure.cosmos.exceptions as exceptions
-from azure.cosmos.partition_key import PartitionKey
-from chromadb.config import Settings
-import chromadb
 from config import settings
+from lazy import Lazy
 
 # Azure Cosmos DB settings
 HOST = settings['host']
@@ -13,26 +14,33 @@ MASTER_KEY = settings['master_key']
 DATABASE_ID = settings['database_id']
 CONTAINER_ID = settings['container_id']
 
-# Initialize the Cosmos client
-cosmos_client = cosmos_client.CosmosClient(HOST, {'masterKey': MASTER_KEY})
-
-# Get or create the database
-try:
-    db = cosmos_client.create_database(id=DATABASE_ID)
-    print('Database with id \'{0}\' created'.format(DATABASE_ID))
-except exceptions.CosmosResourceExistsError:
-    db = cosmos_client.get_database_client(DATABASE_ID)
-    print('Database with id \'{0}\' was found'.format(DATABASE_ID))
-
-# Get or create the container
-try:
-    container = db.create_container(id=CONTAINER_ID, partition_key=PartitionKey(path='/partitionKey'))
-    print('Container with id \'{0}\' created'.format(CONTAINER_ID))
-except exceptions.CosmosResourceExistsError:
-    container = db.get_container_client(CONTAINER_ID)
-    print('Container with id \'{0}\' was found'.format(CONTAINER_ID))
-
-# Initialize the ChromaDB client
-chroma_settings = Settings(persist_directory="chroma_data")
-chroma_client = chromadb.Client(chroma_settings)
-collection = chroma_client.get_or_create_collection("stock_data")
+# ChromaDB settings
+CHROMA_PERSIST_DIRECTORY = 'chroma_data'
+CHROMA_COLLECTION = 'stock_data'
+
+
+def cosmos_client():
+    import azure.cosmos.cosmos_client as cosmos_client_module
+
+    return cosmos_client_module.CosmosClient(HOST, {'masterKey': MASTER_KEY})
+
+
+def open_container():
+    return cosmos_client().get_database_client(DATABASE_ID).get_container_client(CONTAINER_ID)
+
+
+def chroma_client():
+    import chromadb
+
+    # chromadb.Client(Settings(persist_directory=...)) is in-memory on
+    # chromadb >= 0.4; PersistentClient is what actually writes to disk.
+    return chromadb.PersistentClient(path=CHROMA_PERSIST_DIRECTORY)
+
+
+def open_collection():
+    # Local and idempotent, so unlike Cosmos it needs no separate provisioning.
+    return chroma_client().get_or_create_collection(CHROMA_COLLECTION)
+
+
+container = Lazy(open_container, 'cosmos container')
+collection = Lazy(open_collection, 'chroma collection')
@@ -0,0 +1,145 @@
+# embedding_backends.py
+#
+# The embedding model behind utils.generate_embedding and utils.encode_batch.
+#
+# Every backend has the same interface, ``encode(texts, batch_size)``, which
+# returns an (n, 384) float32 array of L2-normalised sentence embeddings
+# (all-MiniLM-L6-v2: mean pooling over 256 tokens at most). Which backend
+# runs is chosen with EMBED_BACKEND:
+#
+#   torch       SentenceTransformer in full precision, as before
+#   onnx        the same network exported to ONNX and run by ONNX Runtime
+#   onnx-int8   that export with its weights dynamically quantized to int8:
+#               about a quarter of the size, and faster on most CPUs
+#
+# EMBED_THREADS sets the intra-op thread count of either runtime (0 leaves
+# the library default, one per core). The ONNX backends need the exported
+# model in EMBED_ONNX_DIR; ``export_onnx`` writes it (python provision.py
+# --export-onnx), and it is exported on first use if missing.
+
+import logging
+import os
+import time
+
+import numpy as np
+
+import config
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('torch', 'onnx', 'onnx-int8')
+MAX_SEQ_LENGTH = 256
+ONNX_FILES = {'onnx': 'model.onnx', 'onnx-int8': 'model_int8.onnx'}
+ONNX_INPUTS = ('input_ids', 'attention_mask', 'token_type_ids')
+
+
+class TorchBackend:
+    name = 'torch'
+
+    def __init__(self, model_name, threads=0):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        if threads:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.model.max_seq_length = min(self.model.max_seq_length or MAX_SEQ_LENGTH, MAX_SEQ_LENGTH)
+        self.threads = torch.get_num_threads()
+
+    def encode(self, texts, batch_size=32):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size, normalize_embeddings=True),
+                          dtype=np.float32)
+
+
+class OnnxBackend:
+    """An ``export_onnx`` model run by ONNX Runtime, tokenised by the
+    ``tokenizers`` library; neither torch nor transformers is imported."""
+
+    def __init__(self, model_dir, quantized=True, threads=0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.name = 'onnx-int8' if quantized else 'onnx'
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, ONNX_FILES[self.name]), options,
+                                                    providers=['CPUExecutionProvider'])
+        self.threads = threads or os.cpu_count()
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, 'tokenizer.json'))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+        self.inputs = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        out = []
+        # Sorting by length keeps each batch's padding short, as
+        # SentenceTransformer.encode does.
+        order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch([texts[i] for i in order[start:start + batch_size]])
+            feed = {
+                'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+                'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+            }
+            out.append(self.session.run(None, {name: feed[name] for name in self.inputs})[0])
+        if not out:
+            return np.zeros((0, self.session.get_outputs()[0].shape[-1] or 384), dtype=np.float32)
+        embeddings = np.empty((len(texts), out[0].shape[1]), dtype=np.float32)
+        embeddings[order] = np.concatenate(out)
+        return embeddings
+
+
+def export_onnx(model_name, model_dir):
+    """Export ``model_name`` (a SentenceTransformer name or path) to
+    ``model_dir`` as model.onnx, its int8-quantized model_int8.onnx, and
+    tokenizer.json. Pooling and normalisation are part of the graph."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    class Pooled(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            hidden = self.model(input_ids=input_ids, attention_mask=attention_mask,
+                                token_type_ids=token_type_ids).last_hidden_state
+            mask = attention_mask.unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1e-9)
+            return torch.nn.functional.normalize(pooled, p=2, dim=1)
+
+    start = time.perf_counter()
+    os.makedirs(model_dir, exist_ok=True)
+    transformer = SentenceTransformer(model_name, device='cpu')[0]
+    tokenizer = transformer.tokenizer
+    tokenizer.save_pretrained(model_dir)
+    sample = tokenizer(['an example sentence', 'another'], padding=True, return_tensors='pt')
+    axes = {name: {0: 'batch', 1: 'tokens'} for name in ONNX_INPUTS}
+    path = os.path.join(model_dir, ONNX_FILES['onnx'])
+    torch.onnx.export(Pooled(transformer.auto_model.eval()), tuple(sample[name] for name in ONNX_INPUTS), path,
+                      input_names=list(ONNX_INPUTS), output_names=['embedding'],
+                      dynamic_axes=dict(axes, embedding={0: 'batch'}), opset_version=17, dynamo=False)
+    quantize_dynamic(path, os.path.join(model_dir, ONNX_FILES['onnx-int8']), weight_type=QuantType.QInt8)
+    logger.info('Exported %s to %s in %.1fs', model_name, model_dir, time.perf_counter() - start)
+
+
+def load_backend(name=None, threads=None, model_name=None, model_dir=None):
+    """The configured backend, loaded in this process."""
+    name = name or config.EMBED_BACKEND
+    threads = config.EMBED_THREADS if threads is None else threads
+    model_name = model_name or config.EMBED_MODEL
+    if name not in BACKENDS:
+        raise ValueError(f'Unknown EMBED_BACKEND {name!r} (expected one of {", ".join(BACKENDS)})')
+    if name == 'torch':
+        return TorchBackend(model_name, threads)
+
+    model_dir = model_dir or config.EMBED_ONNX_DIR
+    if not os.path.exists(os.path.join(model_dir, ONNX_FILES[name])):
+        logger.warning('No ONNX export in %s; exporting %s now', model_dir, model_name)
+        export_onnx(model_name, model_dir)
+    return OnnxBackend(model_dir, quantized=name == 'onnx-int8', threads=threads)
@@ -0,0 +1,151 @@
+# embedding_pipeline.py
+
+import logging
+import queue
+import threading
+import time
+
+import config
+from chunking import Chunk
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingPipeline:
+    """Embeds and stores documents off the request thread, in micro-batches.
+
+    ``submit`` puts a document on a bounded queue and returns at once; when
+    the queue is full the document is dropped and counted rather than
+    holding up the request. A single worker thread takes up to
+    ``batch_size`` documents, waiting at most ``max_wait`` seconds after
+    the first one for the batch to fill, embeds them with one
+    ``encode_batch(texts)`` call and hands the whole batch to
+    ``write_batch(ids, embeddings, documents, metadatas)``.
+
+    With ``prepare(doc_id, document, metadata) -> [Chunk]`` each submitted
+    document is split into chunks on the worker thread first, and with
+    ``hashes`` (a ``chunking.ContentHashes``) chunks whose content is
+    already stored are dropped before encoding. After each write,
+    ``retire({doc_id: [chunk ids]})`` is given every document's complete
+    chunk list, to retire stored chunks a document no longer has; it
+    returns their ids.
+
+    The thread starts with the first submitted document, so importing or
+    constructing a pipeline costs nothing.
+    """
+
+    def __init__(self, encode_batch, write_batch, batch_size=None, max_wait=None, queue_size=None,
+                 prepare=None, hashes=None, retire=None):
+        self.encode_batch = encode_batch
+        self.write_batch = write_batch
+        self.prepare = prepare
+        self.hashes = hashes
+        self.retire = retire
+        self.batch_size = batch_size or config.EMBED_BATCH_SIZE
+        self.max_wait = config.EMBED_BATCH_WAIT if max_wait is None else max_wait
+        self.queue = queue.Queue(queue_size or config.EMBED_QUEUE_SIZE)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'submitted': 0, 'dropped': 0, 'chunks': 0, 'unchanged': 0, 'embedded': 0,
+                       'retired': 0, 'batches': 0, 'failed': 0}
+        self._last_batch = None
+
+    def submit(self, doc_id, document, metadata=None):
+        """Queue ``document`` for embedding; False if it was dropped."""
+        self._start()
+        try:
+            self.queue.put_nowait((doc_id, document, metadata or {}))
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        return True
+
+    def _start(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='embedding-pipeline', daemon=True)
+                    self._thread.start()
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self._stats[name] += n
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                self._process(batch)
+            except Exception:
+                self._count('failed', len(batch))
+                logger.exception('Embedding batch of %d documents failed', len(batch))
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    def _process(self, batch):
+        chunks = []
+        chunk_ids = {}
+        for doc_id, document, metadata in batch:
+            if self.prepare is None:
+                prepared = [Chunk(doc_id, document, metadata)]
+            else:
+                prepared = self.prepare(doc_id, document, metadata)
+            chunk_ids[doc_id] = [chunk.id for chunk in prepared]
+            chunks.extend(prepared)
+        self._count('chunks', len(chunks))
+
+        # A batch can't carry the same id twice; the newest chunk wins.
+        chunks = list({chunk.id: chunk for chunk in chunks}.values())
+        if self.hashes is not None:
+            fresh = self.hashes.changed(chunks)
+            self._count('unchanged', len(chunks) - len(fresh))
+            chunks = fresh
+        if chunks:
+            self._write(chunks)
+        if self.retire is not None:
+            retired = self.retire(chunk_ids)
+            self._count('retired', len(retired))
+            if self.hashes is not None:
+                self.hashes.forget(retired)
+
+    def _write(self, chunks):
+        start = time.perf_counter()
+        embeddings = self.encode_batch([chunk.text for chunk in chunks])
+        encoded = time.perf_counter()
+        self.write_batch([chunk.id for chunk in chunks], embeddings,
+                         [chunk.text for chunk in chunks], [chunk.metadata for chunk in chunks])
+        if self.hashes is not None:
+            self.hashes.remember(chunks)
+
+        self._count('embedded', len(chunks))
+        self._count('batches')
+        self._last_batch = {'size': len(chunks), 'encode_ms': (encoded - start) * 1000,
+                            'write_ms': (time.perf_counter() - encoded) * 1000}
+
+    def join(self):
+        """Block until everything submitted so far has been processed."""
+        self.queue.join()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats, queued=self.queue.qsize(), batch_size=self.batch_size,
+                         last_batch=self._last_batch)
+        if self.hashes is not None:
+            stats['dedup'] = self.hashes.stats()
+        return stats
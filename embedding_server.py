@@ -0,0 +1,190 @@
+# embedding_server.py
+#
+# One process that holds the embedding model for every gunicorn worker.
+#
+# Loaded in each worker, the model costs each of them its own copy of the
+# weights (about 90 MB in fp32, plus the runtime around them) and its own
+# thread pool, and with several workers those pools fight over the cores.
+# With EMBED_SERVER_ADDRESS set, gunicorn.conf.py starts this server before
+# the workers fork, and utils.embedding_model becomes a RemoteBackend that
+# sends its texts here. The model is loaded once, and one forward pass runs
+# at a time on EMBED_THREADS threads.
+#
+# Requests travel over multiprocessing.connection, pickled, so whoever can
+# connect can run code in the server. Serve on a Unix socket path: it is
+# created readable and writable by its owner only, and EMBED_SERVER_AUTHKEY
+# authenticates clients if set (gunicorn.conf.py sets a random one). A
+# "host:port" address is refused unless EMBED_SERVER_AUTHKEY is a real
+# secret. To run it on its own:
+#
+#   python embedding_server.py [--backend onnx-int8] [--threads N]
+
+import argparse
+import logging
+import os
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import config
+import embedding_backends
+import logging_setup
+
+logger = logging.getLogger(__name__)
+
+# How long a client keeps retrying while the server is still loading its model.
+CONNECT_TIMEOUT = 120
+
+# Shortest EMBED_SERVER_AUTHKEY accepted for a TCP address.
+MIN_TCP_AUTHKEY_LENGTH = 32
+
+
+def parse_address(address):
+    """``'127.0.0.1:7070'`` -> ``('127.0.0.1', 7070)``; anything else is a
+    Unix socket path."""
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit() and os.sep not in address:
+        return host, int(port)
+    return address
+
+
+def authkey_for(address, authkey):
+    """``authkey`` as bytes (None when empty), or ValueError if ``address``
+    is TCP and ``authkey`` is too short to keep strangers out."""
+    if not isinstance(address, str) and len(authkey) < MIN_TCP_AUTHKEY_LENGTH:
+        raise ValueError(f'Refusing to use the embedding server over TCP ({address[0]}:{address[1]}) without an '
+                         f'EMBED_SERVER_AUTHKEY of at least {MIN_TCP_AUTHKEY_LENGTH} characters; '
+                         'use a Unix socket path or set a random secret')
+    return authkey.encode() if authkey else None
+
+
+class EmbeddingServer:
+    """Answers ``('encode', texts, batch_size)`` with an embedding array and
+    ``('info',)`` with the backend's name and threads, one thread per
+    connection."""
+
+    def __init__(self, backend, address=None, authkey=None):
+        self.backend = backend
+        self.address = parse_address(address or config.EMBED_SERVER_ADDRESS)
+        self.authkey = authkey_for(self.address, authkey or config.EMBED_SERVER_AUTHKEY)
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'texts': 0, 'encode_seconds': 0.0}
+
+    def serve_forever(self):
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+        # Other users may not connect to the socket: it is created 0600.
+        umask = os.umask(0o177)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        with listener:
+            logger.info('Embedding server (%s, %d threads) listening on %s',
+                        self.backend.name, self.backend.threads, self.address)
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception:
+                    logger.warning('Rejected an embedding client', exc_info=True)
+                    continue
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            while True:
+                try:
+                    request = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(('ok', self._handle(request)))
+                except Exception as exc:
+                    logger.exception('Embedding request failed')
+                    conn.send(('error', f'{type(exc).__name__}: {exc}'))
+
+    def _handle(self, request):
+        if request[0] == 'info':
+            with self._lock:
+                return dict(self._stats, backend=self.backend.name, threads=self.backend.threads, pid=os.getpid())
+        _, texts, batch_size = request
+        # Forward passes already use every EMBED_THREADS thread; running two
+        # at once would only make both slower.
+        with self._lock:
+            start = time.perf_counter()
+            embeddings = self.backend.encode(texts, batch_size)
+            self._stats['requests'] += 1
+            self._stats['texts'] += len(texts)
+            self._stats['encode_seconds'] += time.perf_counter() - start
+        return embeddings
+
+
+class RemoteBackend:
+    """The backend interface, answered by an EmbeddingServer. Each thread
+    keeps its own connection."""
+
+    def __init__(self, address=None, authkey=None, connect_timeout=CONNECT_TIMEOUT):
+        self.address = parse_address(address or config.EMBED_SERVER_ADDRESS)
+        self.authkey = authkey_for(self.address, authkey or config.EMBED_SERVER_AUTHKEY)
+        self.connect_timeout = connect_timeout
+        self._local = threading.local()
+        info = self.info()
+        self.name = f'remote:{info["backend"]}'
+        self.threads = info['threads']
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            deadline = time.monotonic() + self.connect_timeout
+            while True:
+                try:
+                    conn = Client(self.address, authkey=self.authkey)
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() >= deadline:
+                        raise
+                    time.sleep(0.5)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, *request):
+        conn = self._connection()
+        try:
+            conn.send(request)
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # The server restarted; the next call reconnects.
+            self._local.conn = None
+            conn.close()
+            raise
+        if status != 'ok':
+            raise RuntimeError(f'Embedding server: {result}')
+        return result
+
+    def encode(self, texts, batch_size=32):
+        return self._call('encode', list(texts), batch_size)
+
+    def info(self):
+        return self._call('info')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the embedding model to the app workers.')
+    parser.add_argument('--address', default=config.EMBED_SERVER_ADDRESS)
+    parser.add_argument('--backend', default=config.EMBED_BACKEND, choices=embedding_backends.BACKENDS)
+    parser.add_argument('--threads', type=int, default=config.EMBED_THREADS)
+    args = parser.parse_args()
+    if not args.address:
+        parser.error('set EMBED_SERVER_ADDRESS or pass --address')
+    try:
+        authkey_for(parse_address(args.address), config.EMBED_SERVER_AUTHKEY)
+    except ValueError as e:
+        parser.error(str(e))
+
+    logging_setup.configure()
+    backend = embedding_backends.load_backend(args.backend, args.threads)
+    EmbeddingServer(backend, args.address).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,42 @@
+# gunicorn.conf.py
+#
+# Read by gunicorn from the working directory (see Procfile). With
+# EMBED_SERVER_ADDRESS set, the arbiter starts embedding_server.py before
+# forking any worker and stops it on exit, so the model is loaded once for
+# all of them; see embedding_server.py.
+
+import os
+import secrets
+import subprocess
+import sys
+
+# gunicorn execs this file before it puts the app directory on sys.path.
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+import config  # noqa: E402
+
+# Without a configured authkey, the server and the workers share a random one:
+# through the environment for the server's process, and through config for
+# the workers, which fork from this one.
+if config.EMBED_SERVER_ADDRESS and not config.EMBED_SERVER_AUTHKEY:
+    config.EMBED_SERVER_AUTHKEY = os.environ['EMBED_SERVER_AUTHKEY'] = secrets.token_hex(32)
+
+_embedding_server = None
+
+
+def on_starting(server):
+    global _embedding_server
+    if config.EMBED_SERVER_ADDRESS:
+        _embedding_server = subprocess.Popen([sys.executable, os.path.join(HERE, 'embedding_server.py')])
+        server.log.info('Started embedding server (pid %s) on %s', _embedding_server.pid,
+                        config.EMBED_SERVER_ADDRESS)
+
+
+def on_exit(server):
+    if _embedding_server is not None and _embedding_server.poll() is None:
+        _embedding_server.terminate()
+        try:
+            _embedding_server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _embedding_server.kill()
@@ -0,0 +1,217 @@
+# holdings.py
+
+import datetime
+
+import azure.cosmos.exceptions as exceptions
+
+HOLDING_TYPE = 'holding'
+
+# Cosmos DB limits: operations per transactional batch and per patch request.
+MAX_BATCH_OPERATIONS = 100
+MAX_PATCH_OPERATIONS = 10
+
+
+class HoldingsConflict(Exception):
+    """Raised when a batch kept colliding with concurrent edits to the same positions."""
+
+
+def normalize_symbol(symbol):
+    return str(symbol or '').strip().upper()
+
+
+def lot_symbol(stock):
+    if isinstance(stock, dict):
+        return normalize_symbol(stock.get('symbol'))
+    return normalize_symbol(stock)
+
+
+def lot_quantity(lot):
+    """Shares in a lot; lots saved without a quantity count as one share."""
+    if not isinstance(lot, dict):
+        return 1.0
+    try:
+        return float(lot.get('quantity', 1))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def lot_cost(lot):
+    """What a lot cost in total, from its per-share ``purchasePrice`` (or
+    ``price``), or None when the lot doesn't say."""
+    if not isinstance(lot, dict):
+        return None
+    price = lot.get('purchasePrice', lot.get('price'))
+    try:
+        return float(price) * lot_quantity(lot)
+    except (TypeError, ValueError):
+        return None
+
+
+def holding_id(symbol):
+    return f'holding:{normalize_symbol(symbol)}'
+
+
+def new_holding(email, symbol, lots):
+    return {
+        'id': holding_id(symbol),
+        'partitionKey': email,
+        'type': HOLDING_TYPE,
+        'email': email,
+        'symbol': normalize_symbol(symbol),
+        'lots': list(lots),
+        'updatedAt': datetime.datetime.utcnow().isoformat(),
+    }
+
+
+def group_by_symbol(stocks):
+    groups = {}
+    for stock in stocks:
+        groups.setdefault(lot_symbol(stock), []).append(stock)
+    return groups
+
+
+def flatten(holdings):
+    return [lot for holding in holdings for lot in holding.get('lots', [])]
+
+
+class HoldingsRepository:
+    """One document per position, stored in the owning user's partition.
+
+    A position is ``holding:<SYMBOL>`` with the user's email as partition key,
+    and keeps every lot added for that symbol in ``lots``. Each lot is the
+    stock object the client posted. All reads are single-partition: point
+    reads for one symbol, partition-scoped queries for listing and
+    aggregates. The user profile document is never loaded.
+    """
+
+    def __init__(self, container, max_retries=3):
+        self.container = container
+        self.max_retries = max_retries
+
+    def get(self, email, symbol):
+        try:
+            return self.container.read_item(item=holding_id(symbol), partition_key=email)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    def list(self, email, limit=50, continuation=None):
+        """Return one page of positions ordered by symbol and the token for the next page."""
+        pages = self.container.query_items(
+            query='SELECT * FROM c WHERE c.type = @type ORDER BY c.symbol',
+            parameters=[{'name': '@type', 'value': HOLDING_TYPE}],
+            partition_key=email,
+            max_item_count=limit,
+        ).by_page(continuation)
+        try:
+            page = list(next(pages))
+        except StopIteration:
+            return [], None
+        return page, pages.continuation_token
+
+    def all(self, email):
+        return list(self.container.query_items(
+            query='SELECT * FROM c WHERE c.type = @type ORDER BY c.symbol',
+            parameters=[{'name': '@type', 'value': HOLDING_TYPE}],
+            partition_key=email,
+        ))
+
+    def lots(self, email):
+        return flatten(self.all(email))
+
+    def symbols(self, email):
+        return list(self.container.query_items(
+            query='SELECT VALUE c.symbol FROM c WHERE c.type = @type',
+            parameters=[{'name': '@type', 'value': HOLDING_TYPE}],
+            partition_key=email,
+        ))
+
+    def versions(self, email):
+        """``{symbol: _etag}`` for every position; changes whenever a position's lots do."""
+        rows = self.container.query_items(
+            query='SELECT c.symbol, c._etag FROM c WHERE c.type = @type',
+            parameters=[{'name': '@type', 'value': HOLDING_TYPE}],
+            partition_key=email,
+        )
+        return {row['symbol']: row['_etag'] for row in rows}
+
+    def summary(self, email):
+        rows = list(self.container.query_items(
+            query='SELECT COUNT(1) AS positions, SUM(ARRAY_LENGTH(c.lots)) AS lots '
+                  'FROM c WHERE c.type = @type',
+            parameters=[{'name': '@type', 'value': HOLDING_TYPE}],
+            partition_key=email,
+        ))
+        row = rows[0] if rows else {}
+        return {'positions': row.get('positions', 0), 'lots': row.get('lots') or 0}
+
+    def add(self, email, stock):
+        symbol = lot_symbol(stock)
+        if not symbol:
+            raise ValueError('Stock has no symbol')
+
+        for _ in range(self.max_retries):
+            try:
+                return self.container.patch_item(
+                    item=holding_id(symbol), partition_key=email,
+                    patch_operations=[{'op': 'add', 'path': '/lots/-', 'value': stock}],
+                )
+            except exceptions.CosmosResourceNotFoundError:
+                pass
+            try:
+                return self.container.create_item(body=new_holding(email, symbol, [stock]))
+            except exceptions.CosmosResourceExistsError:
+                # Another request opened the position first; append to it.
+                continue
+        raise HoldingsConflict(f'Could not add {symbol} for {email}')
+
+    def apply(self, email, add=(), remove=()):
+        """Remove the positions in ``remove`` and add the lots in ``add``.
+
+        Everything goes to Cosmos as one transactional batch in the user's
+        partition, so either all changes land or none do.
+        """
+        removing = {normalize_symbol(symbol) for symbol in remove}
+        adding = group_by_symbol(add)
+        if '' in adding:
+            raise ValueError('Stock has no symbol')
+
+        for _ in range(self.max_retries):
+            existing = set(self.symbols(email))
+            operations = []
+
+            for symbol in removing & existing:
+                if symbol not in adding:
+                    operations.append(('delete', (holding_id(symbol),)))
+
+            for symbol, lots in adding.items():
+                if symbol in existing and symbol not in removing:
+                    for start in range(0, len(lots), MAX_PATCH_OPERATIONS):
+                        ops = [{'op': 'add', 'path': '/lots/-', 'value': lot}
+                               for lot in lots[start:start + MAX_PATCH_OPERATIONS]]
+                        operations.append(('patch', (holding_id(symbol), ops)))
+                elif symbol in existing:
+                    operations.append(('upsert', (new_holding(email, symbol, lots),)))
+                else:
+                    operations.append(('create', (new_holding(email, symbol, lots),)))
+
+            if not operations:
+                return
+            if len(operations) > MAX_BATCH_OPERATIONS:
+                raise ValueError(f'At most {MAX_BATCH_OPERATIONS} position changes per batch')
+
+            try:
+                self.container.execute_item_batch(batch_operations=operations, partition_key=email)
+                return
+            except exceptions.CosmosBatchOperationError:
+                # A position was created or deleted under us; re-read and rebuild.
+                continue
+        raise HoldingsConflict(f'Holdings for {email} changed concurrently {self.max_retries} times')
+
+    def clear(self, email):
+        ids = [holding_id(symbol) for symbol in self.symbols(email)]
+        for start in range(0, len(ids), MAX_BATCH_OPERATIONS):
+            self.container.execute_item_batch(
+                batch_operations=[('delete', (item_id,)) for item_id in ids[start:start + MAX_BATCH_OPERATIONS]],
+                partition_key=email,
+            )
+        return len(ids)
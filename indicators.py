@@ -0,0 +1,340 @@
+# indicators.py
+
+import math
+from collections import deque
+
+import numpy as np
+
+import config
+import stock_cache
+
+
+def ewm(values, alpha, initial):
+    """Exponential smoothing ``y[t] = (1 - alpha) * y[t-1] + alpha * x[t]``
+    with ``y[-1] = initial``, without a Python-level loop over the bars.
+
+    Unrolled, ``y[t] = d**(t+1) * initial + alpha * d**t * sum(x[k] * d**-k)``
+    with ``d = 1 - alpha``, which is a cumsum. ``d**-k`` overflows on long
+    series, so the series is processed in blocks short enough that it stays
+    below ~1e87, carrying the last value from one block into the next.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    out = np.empty(len(values))
+    decay = 1.0 - alpha
+    if decay <= 0.0:
+        out[:] = values
+        return out
+
+    block = max(1, int(200 / -math.log(decay)))
+    previous = initial
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        k = np.arange(len(chunk))
+        down = decay ** k
+        smoothed = decay * down * previous + alpha * down * np.cumsum(chunk / down)
+        out[start:start + len(chunk)] = smoothed
+        previous = smoothed[-1]
+    return out
+
+
+def smooth(values, period, alpha):
+    """Seeded exponential average: NaN for the first ``period - 1`` values,
+    the simple mean of the first ``period`` at index ``period - 1``, then
+    ``ewm`` from there. With ``alpha = 2 / (period + 1)`` this is the usual
+    EMA; with ``alpha = 1 / period`` it is Wilder's smoothing."""
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    seed = values[:period].mean()
+    out[period - 1] = seed
+    out[period:] = ewm(values[period:], alpha, seed)
+    return out
+
+
+def rolling_mean(values, period):
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    sums = np.cumsum(np.r_[0.0, values])
+    out[period - 1:] = (sums[period:] - sums[:-period]) / period
+    return out
+
+
+def rolling_std(values, period):
+    out = np.full(len(values), np.nan)
+    if len(values) < period:
+        return out
+    out[period - 1:] = np.lib.stride_tricks.sliding_window_view(values, period).std(axis=1)
+    return out
+
+
+class Smoother:
+    """One step of ``smooth``: buffers values until the seed mean is
+    available, then applies the exponential update."""
+
+    __slots__ = ('period', 'alpha', 'value', 'pending')
+
+    def __init__(self, period, alpha, value=None, pending=()):
+        self.period = period
+        self.alpha = alpha
+        self.value = value
+        self.pending = list(pending)
+
+    @classmethod
+    def after(cls, values, smoothed, period, alpha):
+        """State equivalent to having stepped through ``values``."""
+        if len(values) >= period:
+            return cls(period, alpha, value=float(smoothed[-1]))
+        return cls(period, alpha, pending=np.asarray(values, dtype=np.float64).tolist())
+
+    def step(self, x):
+        if self.value is not None:
+            self.value += self.alpha * (x - self.value)
+        else:
+            self.pending.append(x)
+            if len(self.pending) == self.period:
+                self.value = sum(self.pending) / self.period
+                self.pending = []
+        return math.nan if self.value is None else self.value
+
+
+class Indicator:
+    """One indicator with fixed parameters over a close series.
+
+    ``compute`` runs over the whole history and returns the output columns
+    and a state; ``step`` takes that state and one more close and returns
+    the next value of each output, so a series that grew by a bar doesn't
+    have to be recomputed.
+    """
+
+    name = None
+    defaults = ()
+    outputs = ('value',)
+    # How many leading parameters are bar counts and must be whole numbers.
+    periods = 1
+
+    def __init__(self, *params):
+        params = params or self.defaults
+        if len(params) != len(self.defaults) or any(p <= 0 for p in params):
+            raise ValueError(f'{self.name} takes {len(self.defaults)} positive parameter(s)')
+        if any(p != int(p) for p in params[:self.periods]):
+            raise ValueError(f'{self.name} periods must be whole numbers')
+        self.params = params
+
+    @property
+    def spec(self):
+        return ':'.join([self.name] + [f'{p:g}' for p in self.params])
+
+    def compute(self, close):
+        raise NotImplementedError
+
+    def step(self, state, x):
+        raise NotImplementedError
+
+
+class SMA(Indicator):
+    name = 'sma'
+    defaults = (20,)
+
+    def compute(self, close):
+        period = int(self.params[0])
+        return {'value': rolling_mean(close, period)}, deque(close[-period:].tolist(), maxlen=period)
+
+    def step(self, window, x):
+        window.append(x)
+        value = sum(window) / window.maxlen if len(window) == window.maxlen else math.nan
+        return {'value': value}, window
+
+
+class EMA(Indicator):
+    name = 'ema'
+    defaults = (20,)
+
+    def compute(self, close):
+        period = int(self.params[0])
+        alpha = 2.0 / (period + 1)
+        values = smooth(close, period, alpha)
+        return {'value': values}, Smoother.after(close, values, period, alpha)
+
+    def step(self, smoother, x):
+        return {'value': smoother.step(x)}, smoother
+
+
+class RSI(Indicator):
+    name = 'rsi'
+    defaults = (14,)
+
+    @staticmethod
+    def _rsi(avg_gain, avg_loss):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi = 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+        return np.where(avg_loss == 0, np.where(avg_gain == 0, 50.0, 100.0), rsi)
+
+    def compute(self, close):
+        period = int(self.params[0])
+        change = np.diff(close)
+        gains, losses = np.maximum(change, 0.0), np.maximum(-change, 0.0)
+        avg_gain = smooth(gains, period, 1.0 / period)
+        avg_loss = smooth(losses, period, 1.0 / period)
+        values = np.full(len(close), np.nan)
+        values[1:] = self._rsi(avg_gain, avg_loss)
+        values[1:][np.isnan(avg_gain)] = np.nan
+        state = {
+            'last': float(close[-1]) if len(close) else None,
+            'gain': Smoother.after(gains, avg_gain, period, 1.0 / period),
+            'loss': Smoother.after(losses, avg_loss, period, 1.0 / period),
+        }
+        return {'value': values}, state
+
+    def step(self, state, x):
+        if state['last'] is None:
+            state['last'] = x
+            return {'value': math.nan}, state
+        change = x - state['last']
+        state['last'] = x
+        gain = state['gain'].step(max(change, 0.0))
+        loss = state['loss'].step(max(-change, 0.0))
+        if math.isnan(gain):
+            return {'value': math.nan}, state
+        return {'value': float(self._rsi(np.float64(gain), np.float64(loss)))}, state
+
+
+class MACD(Indicator):
+    name = 'macd'
+    defaults = (12, 26, 9)
+    outputs = ('macd', 'signal', 'histogram')
+    periods = 3
+
+    def compute(self, close):
+        fast, slow, signal = (int(p) for p in self.params)
+        fast_ema = smooth(close, fast, 2.0 / (fast + 1))
+        slow_ema = smooth(close, slow, 2.0 / (slow + 1))
+        macd = fast_ema - slow_ema
+
+        # The signal line is an EMA of the MACD line from where it is defined.
+        defined = macd[slow - 1:] if len(close) >= slow else macd[:0]
+        signal_values = np.full(len(close), np.nan)
+        signal_values[len(close) - len(defined):] = smooth(defined, signal, 2.0 / (signal + 1))
+
+        state = {
+            'fast': Smoother.after(close, fast_ema, fast, 2.0 / (fast + 1)),
+            'slow': Smoother.after(close, slow_ema, slow, 2.0 / (slow + 1)),
+            'signal': Smoother.after(defined, signal_values, signal, 2.0 / (signal + 1)),
+        }
+        outputs = {'macd': macd, 'signal': signal_values, 'histogram': macd - signal_values}
+        return outputs, state
+
+    def step(self, state, x):
+        macd = state['fast'].step(x) - state['slow'].step(x)
+        signal = state['signal'].step(macd) if not math.isnan(macd) else math.nan
+        return {'macd': macd, 'signal': signal, 'histogram': macd - signal}, state
+
+
+class BollingerBands(Indicator):
+    name = 'bbands'
+    defaults = (20, 2)
+    outputs = ('middle', 'upper', 'lower')
+
+    def compute(self, close):
+        period, width = int(self.params[0]), self.params[1]
+        middle = rolling_mean(close, period)
+        spread = width * rolling_std(close, period)
+        outputs = {'middle': middle, 'upper': middle + spread, 'lower': middle - spread}
+        return outputs, deque(close[-period:].tolist(), maxlen=period)
+
+    def step(self, window, x):
+        window.append(x)
+        if len(window) < window.maxlen:
+            return {'middle': math.nan, 'upper': math.nan, 'lower': math.nan}, window
+        values = np.array(window)
+        middle, spread = values.mean(), self.params[1] * values.std()
+        return {'middle': middle, 'upper': middle + spread, 'lower': middle - spread}, window
+
+
+INDICATORS = {cls.name: cls for cls in (SMA, EMA, RSI, MACD, BollingerBands)}
+
+INTERVALS = {'daily': None, 'weekly': 'W', 'monthly': 'M'}
+
+MAX_PERIOD = 500
+
+
+def parse_spec(spec):
+    """``"macd:12:26:9"`` -> ``MACD(12, 26, 9)``; parameters may be omitted."""
+    name, *params = spec.strip().lower().split(':')
+    if name not in INDICATORS:
+        raise ValueError(f'Unknown indicator: {name} (expected one of {", ".join(INDICATORS)})')
+    try:
+        values = [float(p) for p in params]
+    except ValueError:
+        raise ValueError(f'Invalid parameters for {name}: {":".join(params)}')
+    if any(v > MAX_PERIOD for v in values):
+        raise ValueError(f'Indicator parameters are limited to {MAX_PERIOD}')
+    return INDICATORS[name](*values)
+
+
+class Result:
+    """Memoized output of one indicator over a series: the dates, each output
+    column aligned with them, and the state to extend it by more bars."""
+
+    __slots__ = ('dates', 'last_close', 'columns', 'state')
+
+    def __init__(self, dates, last_close, columns, state):
+        self.dates = dates
+        self.last_close = last_close
+        self.columns = columns
+        self.state = state
+
+    def extend(self, indicator, dates, closes):
+        steps = {name: [] for name in self.columns}
+        state = self.state
+        for x in closes.tolist():
+            values, state = indicator.step(state, x)
+            for name, value in values.items():
+                steps[name].append(value)
+        self.dates = np.concatenate([self.dates, dates])
+        self.columns = {name: np.concatenate([column, steps[name]])
+                        for name, column in self.columns.items()}
+        self.last_close = float(closes[-1])
+        self.state = state
+
+
+def memo_key(symbol, interval, outputsize, indicator):
+    return stock_cache.cache_key('indicator', symbol, {
+        'interval': interval, 'outputsize': outputsize, 'spec': indicator.spec,
+    })
+
+
+def evaluate(symbol, interval, outputsize, indicator, bars):
+    """Indicator columns aligned with ``bars``, from the memo where possible.
+
+    The memo is kept per (symbol, interval, outputsize, indicator and
+    parameters). When the bars start on the memo's first bar and still
+    contain its last bar unchanged, only the bars after it are stepped
+    through; otherwise (first request, revised history, a still-forming
+    weekly bar, a ``compact`` window that has slid forward) the full series
+    is recomputed. EMA, RSI and MACD are seeded from the first bars, so a
+    memo started on an earlier bar would give different values than a fresh
+    ``compute`` over ``bars``.
+    """
+    close = bars.columns['close']
+    key = memo_key(symbol, interval, outputsize, indicator)
+    result = stock_cache.cache.get(key)
+
+    if result is not None and len(bars) and len(result.dates) and result.dates[0] == bars.dates[0]:
+        at = np.searchsorted(bars.dates, result.dates[-1])
+        if at < len(bars) and bars.dates[at] == result.dates[-1] and close[at] == result.last_close:
+            if at + 1 < len(bars):
+                result.extend(indicator, bars.dates[at + 1:], close[at + 1:])
+                stock_cache.cache.set(key, result, timeout=config.INDICATOR_MEMO_TTL)
+            return result.columns
+
+    columns, state = indicator.compute(close)
+    last_close = float(close[-1]) if len(close) else math.nan
+    stock_cache.cache.set(key, Result(bars.dates, last_close, columns, state),
+                          timeout=config.INDICATOR_MEMO_TTL)
+    return columns
+
+
+def column_json(values):
+    # NaN isn't valid JSON; undefined points go out as null.
+    return [None if v != v else v for v in values.tolist()]
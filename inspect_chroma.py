@@ -1,14 +1,9 @@
-import chromadb
-from chromadb.config import Settings
+import db
 
-settings = Settings(persist_directory="chroma_data")
-
-client = chromadb.Client(settings)
-
-collection = client.get_or_create_collection("stock_data")
+collection = db.chroma_client().get_or_create_collection(db.CHROMA_COLLECTION)
 
 # Retrieve all documents in the collection
-all_docs = collection.get(include=['documents', 'metadatas', 'embeddings', 'ids'])
+all_docs = collection.get(include=['documents', 'metadatas', 'embeddings'])
 print("Stored IDs:", all_docs['ids'])
 print("Metadatas:", all_docs['metadatas'])
-print("Documents:", all_docs['documents'])
\ No newline at end of file
+print("Documents:", all_docs['documents'])
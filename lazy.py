@@ -0,0 +1,44 @@
+# lazy.py
+
+import threading
+
+
+class Lazy:
+    """A shared resource built on first use instead of at import time.
+
+    ``factory`` runs once, on the first ``resolve()`` or attribute access, and
+    its result is kept for the life of the process. If it raises, nothing
+    is kept and the next use tries again, so a database or model that is
+    briefly unavailable fails the requests that need it rather than the
+    worker's boot. Attribute access is forwarded, so a ``Lazy`` can be
+    passed wherever the resource itself is expected, which is also why the
+    accessor isn't called ``get``: Chroma collections have their own.
+    """
+
+    def __init__(self, factory, name=None):
+        self._factory = factory
+        self._name = name or getattr(factory, '__name__', 'resource')
+        self._value = None
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def resolve(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    self._value = self._factory()
+                    self._ready = True
+        return self._value
+
+    @property
+    def initialized(self):
+        return self._ready
+
+    def __getattr__(self, name):
+        if name.startswith('__') or name in ('_factory', '_name', '_value', '_ready', '_lock'):
+            raise AttributeError(name)
+        return getattr(self.resolve(), name)
+
+    def __repr__(self):
+        state = 'initialized' if self._ready else 'not initialized'
+        return f'<Lazy {self._name} ({state})>'
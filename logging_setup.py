@@ -0,0 +1,307 @@
+# logging_setup.py
+#
+# Process-wide logging and the structured access log.
+#
+# configure() replaces logging.basicConfig: records from every logger go on a
+# bounded queue and a single listener thread formats and writes them, so a
+# request thread never waits on stderr or a slow log pipe. When the queue is
+# full records are dropped and counted instead of blocking.
+#
+# AccessLog writes one JSON line per request to the 'access' logger. It
+# never buffers or decodes bodies unless a route is explicitly set to DEBUG,
+# and then only the first ACCESS_LOG_BODY_BYTES of each.
+
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+import time
+
+import config
+
+ACCESS_LOGGER = 'access'
+
+# A value cut off by truncation (no closing quote) is masked too.
+_SECRETS = re.compile(rb'("(?:password|new_password|token|secret|apikey|api_key)"\s*:\s*)"[^"]*"?', re.I)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` that never blocks and defers formatting.
+
+    The stock handler formats every record on the calling thread before
+    queueing it; this one only renders exception text (the traceback may be
+    gone by the time the listener runs) and leaves message formatting to the
+    listener thread.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class LogFormatter(logging.Formatter):
+    """Records with structured ``fields`` (the access log) as one JSON object
+    per line; others as plain text, or JSON too with ``json_lines``."""
+
+    def __init__(self, json_lines=False):
+        super().__init__('%(asctime)s %(levelname)s %(name)s: %(message)s')
+        self.json_lines = json_lines
+
+    def format(self, record):
+        if not self.json_lines and getattr(record, 'fields', None) is None:
+            return super().format(record)
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+        }
+        fields = getattr(record, 'fields', None)
+        if fields is not None:
+            entry.update(fields)
+        else:
+            entry['message'] = record.getMessage()
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+_handler = None
+_listener = None
+
+
+def configure(level=None, stream=None, json_lines=None, queue_size=None):
+    """Route all logging through a non-blocking queue to ``stream``.
+
+    Safe to call more than once; later calls only change the level.
+    """
+    global _handler, _listener
+    root = logging.getLogger()
+    root.setLevel(level or config.LOG_LEVEL)
+    logging.getLogger(ACCESS_LOGGER).setLevel(logging.DEBUG)
+    if _handler is not None:
+        return _handler
+
+    json_lines = config.LOG_JSON if json_lines is None else json_lines
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(LogFormatter(json_lines))
+
+    _handler = DroppingQueueHandler(queue_size or config.LOG_QUEUE_SIZE)
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(_handler)
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _handler
+
+
+def flush():
+    """Write out everything queued so far (tests, benchmarks, shutdown)."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def dropped():
+    return _handler.dropped if _handler is not None else 0
+
+
+def parse_route_levels(value):
+    """``"/metrics=WARNING,/login=OFF"`` -> ``{'/metrics': 30, '/login': 100}``."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        prefix, _, name = item.partition('=')
+        name = name.strip().upper()
+        if name == 'OFF':
+            levels[prefix.strip()] = logging.CRITICAL + 50
+        elif isinstance(logging.getLevelName(name), int):
+            levels[prefix.strip()] = logging.getLevelName(name)
+        else:
+            raise ValueError(f'Unknown log level {name!r} for {prefix!r}')
+    return levels
+
+
+class AccessLog:
+    """Decides which requests are logged, and how much of them.
+
+    Each request gets a level from its outcome: INFO for success, WARNING
+    for 4xx and for requests slower than ``slow_ms``, ERROR for 5xx. It is
+    logged if that level reaches its route's threshold (the longest
+    matching path prefix in ``route_levels``, else INFO). Successful, fast
+    requests are further sampled at ``sample_rate``; failures and slow
+    requests always are. Routes set to DEBUG also log the first
+    ``body_bytes`` of request and response bodies, with secrets masked.
+    """
+
+    def __init__(self, sample_rate=None, slow_ms=None, body_bytes=None, route_levels=None, logger=None):
+        self.sample_rate = config.ACCESS_LOG_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_ms = config.ACCESS_LOG_SLOW_MS if slow_ms is None else slow_ms
+        self.body_bytes = config.ACCESS_LOG_BODY_BYTES if body_bytes is None else body_bytes
+        route_levels = parse_route_levels(config.ACCESS_LOG_ROUTE_LEVELS) if route_levels is None else route_levels
+        # Longest prefix first so the most specific rule wins.
+        self.route_levels = sorted(route_levels.items(), key=lambda item: -len(item[0]))
+        self.logger = logger or logging.getLogger(ACCESS_LOGGER)
+        self._thresholds = {}
+
+    def threshold(self, path):
+        level = self._thresholds.get(path)
+        if level is None:
+            level = next((lvl for prefix, lvl in self.route_levels if path.startswith(prefix)), logging.INFO)
+            if len(self._thresholds) < 10000:
+                self._thresholds[path] = level
+        return level
+
+    def level_for(self, path, status, elapsed_ms):
+        """The level to log this request at, or None to skip it."""
+        if status >= 500:
+            level = logging.ERROR
+        elif status >= 400 or elapsed_ms >= self.slow_ms:
+            level = logging.WARNING
+        else:
+            level = logging.INFO
+        if level < self.threshold(path) or not self.logger.isEnabledFor(level):
+            return None
+        if level == logging.INFO and self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return None
+        return level
+
+    def wants_bodies(self, path):
+        return self.body_bytes > 0 and self.threshold(path) <= logging.DEBUG
+
+    def excerpt(self, body):
+        if body is None:
+            return None
+        text = _SECRETS.sub(rb'\1"***"', bytes(body[:self.body_bytes]))
+        suffix = '...' if len(body) > self.body_bytes else ''
+        return text.decode('utf-8', 'replace') + suffix
+
+    def emit(self, level, fields):
+        # Formatting (JSON encoding) happens on the listener thread.
+        self.logger.log(level, '%(method)s %(path)s %(status)s', fields, extra={'fields': fields})
+
+
+def _flask_request_body(request, limit):
+    length = request.content_length
+    if not length:
+        return None
+    # Reading caches the body for the view; bodies far larger than the
+    # excerpt are left unread.
+    return request.get_data(cache=True) if length <= 64 * limit else None
+
+
+def init_app(app, access_log=None):
+    """Access-log every request ``app`` serves; see ``AccessLog``."""
+    from flask import g, request
+
+    access_log = access_log or AccessLog()
+
+    @app.before_request
+    def start_access_timer():
+        g.access_start = time.perf_counter()
+
+    @app.after_request
+    def log_access(response):
+        start = g.pop('access_start', None)
+        if start is None:
+            return response
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        level = access_log.level_for(request.path, response.status_code, elapsed_ms)
+        if level is None:
+            return response
+
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'route': request.url_rule.rule if request.url_rule else None,
+            'status': response.status_code,
+            'bytes': response.content_length,
+            'ms': round(elapsed_ms, 2),
+            'remote': request.remote_addr,
+            'cache': response.headers.get('X-Cache'),
+        }
+        if access_log.wants_bodies(request.path):
+            fields['request_body'] = access_log.excerpt(_flask_request_body(request, access_log.body_bytes))
+            if not response.is_streamed:
+                fields['response_body'] = access_log.excerpt(response.get_data())
+        access_log.emit(level, fields)
+        return response
+
+    return access_log
+
+
+class AccessLogMiddleware:
+    """ASGI middleware giving asgi.py's own routes the same access log.
+
+    Requests routed to one of ``exclude`` (the mounted Flask app, which
+    ``init_app`` already logs) are skipped, going by the ``endpoint``
+    Starlette's router records in the scope.
+    """
+
+    def __init__(self, app, access_log=None, exclude=()):
+        self.app = app
+        self.access_log = access_log or AccessLog()
+        self.exclude = tuple(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        path = scope['path']
+        wants_bodies = self.access_log.wants_bodies(path)
+        state = {'status': 500, 'bytes': 0, 'cache': None, 'body': bytearray()}
+
+        async def send_and_measure(message):
+            if message['type'] == 'http.response.start':
+                state['status'] = message['status']
+                for name, value in message.get('headers', ()):
+                    if name.lower() == b'x-cache':
+                        state['cache'] = value.decode('latin-1')
+            elif message['type'] == 'http.response.body':
+                body = message.get('body', b'')
+                state['bytes'] += len(body)
+                if wants_bodies and len(state['body']) <= self.access_log.body_bytes:
+                    state['body'] += body[:self.access_log.body_bytes + 1]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            if not any(scope.get('endpoint') is app for app in self.exclude):
+                self._log(scope, path, state, (time.perf_counter() - start) * 1000)
+
+    def _log(self, scope, path, state, elapsed_ms):
+        level = self.access_log.level_for(path, state['status'], elapsed_ms)
+        if level is None:
+            return
+        client = scope.get('client')
+        fields = {
+            'method': scope['method'],
+            'path': path,
+            'route': path,
+            'status': state['status'],
+            'bytes': state['bytes'],
+            'ms': round(elapsed_ms, 2),
+            'remote': client[0] if client else None,
+            'cache': state['cache'],
+        }
+        if self.access_log.wants_bodies(path):
+            fields['response_body'] = self.access_log.excerpt(state['body'])
+        self.access_log.emit(level, fields)
@@ -0,0 +1,95 @@
+# migrate_holdings.py
+#
+# One-shot migration of embedded user ``portfolio`` arrays into per-position
+# holding documents (see holdings.py).
+#
+#   python migrate_holdings.py [--dry-run] [--workers 8]
+#
+# Each user is migrated with a single transactional batch in their partition:
+# the holding documents are written and ``/portfolio`` is removed from the user
+# document together, so a user is either fully migrated or untouched, and
+# re-running the script only picks up users that still have an embedded
+# array. Every write is guarded: the user document and positions that already
+# exist by their ETags, new positions by being created rather than upserted,
+# so lots added concurrently are never overwritten.
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import azure.cosmos.cosmos_client as cosmos_client
+import azure.cosmos.exceptions as exceptions
+
+from config import settings
+from holdings import MAX_BATCH_OPERATIONS, HoldingsRepository, group_by_symbol, new_holding
+
+
+def users_with_embedded_portfolios(container):
+    return container.query_items(
+        query='SELECT c.id, c.email, c.partitionKey, c.portfolio, c._etag FROM c '
+              'WHERE IS_DEFINED(c.portfolio) AND NOT IS_DEFINED(c.type)',
+        enable_cross_partition_query=True,
+    )
+
+
+def migrate_user(container, user, dry_run=False, max_retries=3):
+    email = user.get('partitionKey')
+    if not email or email != user.get('email'):
+        return 'skipped', 'user document has no email partition key'
+
+    repo = HoldingsRepository(container)
+    for _ in range(max_retries):
+        groups = group_by_symbol(user.get('portfolio') or [])
+        if '' in groups:
+            return 'skipped', 'portfolio has lots without a symbol'
+
+        existing = {holding['symbol']: holding for holding in repo.all(email)}
+        operations = []
+        for symbol, lots in groups.items():
+            if symbol in existing:
+                holding = existing[symbol]
+                merged = new_holding(email, symbol, holding.get('lots', []) + lots)
+                operations.append(('replace', (holding['id'], merged), {'if_match_etag': holding['_etag']}))
+            else:
+                operations.append(('create', (new_holding(email, symbol, lots),)))
+        operations.append(('patch', (user['id'], [{'op': 'remove', 'path': '/portfolio'}]),
+                           {'if_match_etag': user['_etag']}))
+
+        if len(operations) > MAX_BATCH_OPERATIONS:
+            return 'skipped', f'{len(groups)} symbols do not fit in one transactional batch'
+        if dry_run:
+            return 'would migrate', f'{len(groups)} positions'
+
+        try:
+            container.execute_item_batch(batch_operations=operations, partition_key=email)
+            return 'migrated', f'{len(groups)} positions'
+        except exceptions.CosmosBatchOperationError:
+            # The user document or a position changed since we read them;
+            # reload and retry.
+            user = container.read_item(item=user['id'], partition_key=email)
+            if 'portfolio' not in user:
+                return 'migrated', 'by a concurrent run'
+    return 'failed', 'kept conflicting with concurrent edits'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    parser.add_argument('--workers', type=int, default=8, help='users migrated in parallel')
+    args = parser.parse_args()
+
+    client = cosmos_client.CosmosClient(settings['host'], {'masterKey': settings['master_key']})
+    container = client.get_database_client(settings['database_id']).get_container_client(settings['container_id'])
+
+    totals = {}
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        results = pool.map(lambda user: (user['id'], migrate_user(container, user, args.dry_run)),
+                           users_with_embedded_portfolios(container))
+        for user_id, (outcome, detail) in results:
+            totals[outcome] = totals.get(outcome, 0) + 1
+            print(f'{outcome:14} {user_id}: {detail}')
+
+    print('Summary:', ', '.join(f'{count} {outcome}' for outcome, count in sorted(totals.items())) or 'nothing to do')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,197 @@
+# news_ranking.py
+
+import json
+import logging
+import time
+
+import numpy as np
+
+import config
+import stock_cache
+import upstream
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOURCE_CREDIBILITY = {
+    'Reuters': 1.0,
+    'Bloomberg': 0.9,
+    'Wall Street Journal': 0.9,
+    'CNBC': 0.8,
+    'Yahoo Finance': 0.7,
+    'Motley Fool': 0.6,
+    'Seeking Alpha': 0.6,
+    'Benzinga': 0.5,
+}
+DEFAULT_CREDIBILITY = 0.5
+
+# Alpha Vantage's time_published format: 20241023T224500
+_TIME_WIDTH = 15
+_DIGITS = [0, 1, 2, 3, 4, 5, 6, 7, 9, 10, 11, 12, 13, 14]
+
+
+def parse_times(values):
+    """Epoch seconds for each ``YYYYMMDDTHHMMSS`` string, NaN where invalid.
+
+    The strings are packed into one fixed-width byte array and the fields
+    are read off its columns, instead of a ``strptime`` call per article.
+    """
+    raw = np.array([v.encode('ascii', 'replace') if isinstance(v, str) else b'' for v in values],
+                   dtype=f'S{_TIME_WIDTH}')
+    chars = raw.view(np.uint8).reshape(len(raw), _TIME_WIDTH).astype(np.int64)
+    digits = chars[:, _DIGITS] - ord('0')
+    valid = (chars[:, 8] == ord('T')) & np.all((digits >= 0) & (digits <= 9), axis=1)
+    if len(raw):
+        # S15 truncates longer strings; those aren't in the expected format either.
+        valid &= np.array([isinstance(v, str) and len(v) == _TIME_WIDTH for v in values])
+
+    def field(start, width):
+        return digits[:, start:start + width] @ (10 ** np.arange(width - 1, -1, -1))
+
+    year, month, day = field(0, 4), field(4, 2), field(6, 2)
+    hour, minute, second = field(8, 2), field(10, 2), field(12, 2)
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (hour < 24) & (minute < 60) & (second < 60)
+
+    months = ((year - 1970) * 12 + np.clip(month, 1, 12) - 1).astype('datetime64[M]')
+    month_days = ((months + 1).astype('datetime64[D]') - months.astype('datetime64[D]')).astype(np.int64)
+    valid &= day <= month_days
+
+    days = months.astype('datetime64[D]').astype(np.int64) + day - 1
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second
+    return np.where(valid, seconds.astype(np.float64), np.nan)
+
+
+def parse_scores(values):
+    try:
+        return np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        scores = np.empty(len(values))
+        for i, value in enumerate(values):
+            try:
+                scores[i] = float(value)
+            except (TypeError, ValueError):
+                scores[i] = np.nan
+        return scores
+
+
+def load_credibility(path=None):
+    table = dict(DEFAULT_SOURCE_CREDIBILITY)
+    path = path or config.NEWS_SOURCE_CREDIBILITY_FILE
+    if path:
+        with open(path) as f:
+            table.update({name.strip(): float(score) for name, score in json.load(f).items()})
+    return table
+
+
+class NewsRanker:
+    """Scores news articles by impact and returns them best first.
+
+    impact = sentiment weight * |overall_sentiment_score|
+           + recency weight   * 1 / (1 + hours since time_published)
+           + source weight    * credibility of the source
+
+    Each term is computed for the whole batch at once, and with ``top_k``
+    only the best ``k`` are selected (``argpartition``) and sorted. Items
+    that aren't JSON objects, and articles whose sentiment score isn't a
+    number, are dropped; an unparseable timestamp only zeroes the recency
+    term.
+    """
+
+    def __init__(self, weights=None, credibility=None, default_credibility=DEFAULT_CREDIBILITY):
+        weights = weights or config.NEWS_RANK_WEIGHTS
+        self.weights = np.array([weights['sentiment'], weights['recency'], weights['source']])
+        self.credibility = load_credibility() if credibility is None else dict(credibility)
+        self.default_credibility = default_credibility
+
+    def scores(self, articles, now=None):
+        """Impact score per article, NaN for articles that can't be scored."""
+        now = time.time() if now is None else now
+        objects = np.array([isinstance(a, dict) for a in articles], dtype=bool)
+        if not objects.all():
+            logger.warning('%d of %d articles are not objects; skipped', int((~objects).sum()), len(articles))
+            articles = [a if isinstance(a, dict) else {} for a in articles]
+        sentiment = np.abs(parse_scores([a.get('overall_sentiment_score', 0) for a in articles]))
+
+        published = parse_times([a.get('time_published') for a in articles])
+        invalid_times = np.isnan(published)
+        if (invalid_times & objects).any():
+            logger.warning('%d of %d articles have an invalid time_published; recency set to 0',
+                           int((invalid_times & objects).sum()), int(objects.sum()))
+        hours = np.maximum((now - published) / 3600.0, 0.0)
+        recency = np.where(invalid_times, 0.0, 1.0 / (1.0 + hours))
+
+        sources, inverse = np.unique([str(a.get('source') or '').strip() for a in articles],
+                                     return_inverse=True)
+        table = np.array([self.credibility.get(s, self.default_credibility) for s in sources])
+        credibility = table[inverse] if len(articles) else np.empty(0)
+
+        impact = self.weights @ np.vstack([sentiment, recency, credibility])
+        return np.where(objects, impact, np.nan) if len(articles) else impact
+
+    def rank(self, articles, top_k=None, now=None):
+        articles = list(articles)
+        if not articles:
+            return []
+        impact = self.scores(articles, now)
+        candidates = np.flatnonzero(~np.isnan(impact))
+
+        if top_k is not None and top_k < len(candidates):
+            if top_k <= 0:
+                return []
+            candidates = candidates[np.argpartition(-impact[candidates], top_k - 1)[:top_k]]
+        # Highest impact first; ties keep their original order.
+        order = candidates[np.lexsort((candidates, -impact[candidates]))]
+        return [dict(articles[i], impact_score=float(impact[i])) for i in order]
+
+
+def load_feed(symbol, apikey=None):
+    """The NEWS_SENTIMENT payload for a symbol, cached for the news TTL.
+
+    Payloads without a ``feed`` (quota note, error message) are returned
+    uncached for the route to report.
+    """
+    symbol = stock_cache.normalize_symbol(symbol)
+    key = stock_cache.cache_key('news_feed', symbol)
+    data = stock_cache.cache.get(key)
+    if data is not None:
+        return data
+
+    data = upstream.fetch_json({'function': 'NEWS_SENTIMENT', 'tickers': symbol,
+                                'apikey': apikey or config.API_KEY})
+    if 'feed' in data:
+        stock_cache.cache.set(key, data, timeout=stock_cache.ttl_for('news'))
+    return data
+
+
+def ranked_feed(symbol, top_k=None, apikey=None, ranker=None, now=None):
+    """``load_feed`` with its articles ranked by impact, best first.
+
+    Recency is scored as of the start of the current
+    ``NEWS_RANK_BUCKET_SECONDS`` bucket, and the result is cached for that
+    bucket per symbol and ``top_k``, so every view of a symbol's ranked news
+    within a bucket is one cache read and gets the same order.
+    """
+    now = time.time() if now is None else now
+    bucket = int(now // config.NEWS_RANK_BUCKET_SECONDS)
+    key = stock_cache.cache_key('news_ranked', symbol, {'top_k': top_k, 'bucket': bucket})
+    data = stock_cache.cache.get(key)
+    if data is not None:
+        return data
+
+    data = load_feed(symbol, apikey)
+    if 'feed' not in data:
+        return data
+    ranker = ranker or get_ranker()
+    data = dict(data, feed=ranker.rank(data['feed'], top_k=top_k,
+                                       now=bucket * config.NEWS_RANK_BUCKET_SECONDS))
+    stock_cache.cache.set(key, data, timeout=config.NEWS_RANK_BUCKET_SECONDS)
+    return data
+
+
+_ranker = None
+
+
+def get_ranker():
+    global _ranker
+    if _ranker is None:
+        _ranker = NewsRanker()
+    return _ranker
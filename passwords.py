@@ -0,0 +1,193 @@
+# passwords.py
+
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Threads that store rehashed passwords, so a slow Cosmos write never holds
+# up the process pool's result thread.
+REHASH_WRITERS = 2
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when too many hashes are already queued; the caller should retry shortly."""
+
+    retry_after_header = '1'
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+
+def cost_of(hashed):
+    # bcrypt hashes look like $2b$12$<salt+hash>; the second field is the cost.
+    try:
+        return int(hashed.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt in a small process pool instead of on the request thread.
+
+    The pool caps how many CPU cores password work can take, so a login burst
+    can't starve the stock routes, and ``max_pending`` bounds the queue: past
+    it, calls fail fast with ``PasswordPoolBusy`` rather than piling up.
+    ``workers=0`` hashes inline, which is handy for local development.
+
+    Workers are started with forkserver (spawn where that's unavailable):
+    forking a gthread worker with other threads mid-request can copy a held
+    lock into the child and deadlock it.
+    """
+
+    def __init__(self, workers=None, max_pending=None, rounds=None):
+        self.workers = config.BCRYPT_WORKERS if workers is None else workers
+        self.max_pending = max_pending or config.BCRYPT_MAX_PENDING
+        self.rounds = rounds or config.BCRYPT_ROUNDS
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._writers = None
+        self._pending = 0
+        self._rejected = 0
+        self._rehashed = 0
+
+    def _executor(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context(method))
+        return self._pool
+
+    def _writer(self):
+        if self._writers is None:
+            with self._pool_lock:
+                if self._writers is None:
+                    self._writers = ThreadPoolExecutor(max_workers=REHASH_WRITERS,
+                                                       thread_name_prefix='password-rehash')
+        return self._writers
+
+    def _release(self, _future=None):
+        with self._pool_lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._pool_lock:
+                self._rejected += 1
+            raise PasswordPoolBusy('Too many password operations in progress, retry shortly.')
+        with self._pool_lock:
+            self._pending += 1
+
+        if self.workers == 0:
+            try:
+                return _Done(fn(*args))
+            finally:
+                self._release()
+
+        try:
+            future = self._executor().submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    def hash(self, password):
+        return self._run(_hash, password.encode('utf-8'), self.rounds).result()
+
+    def verify(self, password, hashed):
+        return self._run(_check, password.encode('utf-8'), hashed.encode('utf-8')).result()
+
+    def needs_rehash(self, hashed):
+        return cost_of(hashed) != self.rounds
+
+    def rehash_later(self, password, on_done):
+        """Hash ``password`` at the configured cost off the request path and
+        hand the new hash to ``on_done``. Skipped quietly when the pool is busy;
+        the next successful login tries again."""
+        try:
+            future = self._run(_hash, password.encode('utf-8'), self.rounds)
+        except PasswordPoolBusy:
+            return
+
+        def store(hashed):
+            try:
+                on_done(hashed)
+            except Exception:
+                logger.exception('Storing rehashed password failed')
+                return
+            with self._pool_lock:
+                self._rehashed += 1
+
+        def finished(f):
+            # Runs on the pool's result thread, which every other hash is
+            # waiting on; the write goes to its own threads.
+            if f.exception() is not None:
+                logger.error('Password rehash failed: %s', f.exception())
+                return
+            self._writer().submit(store, f.result())
+
+        future.add_done_callback(finished)
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+            writers, self._writers = self._writers, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+        if writers is not None:
+            writers.shutdown(wait=True)
+
+    def stats(self):
+        with self._pool_lock:
+            return {
+                'workers': self.workers,
+                'rounds': self.rounds,
+                'pending': self._pending,
+                'max_pending': self.max_pending,
+                'rejected': self._rejected,
+                'rehashed': self._rehashed,
+            }
+
+
+class _Done:
+    # Minimal stand-in for a completed future when hashing inline.
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+    def exception(self):
+        return None
+
+    def add_done_callback(self, fn):
+        fn(self)
+
+
+_hasher = None
+_hasher_lock = threading.Lock()
+
+
+def get_hasher():
+    global _hasher
+    if _hasher is None:
+        with _hasher_lock:
+            if _hasher is None:
+                _hasher = PasswordHasher()
+    return _hasher
@@ -0,0 +1,66 @@
+# provision.py
+#
+# One-time setup of the Cosmos DB database and container and the Chroma
+# collection the app uses. Workers no longer create these on boot (see
+# db.py), so run this once per environment, before the first deploy:
+#
+#   python provision.py [--skip-chroma] [--export-onnx]
+#
+# --export-onnx also writes the ONNX export of the embedding model that the
+# onnx and onnx-int8 EMBED_BACKENDs load (see embedding_backends.py).
+#
+# Safe to re-run: anything that already exists is left as it is.
+
+import argparse
+
+import azure.cosmos.exceptions as exceptions
+from azure.cosmos.partition_key import PartitionKey
+
+import config
+import db
+
+
+def provision_cosmos():
+    client = db.cosmos_client()
+
+    try:
+        database = client.create_database(id=db.DATABASE_ID)
+        print('Database with id \'{0}\' created'.format(db.DATABASE_ID))
+    except exceptions.CosmosResourceExistsError:
+        database = client.get_database_client(db.DATABASE_ID)
+        print('Database with id \'{0}\' was found'.format(db.DATABASE_ID))
+
+    try:
+        database.create_container(id=db.CONTAINER_ID, partition_key=PartitionKey(path='/partitionKey'))
+        print('Container with id \'{0}\' created'.format(db.CONTAINER_ID))
+    except exceptions.CosmosResourceExistsError:
+        print('Container with id \'{0}\' was found'.format(db.CONTAINER_ID))
+
+
+def provision_chroma():
+    db.chroma_client().get_or_create_collection(db.CHROMA_COLLECTION)
+    print('Chroma collection \'{0}\' ready'.format(db.CHROMA_COLLECTION))
+
+
+def export_onnx():
+    import embedding_backends
+
+    embedding_backends.export_onnx(config.EMBED_MODEL, config.EMBED_ONNX_DIR)
+    print('ONNX export of \'{0}\' written to {1}'.format(config.EMBED_MODEL, config.EMBED_ONNX_DIR))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Create the Cosmos DB database/container and Chroma collection.')
+    parser.add_argument('--skip-chroma', action='store_true', help='only provision Cosmos DB')
+    parser.add_argument('--export-onnx', action='store_true', help='also export the embedding model to ONNX')
+    args = parser.parse_args()
+
+    provision_cosmos()
+    if not args.skip_chroma:
+        provision_chroma()
+    if args.export_onnx:
+        export_onnx()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# quotes.py
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import config
+import stock_cache
+import upstream
+
+logger = logging.getLogger(__name__)
+
+QUOTE_KEY = 'Global Quote'
+
+# Per-symbol outcomes in a batch
+OK = 'ok'                   # fetched from upstream just now
+CACHED = 'cached'           # fresh cache entry
+STALE = 'stale'             # upstream failed; last known quote returned
+NOT_FOUND = 'not_found'     # upstream has no quote for the symbol
+RATE_LIMITED = 'rate_limited'
+ERROR = 'error'
+TIMEOUT = 'timeout'
+
+_pool = ThreadPoolExecutor(max_workers=config.QUOTE_FANOUT_WORKERS, thread_name_prefix='quote-fanout')
+
+
+def parse_symbols(value, limit=None):
+    """``"aapl, MSFT,,aapl"`` -> ``['AAPL', 'MSFT']``: normalised, deduplicated, in order."""
+    limit = limit or config.QUOTE_BATCH_MAX_SYMBOLS
+    symbols = list(dict.fromkeys(filter(None, (stock_cache.normalize_symbol(s) for s in (value or '').split(',')))))
+    if len(symbols) > limit:
+        raise ValueError(f'At most {limit} symbols per request')
+    return symbols
+
+
+def fetch(symbol, apikey=None):
+    """The GLOBAL_QUOTE payload for one symbol, straight from upstream."""
+    return upstream.fetch_json({
+        'function': 'GLOBAL_QUOTE',
+        'symbol': stock_cache.normalize_symbol(symbol),
+        'apikey': apikey or config.API_KEY,
+    })
+
+
+def _fetch_one(symbol, apikey):
+    try:
+        data = fetch(symbol, apikey)
+    except upstream.RateLimited as e:
+        return RATE_LIMITED, None, str(e), None
+    except upstream.UpstreamError as e:
+        return ERROR, None, str(e), None
+    except Exception as e:
+        logger.exception('Quote fetch for %s failed', symbol)
+        return ERROR, None, str(e), None
+    return outcome(symbol, data)
+
+
+def outcome(symbol, data):
+    """``(status, data, error, stored_at)`` for a GLOBAL_QUOTE payload just
+    fetched for ``symbol``; a found quote is stored in the quote cache."""
+    if 'Error Message' in data or not data.get(QUOTE_KEY):
+        return NOT_FOUND, None, data.get('Error Message', 'No quote found for symbol.'), None
+    # Shared with /stocks/quote, which serves this entry from now on.
+    stored_at = stock_cache.set_json('quote', symbol, data)
+    return OK, data, None, stored_at
+
+
+def lookup(symbols):
+    """Split ``symbols`` into results answered from fresh cache entries, the
+    expired-but-usable entries, and the symbols that need fetching."""
+    ttl = stock_cache.ttl_for('quote')
+    now = time.time()
+    results, stale, misses = {}, {}, []
+
+    for symbol in symbols:
+        data, stored_at = stock_cache.get_json('quote', symbol)
+        if data is not None and now - stored_at < ttl:
+            if data.get(QUOTE_KEY):
+                results[symbol] = _found(CACHED, data, stored_at)
+            else:
+                results[symbol] = {'status': NOT_FOUND, 'error': 'No quote found for symbol.'}
+            continue
+        if data is not None and data.get(QUOTE_KEY):
+            stale[symbol] = (data, stored_at)
+        misses.append(symbol)
+    return results, stale, misses
+
+
+def merge(symbols, results, stale, outcomes):
+    """Complete ``results`` with the fetch ``outcomes`` of the misses (those
+    missing from ``outcomes`` timed out), in ``symbols`` order."""
+    for symbol in symbols:
+        if symbol in results:
+            continue
+        status, data, error, stored_at = outcomes.get(
+            symbol, (TIMEOUT, None, 'Quote fetch did not finish in time.', None))
+        if status == OK:
+            results[symbol] = _found(OK, data, stored_at)
+        elif symbol in stale and status != NOT_FOUND:
+            results[symbol] = dict(_found(STALE, *stale[symbol]), error=error)
+        else:
+            results[symbol] = {'status': status, 'error': error}
+    return {symbol: results[symbol] for symbol in symbols}
+
+
+def get_many(symbols, apikey=None, timeout=None):
+    """Quotes for ``symbols`` as ``{symbol: {'status', 'quote' | 'error', 'asOf', 'age'}}``,
+    where ``asOf`` is when the quote was fetched (epoch seconds).
+
+    Fresh entries in the /stocks/quote cache are answered without touching
+    upstream. Misses and expired entries are fetched concurrently on a small
+    shared pool; every fetch still goes through the upstream client, so the
+    rate limiter and single-flight apply, and a batch can't take more
+    upstream slots than the pool has threads. Whatever hasn't finished by
+    ``timeout`` is reported as such rather than holding the response. A
+    failed fetch falls back to an expired entry when there is one.
+    """
+    timeout = config.QUOTE_BATCH_TIMEOUT if timeout is None else timeout
+    results, stale, misses = lookup(symbols)
+    pending = {symbol: _pool.submit(_fetch_one, symbol, apikey) for symbol in misses}
+
+    if pending:
+        wait(pending.values(), timeout=timeout)
+
+    outcomes = {symbol: future.result() for symbol, future in pending.items() if future.done()}
+    return merge(symbols, results, stale, outcomes)
+
+
+def _found(status, data, stored_at):
+    return {'status': status, 'quote': data[QUOTE_KEY], 'asOf': stored_at,
+            'age': int(time.time() - stored_at)}
+
+
+def price_of(result):
+    try:
+        return float(result['quote']['05. price'])
+    except (KeyError, TypeError, ValueError):
+        return None
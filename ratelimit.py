@@ -0,0 +1,266 @@
+# ratelimit.py
+
+import asyncio
+import bisect
+import itertools
+import math
+import sqlite3
+import threading
+import time
+
+import config
+
+# Lower value wins. Interactive routes (a user is waiting on the response) jump
+# ahead of background work such as top-mover persistence and cache warmups.
+INTERACTIVE = 0
+BACKGROUND = 1
+
+PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 30, 60, float('inf'))
+
+
+class RateLimited(Exception):
+    """Raised instead of spending an upstream call that would be rejected."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = max(retry_after, 0)
+
+    @property
+    def retry_after_header(self):
+        return str(max(int(math.ceil(self.retry_after)), 1))
+
+
+def _take(state, now, rate, capacity, ahead, reserve):
+    # Shared by the in-process and the SQLite bucket so both refill and spend
+    # tokens identically. ``state`` is [tokens, updated, blocked_until]; returns
+    # 0.0 when a token was taken, otherwise the estimated seconds to wait.
+    tokens, updated, blocked_until = state
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    state[0], state[1] = tokens, now
+
+    if now < blocked_until:
+        return blocked_until - now + ahead / rate
+
+    needed = 1 + reserve + ahead
+    if ahead == 0 and tokens >= needed:
+        state[0] = tokens - 1
+        return 0.0
+    # Never report zero here: a waiter behind the head only learns a token is
+    # free for it once the head has taken its own.
+    return max((needed - tokens) / rate, 0.001)
+
+
+class TokenBucket:
+    """Token bucket local to this process."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._state = [float(capacity), time.time(), 0.0]
+        self._lock = threading.Lock()
+
+    def take(self, ahead=0, reserve=0):
+        with self._lock:
+            return _take(self._state, time.time(), self.rate, self.capacity, ahead, reserve)
+
+    def block(self, seconds):
+        with self._lock:
+            self._state[0] = 0.0
+            self._state[2] = max(self._state[2], time.time() + seconds)
+
+
+class SharedTokenBucket:
+    """Token bucket kept in a local SQLite file so every worker on the host
+    draws from the same quota. ``BEGIN IMMEDIATE`` serialises the
+    read-modify-write across processes."""
+
+    def __init__(self, path, rate, capacity, name='alphavantage'):
+        self.path = path
+        self.rate = rate
+        self.capacity = capacity
+        self.name = name
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS token_bucket ('
+            'name TEXT PRIMARY KEY, tokens REAL, updated REAL, blocked_until REAL)'
+        )
+        self._conn.execute(
+            'INSERT OR IGNORE INTO token_bucket VALUES (?, ?, ?, 0)',
+            (name, float(capacity), time.time()),
+        )
+
+    def _update(self, fn):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = self._conn.execute(
+                    'SELECT tokens, updated, blocked_until FROM token_bucket WHERE name = ?', (self.name,)
+                ).fetchone()
+                state = list(row)
+                result = fn(state, time.time())
+                self._conn.execute(
+                    'UPDATE token_bucket SET tokens = ?, updated = ?, blocked_until = ? WHERE name = ?',
+                    (state[0], state[1], state[2], self.name),
+                )
+                self._conn.execute('COMMIT')
+                return result
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    def take(self, ahead=0, reserve=0):
+        return self._update(lambda state, now: _take(state, now, self.rate, self.capacity, ahead, reserve))
+
+    def block(self, seconds):
+        def apply(state, now):
+            state[0] = 0.0
+            state[2] = max(state[2], now + seconds)
+        self._update(apply)
+
+
+class Scheduler:
+    """Hands out upstream tokens in priority order.
+
+    Callers queue per priority; only the caller at the head of the queue may
+    take a token. A caller whose estimated wait exceeds the budget for its
+    priority fails fast with ``RateLimited`` rather than queueing forever.
+    Background callers also leave ``background_reserve`` tokens untouched so a
+    burst of warmups can't starve interactive requests on other workers.
+    """
+
+    def __init__(self, bucket, max_wait=None, background_reserve=1):
+        self.bucket = bucket
+        self.max_wait = max_wait or {INTERACTIVE: 10.0, BACKGROUND: 60.0}
+        self.reserve = {INTERACTIVE: 0, BACKGROUND: background_reserve}
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._depth = {p: 0 for p in PRIORITY_NAMES}
+        self._waits = {p: [0] * len(WAIT_BUCKETS) for p in PRIORITY_NAMES}
+        self._granted = {p: 0 for p in PRIORITY_NAMES}
+        self._rejected = {p: 0 for p in PRIORITY_NAMES}
+
+    def acquire(self, priority=INTERACTIVE):
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+
+        with self._cond:
+            bisect.insort(self._queue, entry)
+            self._depth[priority] += 1
+            try:
+                while True:
+                    ahead = bisect.bisect_left(self._queue, entry)
+                    wait = self.bucket.take(ahead=ahead, reserve=self.reserve[priority])
+                    if wait == 0.0:
+                        self._granted[priority] += 1
+                        self._record_wait(priority, time.monotonic() - start)
+                        return
+
+                    elapsed = time.monotonic() - start
+                    if elapsed + wait > self.max_wait[priority]:
+                        self._rejected[priority] += 1
+                        raise RateLimited('Upstream API call limit reached, retry later.', wait)
+
+                    self._cond.wait(timeout=max(min(wait, self.max_wait[priority] - elapsed), 0.01))
+            finally:
+                self._queue.remove(entry)
+                self._depth[priority] -= 1
+                self._cond.notify_all()
+
+    async def acquire_async(self, priority=INTERACTIVE):
+        """``acquire`` for coroutines: same queue and budgets, but waiting
+        sleeps the task instead of blocking the event loop's thread. Each
+        attempt runs in a worker thread, since taking from a shared bucket is
+        a SQLite transaction and the lock may be held by a sync caller."""
+        entry = (priority, next(self._seq))
+        start = time.monotonic()
+
+        await asyncio.to_thread(self._enqueue, entry)
+        try:
+            while True:
+                wait = await asyncio.to_thread(self._attempt, entry, start)
+                if wait == 0.0:
+                    return
+                await asyncio.sleep(wait)
+        finally:
+            await asyncio.to_thread(self._dequeue, entry)
+
+    def _enqueue(self, entry):
+        with self._cond:
+            bisect.insort(self._queue, entry)
+            self._depth[entry[0]] += 1
+
+    def _dequeue(self, entry):
+        with self._cond:
+            self._queue.remove(entry)
+            self._depth[entry[0]] -= 1
+            self._cond.notify_all()
+
+    def _attempt(self, entry, start):
+        # One try at a token for acquire_async: 0.0 once granted, otherwise
+        # how long to sleep before the next try.
+        priority = entry[0]
+        with self._cond:
+            ahead = bisect.bisect_left(self._queue, entry)
+            wait = self.bucket.take(ahead=ahead, reserve=self.reserve[priority])
+            if wait == 0.0:
+                self._granted[priority] += 1
+                self._record_wait(priority, time.monotonic() - start)
+                return 0.0
+
+            elapsed = time.monotonic() - start
+            if elapsed + wait > self.max_wait[priority]:
+                self._rejected[priority] += 1
+                raise RateLimited('Upstream API call limit reached, retry later.', wait)
+            return max(min(wait, self.max_wait[priority] - elapsed), 0.01)
+
+    def block(self, seconds):
+        """Stop handing out tokens for ``seconds`` after the upstream reports its quota is spent."""
+        self.bucket.block(seconds)
+        with self._cond:
+            self._cond.notify_all()
+
+    async def block_async(self, seconds):
+        """``block`` for coroutines, run in a worker thread."""
+        await asyncio.to_thread(self.block, seconds)
+
+    def _record_wait(self, priority, seconds):
+        for i, bound in enumerate(WAIT_BUCKETS):
+            if seconds <= bound:
+                self._waits[priority][i] += 1
+                break
+
+    def stats(self):
+        with self._cond:
+            return {
+                PRIORITY_NAMES[p]: {
+                    'queue_depth': self._depth[p],
+                    'granted': self._granted[p],
+                    'rejected': self._rejected[p],
+                    'wait_seconds': {
+                        ('+Inf' if math.isinf(bound) else str(bound)): count
+                        for bound, count in zip(WAIT_BUCKETS, self._waits[p])
+                    },
+                }
+                for p in PRIORITY_NAMES
+            }
+
+
+def scheduler_from_config():
+    if config.UPSTREAM_RATE_PER_MINUTE <= 0:
+        return None
+
+    rate = config.UPSTREAM_RATE_PER_MINUTE / 60.0
+    capacity = config.UPSTREAM_BURST or config.UPSTREAM_RATE_PER_MINUTE
+    if config.UPSTREAM_RATE_LIMIT_STORE:
+        bucket = SharedTokenBucket(config.UPSTREAM_RATE_LIMIT_STORE, rate, capacity)
+    else:
+        bucket = TokenBucket(rate, capacity)
+
+    return Scheduler(bucket, max_wait={
+        INTERACTIVE: config.UPSTREAM_MAX_WAIT_INTERACTIVE,
+        BACKGROUND: config.UPSTREAM_MAX_WAIT_BACKGROUND,
+    })
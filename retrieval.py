@@ -0,0 +1,232 @@
+# retrieval.py
+#
+# Semantic search over the stock_data collection for the /query route.
+#
+# Query text is normalised (case and whitespace; the model is uncased) and
+# its embedding memoized in an LRU, so a repeated question costs a lookup
+# instead of a forward pass. Filters on symbol and function become a Chroma
+# ``where`` clause applied before ranking, so a filtered query only ranks
+# the matching documents. Queries in one request that share a filter and
+# result count are answered together, with one Chroma call.
+#
+# A symbol narrows 100k documents to a few hundred, and Chroma's filtered
+# ANN search then spends far longer applying the filter than searching.
+# Those queries instead fetch the candidates with one ``collection.get`` and
+# rank them exactly, in one matrix product for every query sharing the
+# filter; past QUERY_EXACT_MAX_CANDIDATES they use ``collection.query``.
+#
+# Superseded history versions (see vector_store.py) are dropped from the
+# results instead of being excluded in ``where``: on Chroma a clause that
+# matches nearly every document is far slower than no clause at all
+# (benchmarks/bench_query.py), and with at most VECTOR_STORE_VERSIONS
+# history entries per id, fetching that many more results is enough.
+
+import collections
+import re
+import threading
+
+import numpy as np
+
+import config
+from stock_cache import normalize_symbol
+
+_WHITESPACE = re.compile(r'\s+')
+
+RESULT_FIELDS = ('documents', 'metadatas', 'distances')
+
+
+def normalize_query(text):
+    """``'  What is  AAPL guidance? '`` -> ``'what is aapl guidance?'``."""
+    return _WHITESPACE.sub(' ', (text or '').strip()).lower()
+
+
+class QueryEmbeddings:
+    """LRU of query embeddings keyed by normalised query text.
+
+    ``get_many`` embeds every text it doesn't have in one
+    ``encode_batch(texts)`` call.
+    """
+
+    def __init__(self, encode_batch, max_entries=None):
+        self.encode_batch = encode_batch
+        self.max_entries = max_entries or config.QUERY_EMBED_CACHE_SIZE
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, texts):
+        keys = [normalize_query(text) for text in texts]
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[key] = self._entries[key]
+        missing = list(dict.fromkeys(key for key in keys if key not in found))
+        if missing:
+            found.update(zip(missing, self.encode_batch(missing)))
+        with self._lock:
+            self.hits += len(keys) - len([key for key in keys if key in missing])
+            self.misses += len(missing)
+            for key in missing:
+                self._entries[key] = found[key]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return [found[key] for key in keys]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'hit_rate': self.hits / total if total else 0.0}
+
+
+def _values(value, normalize):
+    values = value if isinstance(value, list) else str(value).split(',')
+    return sorted({normalize(v) for v in values if str(v).strip()})
+
+
+def build_where(symbol=None, function=None):
+    """A Chroma ``where`` clause for the given filters, or None.
+
+    ``symbol`` and ``function`` each take one value, a comma-separated
+    string or a list.
+    """
+    conditions = []
+    for field, value, normalize in (('symbol', symbol, normalize_symbol),
+                                    ('function', function, lambda v: str(v).strip().upper())):
+        if value:
+            values = _values(value, normalize)
+            if values:
+                conditions.append({field: values[0]} if len(values) == 1 else {field: {'$in': values}})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+
+def is_current(metadata):
+    # Documents written before versioning have no ``current`` flag.
+    return (metadata or {}).get('current', True) is not False
+
+
+def parse_queries(body):
+    """Validate a /query request body into a list of query specs.
+
+    The body is one query (``{"query": ..., "symbol": ..., "function": ...,
+    "n_results": ...}``) or several under ``"queries"``. Raises ValueError
+    with a client-facing message.
+    """
+    if not isinstance(body, dict):
+        raise ValueError('Expected a JSON object.')
+    items = body.get('queries')
+    if items is None:
+        items = [body]
+    elif not isinstance(items, list) or not items:
+        raise ValueError('queries must be a non-empty list.')
+    if len(items) > config.QUERY_MAX_BATCH:
+        raise ValueError(f'At most {config.QUERY_MAX_BATCH} queries per request.')
+
+    specs = []
+    for item in items:
+        if not isinstance(item, dict) or not isinstance(item.get('query'), str) or not item['query'].strip():
+            raise ValueError('Please provide a query in the request body.')
+        n_results = item.get('n_results', body.get('n_results', config.QUERY_DEFAULT_RESULTS))
+        try:
+            n_results = int(n_results)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid n_results: {n_results}')
+        if not 1 <= n_results <= config.QUERY_MAX_RESULTS:
+            raise ValueError(f'n_results must be between 1 and {config.QUERY_MAX_RESULTS}.')
+        specs.append({
+            'query': item['query'],
+            'where': build_where(item.get('symbol', body.get('symbol')),
+                                 item.get('function', body.get('function'))),
+            'n_results': n_results,
+            'include_history': bool(item.get('include_history', body.get('include_history'))),
+        })
+    return specs
+
+
+def _distances(space, candidates, queries):
+    """Chroma's distance for each (query, candidate) pair, in its ``space``."""
+    if space == 'cosine':
+        candidates = candidates / np.maximum(np.linalg.norm(candidates, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        return 1 - queries @ candidates.T
+    if space == 'ip':
+        return 1 - queries @ candidates.T
+    # Squared L2, expanded so it is one matrix product.
+    return (np.sum(queries ** 2, axis=1)[:, None] - 2 * queries @ candidates.T
+            + np.sum(candidates ** 2, axis=1)[None, :])
+
+
+def _narrow(where):
+    if not where:
+        return False
+    return 'symbol' in where or any('symbol' in condition for condition in where.get('$and', ()))
+
+
+class Retriever:
+    """Runs query specs from ``parse_queries`` against ``collection``."""
+
+    def __init__(self, collection, embeddings, versions=None, max_candidates=None):
+        self.collection = collection
+        self.embeddings = embeddings
+        self.versions = config.VECTOR_STORE_VERSIONS if versions is None else versions
+        self.max_candidates = config.QUERY_EXACT_MAX_CANDIDATES if max_candidates is None else max_candidates
+
+    def search(self, specs):
+        """One list of ``{id, document, metadata, distance}`` hits per spec."""
+        vectors = self.embeddings.get_many([spec['query'] for spec in specs])
+        groups = {}
+        for index, spec in enumerate(specs):
+            key = (repr(spec['where']), spec['n_results'], spec.get('include_history', False))
+            groups.setdefault(key, []).append(index)
+
+        results = [None] * len(specs)
+        for (_, n_results, include_history), indexes in groups.items():
+            where = specs[indexes[0]]['where']
+            queries = [vectors[i] for i in indexes]
+            found = None
+            if _narrow(where) and self.max_candidates > 0:
+                found = self._exact(where, queries, n_results, include_history)
+            if found is None:
+                found = self.collection.query(
+                    query_embeddings=queries, where=where, include=list(RESULT_FIELDS),
+                    n_results=n_results if include_history else n_results * (self.versions + 1))
+            for position, index in enumerate(indexes):
+                hits = [
+                    {'id': doc_id, 'document': document, 'metadata': metadata, 'distance': distance}
+                    for doc_id, document, metadata, distance in zip(
+                        found['ids'][position], found['documents'][position],
+                        found['metadatas'][position], found['distances'][position])
+                    if include_history or is_current(metadata)
+                ]
+                results[index] = hits[:n_results]
+        return results
+
+    def _exact(self, where, queries, n_results, include_history):
+        """``collection.query``-shaped results from ranking every document
+        matching ``where``, or None if there are more than ``max_candidates``."""
+        candidates = self.collection.get(where=where, limit=self.max_candidates + 1,
+                                         include=['embeddings', 'documents', 'metadatas'])
+        if len(candidates['ids']) > self.max_candidates:
+            return None
+        keep = [i for i, metadata in enumerate(candidates['metadatas']) if include_history or is_current(metadata)]
+        found = {field: [] for field in ('ids',) + RESULT_FIELDS}
+        if not keep:
+            for field in found:
+                found[field] = [[] for _ in queries]
+            return found
+
+        space = (self.collection.metadata or {}).get('hnsw:space', 'l2')
+        embeddings = np.asarray(candidates['embeddings'], dtype=np.float32)[keep]
+        distances = _distances(space, embeddings, np.asarray(queries, dtype=np.float32))
+        for row in distances:
+            order = np.argsort(row, kind='stable')[:n_results]
+            found['ids'].append([candidates['ids'][keep[i]] for i in order])
+            found['documents'].append([candidates['documents'][keep[i]] for i in order])
+            found['metadatas'].append([candidates['metadatas'][keep[i]] for i in order])
+            found['distances'].append(row[order].tolist())
+        return found
@@ -1,58 +1,76 @@
 # routes.py
 
 from flask import Blueprint, request, jsonify, current_app
-import requests
 import datetime
 import logging
 import azure.cosmos.exceptions as exceptions
-import json
 
-from utils import generate_embedding
+import utils
 from db import collection, container
 from config import API_KEY
-from flask_caching import Cache
+from embedding_pipeline import EmbeddingPipeline
+import chunking
+from vector_store import VectorStoreWriter, document_id
+import upstream
+import stock_cache
 
 routes_bp = Blueprint('routes', __name__)
 
-# Initialize cache
-cache = Cache(config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})
+
+def cached(endpoint):
+    # These bodies aren't app.py's for the same endpoints; keep their entries apart.
+    return stock_cache.cached(endpoint, namespace=routes_bp.name)
+
+
+def stored_hashes(ids):
+    stored = collection.get(ids=ids, include=['metadatas'])
+    return {chunk_id: (metadata or {}).get(chunking.HASH_FIELD)
+            for chunk_id, metadata in zip(stored['ids'], stored['metadatas'])}
+
+
+# Upstream responses are split into chunks, and the chunks that changed
+# since they were last stored are embedded and written to Chroma in the
+# background, in batches, after the response has been sent.
+vector_store = VectorStoreWriter(collection)
+embedding_pipeline = EmbeddingPipeline(utils.encode_batch, vector_store.write, prepare=chunking.chunk_payload,
+                                       hashes=chunking.ContentHashes(stored_hashes), retire=vector_store.retire)
 
 @routes_bp.route('/stocks/quote', methods=['GET'])
-@cache.cached()
+@cached('quote')
 def get_stock_quote():
     symbol = request.args.get('symbol')
     return fetch_and_store_stock_data('GLOBAL_QUOTE', symbol)
 
 @routes_bp.route('/stocks/overview', methods=['GET'])
-@cache.cached()
+@cached('overview')
 def get_stock_overview():
     symbol = request.args.get('symbol')
-    chroma_id = f"{symbol}_overview"
+    chroma_id = document_id(symbol, 'overview')
     return fetch_and_store_stock_data('OVERVIEW', symbol, chroma_id=chroma_id)
 
 @routes_bp.route('/stocks/income_statement', methods=['GET'])
-@cache.cached()
+@cached('income_statement')
 def get_income_statement():
     symbol = request.args.get('symbol')
-    chroma_id = f"{symbol}_income_statement"
+    chroma_id = document_id(symbol, 'income_statement')
     return fetch_and_store_stock_data('INCOME_STATEMENT', symbol, chroma_id=chroma_id)
 
 @routes_bp.route('/stocks/news', methods=['GET'])
-@cache.cached()
+@cached('news')
 def get_stock_news():
     symbol = request.args.get('symbol')
-    chroma_id = f"{symbol}_news"
+    chroma_id = document_id(symbol, 'news')
     return fetch_and_store_stock_data('NEWS_SENTIMENT', symbol, chroma_id=chroma_id)
 
 @routes_bp.route('/stocks/insider_transactions', methods=['GET'])
-@cache.cached()
+@cached('insider_transactions')
 def get_insider_transactions():
     symbol = request.args.get('symbol')
-    chroma_id = f"{symbol}_insider_transactions"
+    chroma_id = document_id(symbol, 'insider_transactions')
     return fetch_and_store_stock_data('INSIDER_TRANSACTIONS', symbol, chroma_id=chroma_id)
 
 @routes_bp.route('/stocks/time_series', methods=['GET'])
-@cache.cached()
+@cached('time_series')
 def get_stock_time_series():
     symbol = request.args.get('symbol')
     time_series_function = request.args.get('function', 'TIME_SERIES_DAILY')
@@ -64,7 +82,7 @@ def get_stock_time_series():
         'datatype': datatype
     }
 
-    chroma_id = f"{symbol}_{time_series_function}_{outputsize}"
+    chroma_id = document_id(symbol, time_series_function, outputsize)
     metadata = {
         'function': time_series_function,
         'outputsize': outputsize,
@@ -73,7 +91,7 @@ def get_stock_time_series():
     return fetch_and_store_stock_data(time_series_function, symbol, params=params, chroma_id=chroma_id, metadata=metadata)
 
 @routes_bp.route('/stocks/daily', methods=['GET'])
-@cache.cached()
+@cached('daily')
 def get_stock_daily():
     symbol = request.args.get('symbol')
     outputsize = request.args.get('outputsize', 'compact')
@@ -84,19 +102,29 @@ def get_stock_daily():
         'datatype': datatype
     }
 
-    chroma_id = f"{symbol}_daily_{outputsize}"
+    chroma_id = document_id(symbol, 'daily', outputsize)
     metadata = {
         'outputsize': outputsize,
     }
 
     return fetch_and_store_stock_data('TIME_SERIES_DAILY', symbol, params=params, chroma_id=chroma_id, metadata=metadata)
 
+@routes_bp.route('/metrics/embeddings', methods=['GET'])
+def get_embedding_metrics():
+    return jsonify(dict(embedding_pipeline.stats(), vector_store=vector_store.stats()))
+
+@routes_bp.errorhandler(upstream.RateLimited)
+def upstream_rate_limited(e):
+    response = jsonify({'error': str(e)})
+    response.status_code = 429
+    response.headers['Retry-After'] = e.retry_after_header
+    return response
+
 # Helper function to fetch and store stock data
 def fetch_and_store_stock_data(function_name, symbol, params={}, chroma_id=None, metadata={}):
     if not symbol:
         return jsonify({'error': 'Please provide the stock symbol as a parameter.'}), 400
 
-    url = 'https://www.alphavantage.co/query'
     default_params = {
         'function': function_name,
         'symbol': symbol.upper(),
@@ -104,32 +132,19 @@ def fetch_and_store_stock_data(function_name, symbol, params={}, chroma_id=None,
     }
     default_params.update(params)
 
-    response = requests.get(url, params=default_params)
-
-    if response.status_code != 200:
+    try:
+        data = upstream.fetch_json(default_params)
+    except upstream.UpstreamError:
         return jsonify({'error': 'Failed to fetch data from Alpha Vantage API.'}), 500
 
-    data = response.json()
-
     # Check for API errors
-    if 'Error Message' in data or 'Note' in data:
-        return jsonify({'error': data.get('Error Message') or data.get('Note', 'API call limit reached.')}), 400
+    if 'Error Message' in data:
+        return jsonify({'error': data['Error Message']}), 400
 
-    # Generate embedding
-    data_text = json.dumps(data)
-    embedding = generate_embedding(data_text)
-
-    # Store in ChromaDB
+    # Queue for embedding and storage in ChromaDB
     if not chroma_id:
-        chroma_id = symbol
-
-    metadata['symbol'] = symbol
+        chroma_id = document_id(symbol)
 
-    collection.add(
-        embeddings=[embedding],
-        documents=[data_text],
-        metadatas=[metadata],
-        ids=[chroma_id]
-    )
+    embedding_pipeline.submit(chroma_id, data, dict(metadata, symbol=stock_cache.normalize_symbol(symbol), function=function_name))
 
     return jsonify(data)
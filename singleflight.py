@@ -0,0 +1,100 @@
+# singleflight.py
+
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapses concurrent calls that share a key into one execution.
+
+    The first caller for a key runs ``fn``; callers arriving while it is in
+    flight block until it finishes and receive the same result (or exception).
+    Once the call completes the key is forgotten, so this never serves stale
+    data on its own - it only deduplicates work that overlaps in time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.originating = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.originating += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'originating': self.originating,
+                'coalesced': self.coalesced,
+                'in_flight': len(self._calls),
+            }
+
+
+class AsyncSingleFlight:
+    """``SingleFlight`` for coroutines on one event loop: later callers await
+    the first caller's task instead of blocking a thread."""
+
+    def __init__(self):
+        self._calls = {}
+        self.originating = 0
+        self.coalesced = 0
+
+    async def do(self, key, fn):
+        task = self._calls.get(key)
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+            self.originating += 1
+        else:
+            self.coalesced += 1
+        # shield() so one caller going away doesn't cancel the shared call.
+        return await asyncio.shield(task)
+
+    def in_flight(self):
+        return len(self._calls)
+
+    def stats(self):
+        return {
+            'originating': self.originating,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls),
+        }
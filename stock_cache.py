@@ -0,0 +1,265 @@
+# stock_cache.py
+
+import functools
+import importlib.util
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app, make_response, request
+from flask_caching import Cache
+
+import config
+import upstream
+
+logger = logging.getLogger(__name__)
+
+
+def cache_config(backend=None):
+    # 'simple' keeps a private cache per worker; 'sqlite' and 'redis' are
+    # shared by every worker on the host (see cache_backends.py).
+    backend = backend or config.STOCK_CACHE_BACKEND
+    if backend == 'sqlite':
+        return {
+            'CACHE_TYPE': 'cache_backends.SQLiteLRUCache',
+            'CACHE_DEFAULT_TIMEOUT': 300,
+            'CACHE_SQLITE_PATH': config.STOCK_CACHE_PATH,
+            'CACHE_MAX_BYTES': config.STOCK_CACHE_MAX_BYTES,
+        }
+    if backend == 'redis':
+        # Flask-Caching only imports redis when the app starts; fail here, clearly.
+        if importlib.util.find_spec('redis') is None:
+            raise ValueError('STOCK_CACHE_BACKEND=redis needs the redis package (pip install redis)')
+        return {
+            'CACHE_TYPE': 'cache_backends.CompactRedisCache',
+            'CACHE_DEFAULT_TIMEOUT': 300,
+            'CACHE_REDIS_URL': config.STOCK_CACHE_REDIS_URL,
+            'CACHE_KEY_PREFIX': 'afa:',
+        }
+    if backend == 'simple':
+        return {
+            'CACHE_TYPE': 'SimpleCache',
+            'CACHE_DEFAULT_TIMEOUT': 300,
+            'CACHE_THRESHOLD': 2000,
+        }
+    raise ValueError(f'Unknown STOCK_CACHE_BACKEND: {backend}')
+
+
+cache = Cache(config=cache_config())
+
+# Query parameters that change the upstream response, per endpoint, with the
+# default the route applies when one is missing. Anything else on the query
+# string (cache busters, tracking params) is ignored.
+ENDPOINT_PARAMS = {
+    'time_series': {'function': 'TIME_SERIES_DAILY', 'outputsize': 'compact', 'datatype': 'json',
+                    'format': 'rows', 'start': None, 'end': None, 'limit': None, 'resample': None},
+    'time_series_monthly': {'format': 'rows', 'start': None, 'end': None, 'limit': None, 'resample': None},
+    'news': {'rank': 'false', 'top_k': None},
+    'indicators': {'indicators': 'sma', 'interval': 'daily', 'outputsize': 'compact',
+                   'start': None, 'end': None, 'limit': None},
+    'daily': {'outputsize': 'compact', 'datatype': 'json'},
+}
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+_refresh_pool = ThreadPoolExecutor(max_workers=config.STOCK_CACHE_REFRESH_WORKERS,
+                                   thread_name_prefix='stock-cache-refresh')
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+def init_app(app):
+    cache.init_app(app)
+    return cache
+
+
+def normalize_symbol(symbol):
+    return (symbol or '').strip().upper()
+
+
+# Parameters the views themselves read case-insensitively, and how. Every
+# other value is keyed exactly as sent: the views reject, say, format=ROWS
+# or function=time_series_daily, so those mustn't share a key with the
+# spelling that succeeds.
+PARAM_NORMALIZERS = {
+    'rank': str.lower,
+    'resample': str.upper,
+    'indicators': str.lower,
+}
+
+
+def cache_key(endpoint, symbol=None, params=None, namespace=None):
+    prefix = f'stock:{namespace}:{endpoint}' if namespace else f'stock:{endpoint}'
+    parts = [f'{prefix}:{normalize_symbol(symbol)}']
+    for name, value in sorted((params or {}).items()):
+        if value is not None:
+            value = str(value)
+            normalize = PARAM_NORMALIZERS.get(name)
+            parts.append(f'{name}={normalize(value) if normalize else value}')
+    return ':'.join(parts)
+
+
+def ttl_for(endpoint):
+    return config.STOCK_CACHE_TTLS.get(endpoint, config.STOCK_CACHE_TTLS['default'])
+
+
+def args_cache_key(endpoint, args, namespace=None):
+    params = {name: args.get(name) or default
+              for name, default in ENDPOINT_PARAMS.get(endpoint, {}).items()}
+    return cache_key(endpoint, args.get('symbol'), params, namespace)
+
+
+def request_cache_key(endpoint, namespace=None):
+    return args_cache_key(endpoint, request.args, namespace)
+
+
+def record(endpoint, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(endpoint, {
+            'hits': 0, 'stale': 0, 'stale_if_error': 0, 'misses': 0,
+            'refreshes': 0, 'refresh_failures': 0,
+        })
+        counters[outcome] += 1
+
+
+def stats():
+    with _stats_lock:
+        result = {}
+        for endpoint, counters in _stats.items():
+            served = counters['hits'] + counters['stale'] + counters['stale_if_error']
+            total = served + counters['misses']
+            result[endpoint] = dict(counters, hit_rate=served / total if total else 0.0)
+        return result
+
+
+def store(key, endpoint, body, mimetype='application/json'):
+    entry = {'body': body, 'mimetype': mimetype, 'stored_at': time.time()}
+    # Keep the entry past its TTL so it can still be served stale.
+    cache.set(key, entry, timeout=ttl_for(endpoint) + config.STOCK_CACHE_STALE_IF_ERROR)
+    return entry
+
+
+def _store(key, endpoint, response):
+    store(key, endpoint, response.get_data(), response.mimetype)
+
+
+def get_json(endpoint, symbol, params=None):
+    """The cached JSON body a route stored for ``symbol`` and when it was
+    stored, or ``(None, None)``. Lets batch callers share route entries."""
+    entry = cache.get(cache_key(endpoint, symbol, params))
+    if entry is None or entry.get('mimetype') != 'application/json':
+        return None, None
+    return json.loads(entry['body']), entry['stored_at']
+
+
+def set_json(endpoint, symbol, data, params=None):
+    entry = store(cache_key(endpoint, symbol, params), endpoint, json.dumps(data).encode('utf-8'))
+    return entry['stored_at']
+
+
+def _from_entry(entry, status):
+    response = make_response(entry['body'])
+    response.mimetype = entry['mimetype']
+    response.headers['Age'] = str(int(time.time() - entry['stored_at']))
+    response.headers['X-Cache'] = status
+    if status != 'HIT':
+        response.headers['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def _refresh(app, key, endpoint, view, path, query_string, args, kwargs):
+    try:
+        with app.test_request_context(path, query_string=query_string):
+            with upstream.default_priority(upstream.BACKGROUND):
+                response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _store(key, endpoint, response)
+                record(endpoint, 'refreshes')
+            else:
+                # Keep serving the stale entry; the next stale read retries.
+                record(endpoint, 'refresh_failures')
+    except Exception:
+        record(endpoint, 'refresh_failures')
+        logger.exception('Background refresh of %s failed', key)
+    finally:
+        with _refreshing_lock:
+            _refreshing.discard(key)
+
+
+def _schedule_refresh(key, endpoint, view, args, kwargs):
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _refresh_pool.submit(
+        _refresh, current_app._get_current_object(), key, endpoint, view,
+        request.path, request.query_string.decode('utf-8'), args, kwargs,
+    )
+
+
+def cached(endpoint, namespace=None):
+    """Cache a stock route's successful responses under an explicit key.
+
+    The key is the endpoint name, the upper-cased symbol and the endpoint's
+    relevant query parameters, so ``?symbol=aapl`` and ``?symbol=AAPL`` share
+    an entry while different symbols never do. The TTL comes from
+    ``config.STOCK_CACHE_TTLS``. Only 200 responses are stored, as raw bytes,
+    so a hit skips both the upstream call and re-serialising the JSON.
+
+    Routes whose bodies differ from app.py's for the same endpoint (the
+    routes blueprint returns raw Alpha Vantage payloads) pass a
+    ``namespace``, which goes into the key, so a backend shared by both apps
+    never serves one app's response from the other.
+
+    Expired entries are kept around for stale serving:
+
+    - up to one more TTL past expiry the stale body is returned immediately
+      and the route is re-run on a background thread to refresh it;
+    - after that, up to ``STOCK_CACHE_STALE_IF_ERROR`` seconds, the route is
+      re-run inline and the stale body is only used if it fails (quota
+      'Note', 'Error Message', timeout, rate limit).
+
+    Stale responses carry ``Age`` and ``X-Cache: STALE``/``STALE-IF-ERROR``.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request_cache_key(endpoint, namespace)
+            ttl = ttl_for(endpoint)
+            entry = cache.get(key)
+
+            if entry is not None:
+                age = time.time() - entry['stored_at']
+                if age < ttl:
+                    record(endpoint, 'hits')
+                    return _from_entry(entry, 'HIT')
+                if age < 2 * ttl:
+                    record(endpoint, 'stale')
+                    _schedule_refresh(key, endpoint, view, args, kwargs)
+                    return _from_entry(entry, 'STALE')
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except upstream.RateLimited:
+                if entry is None:
+                    raise
+                response = None
+
+            if response is not None and response.status_code == 200:
+                record(endpoint, 'misses')
+                _store(key, endpoint, response)
+                response.headers['X-Cache'] = 'MISS'
+                return response
+
+            if entry is not None:
+                record(endpoint, 'stale_if_error')
+                return _from_entry(entry, 'STALE-IF-ERROR')
+
+            record(endpoint, 'misses')
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
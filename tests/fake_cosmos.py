@@ -0,0 +1,124 @@
+# tests/fake_cosmos.py
+#
+# An in-memory stand-in for the azure-cosmos ContainerProxy calls that
+# users.py, holdings.py and migrate_holdings.py make: point reads and
+# writes, patches, the partition-scoped holdings queries, and transactional
+# batches that apply all-or-nothing and honour ``if_match_etag``.
+
+import copy
+import itertools
+
+import azure.cosmos.exceptions as exceptions
+
+
+def _error(cls, status_code, message):
+    return cls(status_code=status_code, message=message)
+
+
+class FakeContainer:
+    def __init__(self):
+        self.items = {}
+        self.batches = 0
+        # Called with the container before each batch is applied, to make a
+        # concurrent change between a caller's reads and its write.
+        self.before_batch = None
+        self._etags = itertools.count(1)
+
+    def _key(self, item, partition_key):
+        return (partition_key, item)
+
+    def _store(self, items, partition_key, body):
+        body = copy.deepcopy(body)
+        body['_etag'] = f'"{next(self._etags)}"'
+        items[self._key(body['id'], partition_key)] = body
+        return copy.deepcopy(body)
+
+    def _existing(self, items, item, partition_key, if_match_etag=None):
+        doc = items.get(self._key(item, partition_key))
+        if doc is None:
+            raise _error(exceptions.CosmosResourceNotFoundError, 404, f'{item} not found')
+        if if_match_etag is not None and doc['_etag'] != if_match_etag:
+            raise _error(exceptions.CosmosAccessConditionFailedError, 412, f'{item} changed')
+        return doc
+
+    # -- point operations, applied to ``items`` (the container's or a batch's copy)
+
+    def _create(self, items, partition_key, body):
+        if self._key(body['id'], partition_key) in items:
+            raise _error(exceptions.CosmosResourceExistsError, 409, f'{body["id"]} exists')
+        return self._store(items, partition_key, body)
+
+    def _upsert(self, items, partition_key, body):
+        return self._store(items, partition_key, body)
+
+    def _replace(self, items, partition_key, item, body, if_match_etag=None):
+        self._existing(items, item, partition_key, if_match_etag)
+        return self._store(items, partition_key, dict(body, id=item))
+
+    def _patch(self, items, partition_key, item, operations, if_match_etag=None):
+        doc = copy.deepcopy(self._existing(items, item, partition_key, if_match_etag))
+        for op in operations:
+            field = op['path'].strip('/').split('/')[0]
+            if op['op'] == 'remove':
+                doc.pop(field, None)
+            elif op['op'] == 'add' and op['path'].endswith('/-'):
+                doc.setdefault(field, []).append(op['value'])
+            else:
+                doc[field] = op['value']
+        return self._store(items, partition_key, doc)
+
+    def _delete(self, items, partition_key, item, if_match_etag=None):
+        self._existing(items, item, partition_key, if_match_etag)
+        del items[self._key(item, partition_key)]
+
+    # -- ContainerProxy
+
+    def read_item(self, item, partition_key):
+        return copy.deepcopy(self._existing(self.items, item, partition_key))
+
+    def create_item(self, body):
+        return self._create(self.items, body['partitionKey'], body)
+
+    def upsert_item(self, body):
+        return self._upsert(self.items, body['partitionKey'], body)
+
+    def replace_item(self, item, body, **kwargs):
+        return self._replace(self.items, body.get('partitionKey', item), item, body, kwargs.get('if_match_etag'))
+
+    def patch_item(self, item, partition_key, patch_operations, **kwargs):
+        return self._patch(self.items, partition_key, item, patch_operations, kwargs.get('if_match_etag'))
+
+    def delete_item(self, item, partition_key):
+        self._delete(self.items, partition_key, item)
+
+    def query_items(self, query, parameters=(), partition_key=None, **kwargs):
+        values = {p['name']: p['value'] for p in parameters}
+        docs = sorted((copy.deepcopy(doc) for (pk, _), doc in self.items.items()
+                       if pk == partition_key and doc.get('type') == values.get('@type')),
+                      key=lambda doc: doc['symbol'])
+        if query.startswith('SELECT VALUE c.symbol'):
+            return [doc['symbol'] for doc in docs]
+        if query.startswith('SELECT c.symbol, c._etag'):
+            return [{'symbol': doc['symbol'], '_etag': doc['_etag']} for doc in docs]
+        if query.startswith('SELECT * FROM c WHERE c.type = @type'):
+            return docs
+        raise NotImplementedError(query)
+
+    def execute_item_batch(self, batch_operations, partition_key):
+        if self.before_batch is not None:
+            self.before_batch(self)
+        self.batches += 1
+
+        items = copy.deepcopy(self.items)
+        results = []
+        for index, operation in enumerate(batch_operations):
+            kind, args = operation[0], operation[1]
+            kwargs = operation[2] if len(operation) > 2 else {}
+            try:
+                results.append(getattr(self, f'_{kind}')(items, partition_key, *args, **kwargs))
+            except exceptions.CosmosHttpResponseError as e:
+                raise exceptions.CosmosBatchOperationError(
+                    error_index=index, headers={}, status_code=e.status_code, message=e.message,
+                    operation_responses=[]) from e
+        self.items = items
+        return results
@@ -0,0 +1,42 @@
+# tests/redis_standin.py
+#
+# An in-memory stand-in with the part of the redis-py client API that
+# cache_backends.CompactRedisCache uses, so it runs without a server. Used by
+# tests/test_cache_backends.py and benchmarks/bench_cache_backends.py.
+
+import time as clock
+
+
+class RedisStandIn:
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _live(self, name):
+        if name in self.expires and self.expires[name] <= clock.time():
+            del self.data[name], self.expires[name]
+        return name in self.data
+
+    def get(self, name):
+        return self.data[name] if self._live(name) else None
+
+    def set(self, name, value):
+        self.data[name] = value
+        self.expires.pop(name, None)
+        return True
+
+    def setex(self, name, value, time):
+        self.set(name, value)
+        self.expires[name] = clock.time() + time
+        return True
+
+    def exists(self, *names):
+        return sum(self._live(name) for name in names)
+
+    def delete(self, *names):
+        removed = sum(self._live(name) for name in names)
+        for name in names:
+            self.data.pop(name, None)
+            self.expires.pop(name, None)
+        return removed
+
@@ -0,0 +1,136 @@
+# tests/test_cache_backends.py
+#
+# The shared stock cache backends in cache_backends.py: SQLiteLRUCache on a
+# temporary file and CompactRedisCache on tests/redis_standin.py.
+#
+#   python -m pytest tests
+
+import os
+import pickle
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+import pytest  # noqa: E402
+
+import stock_cache  # noqa: E402
+from cache_backends import COMPRESS_THRESHOLD, CompactRedisCache, SQLiteLRUCache, compact_dumps  # noqa: E402
+from redis_standin import RedisStandIn  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    return now
+
+
+def stored_blob(cache, key):
+    if isinstance(cache, SQLiteLRUCache):
+        row = cache._conn().execute('SELECT value FROM cache WHERE key = ?', (key,)).fetchone()
+        return bytes(row[0])
+    return cache._read_client.data[key]
+
+
+@pytest.fixture(params=['sqlite', 'redis'])
+def cache(request, tmp_path, clock):
+    if request.param == 'sqlite':
+        return SQLiteLRUCache(str(tmp_path / 'cache.sqlite3'))
+    return CompactRedisCache(host=RedisStandIn())
+
+
+def test_get_set_delete(cache):
+    assert cache.get('stock:quote:AAPL') is None
+
+    assert cache.set('stock:quote:AAPL', {'body': b'{}', 'mimetype': 'application/json'})
+    assert cache.get('stock:quote:AAPL') == {'body': b'{}', 'mimetype': 'application/json'}
+    assert cache.has('stock:quote:AAPL')
+
+    assert cache.set('stock:quote:AAPL', {'body': b'[]'})
+    assert cache.get('stock:quote:AAPL') == {'body': b'[]'}
+
+    assert cache.delete('stock:quote:AAPL')
+    assert cache.get('stock:quote:AAPL') is None
+    assert not cache.delete('stock:quote:AAPL')
+
+
+def test_entries_expire_after_their_timeout(cache, clock):
+    cache.set('short', 1, timeout=10)
+    cache.set('long', 2, timeout=100)
+
+    clock[0] += 9
+    assert (cache.get('short'), cache.get('long')) == (1, 2)
+
+    clock[0] += 2
+    assert cache.get('short') is None
+    assert not cache.has('short')
+    assert cache.get('long') == 2
+
+
+def test_large_values_round_trip_compressed(cache):
+    value = {'body': b'{"time": "2024-01-02", "close": 187.15}, ' * 500, 'mimetype': 'application/json'}
+
+    cache.set('big', value)
+
+    blob = stored_blob(cache, 'big')
+    assert blob[:1] == b'z'
+    assert len(blob) < len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)) / 4
+    assert cache.get('big') == value
+
+
+def test_small_values_are_stored_uncompressed(cache):
+    cache.set('small', {'body': b'{}'})
+
+    assert stored_blob(cache, 'small')[:1] == b'!'
+    assert cache.get('small') == {'body': b'{}'}
+
+
+def entry():
+    # Incompressible and under COMPRESS_THRESHOLD, so every entry has the same size.
+    return {'body': os.urandom(COMPRESS_THRESHOLD // 2)}
+
+
+def test_sqlite_evicts_least_recently_read_entries_past_max_bytes(tmp_path, clock):
+    size = len(compact_dumps(entry()))
+    cache = SQLiteLRUCache(str(tmp_path / 'cache.sqlite3'), max_bytes=3 * size)
+    for key in 'abc':
+        cache.set(key, entry())
+        clock[0] += 2
+    assert cache.get('a') is not None
+    clock[0] += 2
+
+    cache.set('d', entry())
+
+    assert [key for key in 'abcd' if cache.has(key)] == ['a', 'c', 'd']
+    assert cache.size_bytes() <= 3 * size
+
+
+def test_sqlite_evicts_expired_entries_before_live_ones(tmp_path, clock):
+    size = len(compact_dumps(entry()))
+    cache = SQLiteLRUCache(str(tmp_path / 'cache.sqlite3'), max_bytes=3 * size)
+    cache.set('old', entry())
+    clock[0] += 1
+    cache.set('expiring', entry(), timeout=5)
+    cache.set('new', entry())
+    clock[0] += 10
+
+    cache.set('newest', entry())
+
+    assert [key for key in ('old', 'expiring', 'new', 'newest') if cache.has(key)] == ['old', 'new', 'newest']
+
+
+def test_sqlite_is_shared_between_instances_on_one_file(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    SQLiteLRUCache(path).set('stock:quote:AAPL', 1)
+
+    assert SQLiteLRUCache(path).get('stock:quote:AAPL') == 1
+
+
+def test_redis_backend_without_the_redis_package_is_a_config_error(monkeypatch):
+    monkeypatch.setattr(stock_cache.importlib.util, 'find_spec', lambda name: None)
+
+    with pytest.raises(ValueError, match='redis package'):
+        stock_cache.cache_config('redis')
@@ -0,0 +1,103 @@
+# tests/test_embedding_backends.py
+#
+# The ONNX backends against torch, on a random-weight model shaped like
+# all-MiniLM-L6-v2 (benchmarks/embedding_fixture.py, so the hub isn't
+# needed), and the embedding server's round trip and address checks. The
+# backend tests are skipped unless torch, sentence-transformers, onnx and
+# onnxruntime are installed.
+#
+#   python -m pytest tests
+
+import os
+import sys
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+import embedding_backends  # noqa: E402
+import embedding_server  # noqa: E402
+
+# Lowest per-text cosine similarity to the torch embedding.
+TOLERANCE = {'onnx': 0.9999, 'onnx-int8': 0.999}
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    for module in ('torch', 'sentence_transformers', 'transformers', 'onnx', 'onnxruntime', 'tokenizers'):
+        pytest.importorskip(module)
+    import embedding_fixture
+
+    texts = embedding_fixture.documents(40)
+    model_path = str(tmp_path_factory.mktemp('model'))
+    embedding_fixture.offline_model(texts).save(model_path)
+    onnx_dir = str(tmp_path_factory.mktemp('onnx'))
+    embedding_backends.export_onnx(model_path, onnx_dir)
+    torch_backend = embedding_backends.load_backend('torch', threads=1, model_name=model_path)
+    return model_path, onnx_dir, texts, torch_backend.encode(texts, batch_size=8)
+
+
+@pytest.mark.parametrize('name', sorted(TOLERANCE))
+def test_onnx_backends_match_torch(exported, name):
+    model_path, onnx_dir, texts, expected = exported
+
+    backend = embedding_backends.load_backend(name, threads=1, model_name=model_path, model_dir=onnx_dir)
+    embeddings = backend.encode(texts, batch_size=8)
+
+    assert embeddings.dtype == np.float32
+    assert embeddings.shape == expected.shape
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1, atol=1e-3)
+    assert (embeddings * expected).sum(axis=1).min() >= TOLERANCE[name]
+
+
+class FakeBackend:
+    name = 'fake'
+    threads = 1
+
+    def encode(self, texts, batch_size=32):
+        return np.array([[len(text), batch_size] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    return str(tmp_path / 'embeddings.sock')
+
+
+@pytest.mark.parametrize('authkey', ['', 'a-secret'])
+def test_server_round_trip_over_a_private_unix_socket(socket_path, authkey):
+    server = embedding_server.EmbeddingServer(FakeBackend(), socket_path, authkey)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    remote = embedding_server.RemoteBackend(socket_path, authkey, connect_timeout=10)
+
+    assert remote.name == 'remote:fake'
+    assert remote.encode(['ab', 'abcd'], batch_size=4).tolist() == [[2, 4], [4, 4]]
+    assert remote.info()['texts'] == 2
+    assert os.stat(socket_path).st_mode & 0o777 == 0o600
+
+
+def test_wrong_authkey_is_rejected(socket_path):
+    server = embedding_server.EmbeddingServer(FakeBackend(), socket_path, 'a-secret')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    embedding_server.RemoteBackend(socket_path, 'a-secret', connect_timeout=10)
+
+    with pytest.raises(Exception):
+        embedding_server.RemoteBackend(socket_path, 'another-secret', connect_timeout=10)
+
+
+@pytest.mark.parametrize('authkey', ['', 'embeddings'])
+def test_tcp_needs_a_real_secret(monkeypatch, authkey):
+    monkeypatch.setattr(embedding_server.config, 'EMBED_SERVER_AUTHKEY', authkey)
+
+    with pytest.raises(ValueError, match='EMBED_SERVER_AUTHKEY'):
+        embedding_server.EmbeddingServer(FakeBackend(), '127.0.0.1:7070')
+    with pytest.raises(ValueError, match='EMBED_SERVER_AUTHKEY'):
+        embedding_server.RemoteBackend('127.0.0.1:7070', connect_timeout=0)
+
+
+def test_tcp_with_a_long_secret_is_allowed():
+    assert embedding_server.authkey_for(('127.0.0.1', 7070), 'k' * 32) == b'k' * 32
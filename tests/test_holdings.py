@@ -0,0 +1,216 @@
+# tests/test_holdings.py
+#
+# The per-position holdings repository (holdings.py), the portfolio routes'
+# 409 on conflicts, and migrate_holdings.migrate_user, on the in-memory
+# container in tests/fake_cosmos.py.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'simple')
+
+import pytest  # noqa: E402
+
+import migrate_holdings  # noqa: E402
+from fake_cosmos import FakeContainer  # noqa: E402
+from holdings import HoldingsConflict, HoldingsRepository, holding_id, new_holding  # noqa: E402
+from users import UserRepository  # noqa: E402
+
+EMAIL = 'ada@example.com'
+
+
+def lot(symbol, quantity=1):
+    return {'symbol': symbol, 'quantity': quantity}
+
+
+@pytest.fixture
+def container():
+    container = FakeContainer()
+    UserRepository(container).create({'email': EMAIL})
+    return container
+
+
+def lots_by_symbol(container):
+    return {holding['symbol']: holding['lots'] for holding in HoldingsRepository(container).all(EMAIL)}
+
+
+def test_apply_creates_appends_and_removes_in_one_batch(container):
+    repo = HoldingsRepository(container)
+    repo.add(EMAIL, lot('AAPL'))
+    repo.add(EMAIL, lot('MSFT'))
+    batches = container.batches
+
+    repo.apply(EMAIL, add=[lot('aapl', 2), lot('NVDA')], remove=['msft'])
+
+    assert container.batches == batches + 1
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL'), lot('aapl', 2)], 'NVDA': [lot('NVDA')]}
+
+
+def test_apply_replaces_a_position_that_is_removed_and_added(container):
+    repo = HoldingsRepository(container)
+    repo.add(EMAIL, lot('AAPL'))
+
+    repo.apply(EMAIL, add=[lot('AAPL', 5)], remove=['AAPL'])
+
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL', 5)]}
+
+
+def test_apply_rejects_lots_without_a_symbol(container):
+    with pytest.raises(ValueError):
+        HoldingsRepository(container).apply(EMAIL, add=[{'quantity': 1}])
+    assert container.batches == 0
+
+
+def test_apply_retries_when_a_position_is_created_concurrently(container):
+    def concurrent_add(container):
+        container.before_batch = None
+        HoldingsRepository(container).add(EMAIL, lot('AAPL', 7))
+    container.before_batch = concurrent_add
+
+    HoldingsRepository(container).apply(EMAIL, add=[lot('AAPL')])
+
+    assert container.batches == 2
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL', 7), lot('AAPL')]}
+
+
+def test_apply_gives_up_with_a_conflict_after_max_retries(container):
+    def concurrent_toggle(container):
+        repo = HoldingsRepository(container)
+        if repo.get(EMAIL, 'AAPL'):
+            container.delete_item(item=holding_id('AAPL'), partition_key=EMAIL)
+        else:
+            repo.add(EMAIL, lot('AAPL', 7))
+    container.before_batch = concurrent_toggle
+
+    with pytest.raises(HoldingsConflict):
+        HoldingsRepository(container, max_retries=3).apply(EMAIL, add=[lot('AAPL')])
+    assert container.batches == 3
+
+
+@pytest.fixture
+def client(container, monkeypatch):
+    import app as app_module
+    import db
+
+    monkeypatch.setattr(db.container, '_value', container)
+    monkeypatch.setattr(db.container, '_ready', True)
+    with app_module.app.test_client() as http:
+        yield http
+
+
+@pytest.mark.parametrize('path, body', [
+    ('/user/{}/portfolio', {'stock': lot('AAPL')}),
+    ('/user/{}/portfolio/batch', {'add': [lot('AAPL')]}),
+])
+def test_portfolio_routes_answer_409_on_conflicts(client, monkeypatch, path, body):
+    def conflict(self, *args, **kwargs):
+        raise HoldingsConflict('changed concurrently')
+    monkeypatch.setattr(HoldingsRepository, 'add', conflict)
+    monkeypatch.setattr(HoldingsRepository, 'apply', conflict)
+
+    response = client.post(path.format(EMAIL), json=body)
+
+    assert response.status_code == 409
+    assert response.get_json()['message'] == 'Portfolio was modified concurrently, please retry'
+
+
+def test_batch_route_applies_changes(client, container):
+    response = client.post(f'/user/{EMAIL}/portfolio/batch', json={'add': [lot('AAPL'), lot('MSFT')]})
+
+    assert response.status_code == 200
+    assert response.get_json()['portfolio'] == [lot('AAPL'), lot('MSFT')]
+
+
+def legacy_user(container, portfolio, email=EMAIL):
+    user = container.read_item(item=email, partition_key=email)
+    user['portfolio'] = portfolio
+    return container.replace_item(item=email, body=user)
+
+
+def test_migrate_user_moves_lots_into_positions(container):
+    HoldingsRepository(container).add(EMAIL, lot('AAPL', 3))
+    user = legacy_user(container, [lot('AAPL'), lot('msft'), lot('MSFT', 2)])
+
+    assert migrate_holdings.migrate_user(container, user) == ('migrated', '2 positions')
+
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL', 3), lot('AAPL')],
+                                         'MSFT': [lot('msft'), lot('MSFT', 2)]}
+    assert 'portfolio' not in container.read_item(item=EMAIL, partition_key=EMAIL)
+
+
+def test_migrate_user_dry_run_writes_nothing(container):
+    user = legacy_user(container, [lot('AAPL')])
+
+    assert migrate_holdings.migrate_user(container, user, dry_run=True) == ('would migrate', '1 positions')
+    assert container.batches == 0
+    assert 'portfolio' in container.read_item(item=EMAIL, partition_key=EMAIL)
+
+
+@pytest.mark.parametrize('change, reason', [
+    (lambda user: user.pop('partitionKey'), 'user document has no email partition key'),
+    (lambda user: user['portfolio'].append({'quantity': 1}), 'portfolio has lots without a symbol'),
+])
+def test_migrate_user_skips_documents_it_cannot_migrate(container, change, reason):
+    user = legacy_user(container, [lot('AAPL')])
+    change(user)
+
+    assert migrate_holdings.migrate_user(container, user) == ('skipped', reason)
+    assert container.batches == 0
+
+
+def test_migrate_user_keeps_lots_added_concurrently_to_an_existing_position(container):
+    HoldingsRepository(container).add(EMAIL, lot('AAPL', 3))
+    user = legacy_user(container, [lot('AAPL')])
+
+    def concurrent_add(container):
+        container.before_batch = None
+        HoldingsRepository(container).add(EMAIL, lot('AAPL', 9))
+    container.before_batch = concurrent_add
+
+    assert migrate_holdings.migrate_user(container, user) == ('migrated', '1 positions')
+    assert container.batches == 2
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL', 3), lot('AAPL', 9), lot('AAPL')]}
+
+
+def test_migrate_user_does_not_overwrite_a_position_created_concurrently(container):
+    user = legacy_user(container, [lot('AAPL')])
+
+    def concurrent_add(container):
+        container.before_batch = None
+        container.create_item(body=new_holding(EMAIL, 'AAPL', [lot('AAPL', 9)]))
+    container.before_batch = concurrent_add
+
+    assert migrate_holdings.migrate_user(container, user) == ('migrated', '1 positions')
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL', 9), lot('AAPL')]}
+
+
+def test_migrate_user_notices_a_concurrent_run(container):
+    user = legacy_user(container, [lot('AAPL')])
+
+    def concurrent_run(container):
+        container.before_batch = None
+        migrate_holdings.migrate_user(container, container.read_item(item=EMAIL, partition_key=EMAIL))
+    container.before_batch = concurrent_run
+
+    assert migrate_holdings.migrate_user(container, user) == ('migrated', 'by a concurrent run')
+    assert lots_by_symbol(container) == {'AAPL': [lot('AAPL')]}
+
+
+def test_migrate_user_fails_when_the_user_keeps_changing(container):
+    user = legacy_user(container, [lot('AAPL')])
+
+    def concurrent_edit(container):
+        current = container.read_item(item=EMAIL, partition_key=EMAIL)
+        container.replace_item(item=EMAIL, body=current)
+    container.before_batch = concurrent_edit
+
+    assert migrate_holdings.migrate_user(container, user, max_retries=3) == \
+        ('failed', 'kept conflicting with concurrent edits')
+    assert container.batches == 3
+    assert lots_by_symbol(container) == {}
@@ -0,0 +1,117 @@
+# tests/test_indicators.py
+#
+# indicators.evaluate against a fresh compute: a memo extended by new bars
+# must give the same columns, and a memo that doesn't line up with the bars
+# (different first bar, revised last close) must not be reused.
+#
+#   python -m pytest tests
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'simple')
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+from flask import Flask  # noqa: E402
+
+import indicators  # noqa: E402
+import stock_cache  # noqa: E402
+from timeseries import Bars  # noqa: E402
+
+SPECS = ['sma:5', 'ema:10', 'rsi:14', 'macd:12:26:9', 'bbands:20:2']
+
+
+@pytest.fixture(autouse=True)
+def memo():
+    app = Flask(__name__)
+    stock_cache.init_app(app)
+    with app.app_context():
+        yield stock_cache.cache
+
+
+def make_bars(count, seed=11):
+    rng = np.random.default_rng(seed)
+    dates = np.busday_offset('2024-01-02', np.arange(count), roll='forward').astype('datetime64[D]')
+    return Bars(dates, {'close': 100 + np.cumsum(rng.normal(0, 1, count))})
+
+
+def counting(indicator):
+    calls = []
+    compute = indicator.compute
+
+    def wrapper(close):
+        calls.append(len(close))
+        return compute(close)
+    indicator.compute = wrapper
+    return calls
+
+
+def assert_matches_fresh_compute(spec, columns, bars):
+    expected, _ = indicators.parse_spec(spec).compute(bars.columns['close'])
+    assert set(columns) == set(expected)
+    for name in expected:
+        np.testing.assert_allclose(columns[name], expected[name], rtol=1e-9, atol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_memo_extended_by_new_bars_matches_a_fresh_compute(spec):
+    indicator = indicators.parse_spec(spec)
+    calls = counting(indicator)
+    bars = make_bars(80)
+
+    indicators.evaluate('AAPL', 'daily', 'compact', indicator, bars.slice(end=bars.dates[78]))
+    after_one = indicators.evaluate('AAPL', 'daily', 'compact', indicator, bars)
+
+    assert calls == [79]
+    assert_matches_fresh_compute(spec, after_one, bars)
+
+    more = make_bars(83)
+    after_three = indicators.evaluate('AAPL', 'daily', 'compact', indicator, more)
+
+    assert calls == [79]
+    assert_matches_fresh_compute(spec, after_three, more)
+
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_memo_is_not_reused_when_the_first_bar_differs(spec):
+    indicator = indicators.parse_spec(spec)
+    calls = counting(indicator)
+    bars = make_bars(81)
+
+    indicators.evaluate('AAPL', 'daily', 'compact', indicator, bars.slice(end=bars.dates[79]))
+    # A compact window that slid forward by a bar.
+    slid = bars.slice(start=bars.dates[1])
+    columns = indicators.evaluate('AAPL', 'daily', 'compact', indicator, slid)
+
+    assert calls == [80, 80]
+    assert_matches_fresh_compute(spec, columns, slid)
+
+
+@pytest.mark.parametrize('spec', SPECS)
+def test_memo_is_not_reused_when_the_last_close_was_revised(spec):
+    indicator = indicators.parse_spec(spec)
+    calls = counting(indicator)
+    bars = make_bars(81)
+
+    indicators.evaluate('AAPL', 'daily', 'compact', indicator, bars.slice(end=bars.dates[79]))
+    revised = Bars(bars.dates, {'close': bars.columns['close'].copy()})
+    revised.columns['close'][79] += 2.5
+    columns = indicators.evaluate('AAPL', 'daily', 'compact', indicator, revised)
+
+    assert calls == [80, 81]
+    assert_matches_fresh_compute(spec, columns, revised)
+
+
+def test_unchanged_bars_are_served_from_the_memo():
+    indicator = indicators.parse_spec('rsi:14')
+    calls = counting(indicator)
+    bars = make_bars(60)
+
+    first = indicators.evaluate('AAPL', 'daily', 'compact', indicator, bars)
+    again = indicators.evaluate('AAPL', 'daily', 'compact', indicator, bars)
+
+    assert calls == [60]
+    np.testing.assert_array_equal(first['value'], again['value'])
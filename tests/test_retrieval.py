@@ -0,0 +1,285 @@
+# tests/test_retrieval.py
+#
+# retrieval.py and the /query route: request validation, ``where``
+# building, the query embedding LRU, and Retriever.search on an in-memory
+# Chroma collection, where exact ranking must agree with collection.query
+# and superseded versions are dropped. The Chroma tests are skipped unless
+# chromadb is installed.
+#
+#   python -m pytest tests
+
+import os
+import sys
+import uuid
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'simple')
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+import config  # noqa: E402
+import retrieval  # noqa: E402
+
+SYMBOLS = ['AAPL', 'MSFT', 'NVDA']
+FUNCTIONS = ['OVERVIEW', 'NEWS_SENTIMENT']
+DIM = 16
+
+
+def embed(texts):
+    """Deterministic stand-in for the embedding model."""
+    return [np.random.default_rng(zlib.crc32(text.encode())).normal(size=DIM).tolist() for text in texts]
+
+
+class CountingEncoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return embed(texts)
+
+
+# -- parse_queries
+
+
+def test_parse_queries_single_query_with_defaults():
+    assert retrieval.parse_queries({'query': 'AAPL guidance'}) == [{
+        'query': 'AAPL guidance', 'where': None, 'n_results': config.QUERY_DEFAULT_RESULTS,
+        'include_history': False}]
+
+
+def test_parse_queries_batch_inherits_top_level_filters():
+    specs = retrieval.parse_queries({
+        'symbol': 'aapl', 'n_results': 3,
+        'queries': [{'query': 'margins'}, {'query': 'lawsuit', 'symbol': 'msft,nvda', 'n_results': 7,
+                                           'include_history': True}],
+    })
+
+    assert specs == [
+        {'query': 'margins', 'where': {'symbol': 'AAPL'}, 'n_results': 3, 'include_history': False},
+        {'query': 'lawsuit', 'where': {'symbol': {'$in': ['MSFT', 'NVDA']}}, 'n_results': 7,
+         'include_history': True},
+    ]
+
+
+@pytest.mark.parametrize('body, message', [
+    (None, 'Expected a JSON object.'),
+    (['query'], 'Expected a JSON object.'),
+    ({}, 'Please provide a query'),
+    ({'query': '   '}, 'Please provide a query'),
+    ({'query': 42}, 'Please provide a query'),
+    ({'queries': []}, 'queries must be a non-empty list.'),
+    ({'queries': 'AAPL'}, 'queries must be a non-empty list.'),
+    ({'queries': ['AAPL']}, 'Please provide a query'),
+    ({'query': 'x', 'n_results': 'ten'}, 'Invalid n_results: ten'),
+    ({'query': 'x', 'n_results': 0}, 'n_results must be between 1'),
+    ({'query': 'x', 'n_results': config.QUERY_MAX_RESULTS + 1}, 'n_results must be between 1'),
+    ({'queries': [{'query': 'x'}] * (config.QUERY_MAX_BATCH + 1)}, 'queries per request'),
+])
+def test_parse_queries_rejects_invalid_bodies(body, message):
+    with pytest.raises(ValueError, match=message.replace('.', r'\.')):
+        retrieval.parse_queries(body)
+
+
+# -- build_where
+
+
+@pytest.mark.parametrize('symbol, function, where', [
+    (None, None, None),
+    ('', ' , ', None),
+    (' aapl ', None, {'symbol': 'AAPL'}),
+    ('msft, aapl,MSFT', None, {'symbol': {'$in': ['AAPL', 'MSFT']}}),
+    (['nvda', 'aapl'], None, {'symbol': {'$in': ['AAPL', 'NVDA']}}),
+    (None, 'overview', {'function': 'OVERVIEW'}),
+    ('aapl', 'overview,news_sentiment',
+     {'$and': [{'symbol': 'AAPL'}, {'function': {'$in': ['NEWS_SENTIMENT', 'OVERVIEW']}}]}),
+    (['aapl', 'msft'], ['overview'],
+     {'$and': [{'symbol': {'$in': ['AAPL', 'MSFT']}}, {'function': 'OVERVIEW'}]}),
+])
+def test_build_where(symbol, function, where):
+    assert retrieval.build_where(symbol, function) == where
+
+
+# -- QueryEmbeddings
+
+
+def test_query_embeddings_lru_counts_hits_and_misses():
+    encoder = CountingEncoder()
+    embeddings = retrieval.QueryEmbeddings(encoder, max_entries=2)
+
+    first = embeddings.get_many(['AAPL  guidance', 'aapl guidance', 'MSFT margins'])
+    assert encoder.calls == [['aapl guidance', 'msft margins']]
+    assert first[0] == first[1] == embed(['aapl guidance'])[0]
+    # Hits are texts already memoized; a repeat within the call is embedded once.
+    assert embeddings.stats() == {'entries': 2, 'hits': 0, 'misses': 2, 'hit_rate': 0.0}
+
+    embeddings.get_many([' aapl GUIDANCE'])
+    assert len(encoder.calls) == 1
+
+    # 'msft margins' is now the least recently used, so it goes first.
+    embeddings.get_many(['nvda demand'])
+    embeddings.get_many(['aapl guidance', 'msft margins'])
+    assert encoder.calls[1:] == [['nvda demand'], ['msft margins']]
+    assert embeddings.stats() == {'entries': 2, 'hits': 2, 'misses': 4, 'hit_rate': pytest.approx(2 / 6)}
+
+
+# -- Retriever on Chroma
+
+
+def documents():
+    rows = []
+    for i in range(90):
+        symbol, function = SYMBOLS[i % 3], FUNCTIONS[i // 3 % 2]
+        # Lower case, as queries are embedded after normalize_query.
+        rows.append((f'{symbol}:{function}:{i}', f'{symbol} {function} document {i}'.lower(),
+                     {'symbol': symbol, 'function': function, 'current': True}))
+    return rows
+
+
+def make_collection(space, superseded=()):
+    chromadb = pytest.importorskip('chromadb')
+    collection = chromadb.EphemeralClient().create_collection(
+        f'test-{uuid.uuid4().hex}', metadata={'hnsw:space': space})
+    rows = documents()
+    ids, texts, metadatas = zip(*rows)
+    collection.add(ids=list(ids), documents=list(texts), metadatas=list(metadatas), embeddings=embed(texts))
+    for doc_id, text, vector in superseded:
+        collection.add(ids=[doc_id], documents=[text], embeddings=[vector],
+                       metadatas=[{'symbol': 'AAPL', 'function': 'OVERVIEW', 'current': False}])
+    return collection
+
+
+QUERIES = ['aapl overview document 0', 'revenue guidance', 'nvda news_sentiment document 5']
+
+
+class CountingCollection:
+    """A collection that counts the ``get`` and ``query`` calls made on it."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.metadata = collection.metadata
+        self.calls = []
+
+    def get(self, **kwargs):
+        self.calls.append('get')
+        return self.collection.get(**kwargs)
+
+    def query(self, **kwargs):
+        self.calls.append('query')
+        return self.collection.query(**kwargs)
+
+
+def symbols_in(where):
+    clause = where['symbol']
+    return set(clause['$in']) if isinstance(clause, dict) else {clause}
+
+
+@pytest.mark.parametrize('space', ['l2', 'cosine'])
+@pytest.mark.parametrize('symbol, function', [
+    ('AAPL', None), ('aapl,nvda', None), ('MSFT', 'overview'), (['AAPL', 'MSFT'], 'overview,news_sentiment'),
+])
+def test_exact_ranking_agrees_with_collection_query(space, symbol, function):
+    collection = make_collection(space)
+    specs = [{'query': query, 'where': retrieval.build_where(symbol, function), 'n_results': 5}
+             for query in QUERIES]
+    embeddings = retrieval.QueryEmbeddings(embed)
+    exact = retrieval.Retriever(CountingCollection(collection), embeddings, versions=0, max_candidates=1000)
+    indexed = retrieval.Retriever(CountingCollection(collection), embeddings, versions=0, max_candidates=0)
+
+    for ours, theirs in zip(exact.search(specs), indexed.search(specs)):
+        assert len(ours) == 5
+        assert [hit['id'] for hit in ours] == [hit['id'] for hit in theirs]
+        np.testing.assert_allclose([hit['distance'] for hit in ours], [hit['distance'] for hit in theirs],
+                                   rtol=1e-4, atol=1e-4)
+        assert {hit['metadata']['symbol'] for hit in ours} <= symbols_in(retrieval.build_where(symbol))
+    # The queries share their filter: one candidate fetch, or one Chroma query.
+    assert exact.collection.calls == ['get']
+    assert indexed.collection.calls == ['query']
+
+
+def test_unfiltered_and_oversized_filters_use_collection_query():
+    collection = make_collection('l2')
+    retriever = retrieval.Retriever(collection, retrieval.QueryEmbeddings(embed), versions=0, max_candidates=10)
+
+    for where in (None, retrieval.build_where('AAPL')):
+        hits = retriever.search([{'query': QUERIES[0], 'where': where, 'n_results': 3}])[0]
+        assert hits[0]['id'] == 'AAPL:OVERVIEW:0'
+        assert hits[0]['distance'] == pytest.approx(0, abs=1e-4)
+
+
+@pytest.mark.parametrize('max_candidates', [1000, 0])
+def test_superseded_versions_are_dropped_unless_history_is_asked_for(max_candidates):
+    target = embed([QUERIES[0]])[0]
+    old = [(f'AAPL:OVERVIEW:0@v{n}', f'old version {n}', target) for n in (1, 2)]
+    collection = make_collection('cosine', superseded=old)
+    retriever = retrieval.Retriever(collection, retrieval.QueryEmbeddings(embed), versions=2,
+                                    max_candidates=max_candidates)
+    where = retrieval.build_where('AAPL', 'overview')
+
+    current, history = retriever.search([
+        {'query': QUERIES[0], 'where': where, 'n_results': 3},
+        {'query': QUERIES[0], 'where': where, 'n_results': 3, 'include_history': True},
+    ])
+
+    assert len(current) == 3
+    assert current[0]['id'] == 'AAPL:OVERVIEW:0'
+    assert all(hit['metadata']['current'] for hit in current)
+    assert {hit['id'] for hit in history} == {'AAPL:OVERVIEW:0', 'AAPL:OVERVIEW:0@v1', 'AAPL:OVERVIEW:0@v2'}
+
+
+def test_exact_search_with_only_superseded_candidates_returns_no_hits():
+    chromadb = pytest.importorskip('chromadb')
+    collection = chromadb.EphemeralClient().create_collection(f'test-{uuid.uuid4().hex}')
+    collection.add(ids=['old'], documents=['old'], embeddings=embed(['old']),
+                   metadatas=[{'symbol': 'AAPL', 'current': False}])
+    retriever = retrieval.Retriever(collection, retrieval.QueryEmbeddings(embed), max_candidates=10)
+
+    assert retriever.search([{'query': 'old', 'where': {'symbol': 'AAPL'}, 'n_results': 2}]) == [[]]
+
+
+# -- /query
+
+
+@pytest.fixture
+def client():
+    import app as app_module
+
+    with app_module.app.test_client() as http:
+        yield http
+
+
+@pytest.mark.parametrize('body', [None, {'query': ''}, {'query': 'x', 'n_results': 0}, {'queries': []}])
+def test_query_route_rejects_invalid_bodies(client, body):
+    response = client.post('/query', json=body) if body is not None else client.post('/query', data='nope')
+
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+
+class FakeModel:
+    def encode(self, texts, batch_size=32):
+        return np.asarray(embed(texts))
+
+
+def test_query_route_answers_single_and_batched_queries(client, monkeypatch):
+    import db
+    import utils
+
+    monkeypatch.setattr(db.collection, '_value', make_collection('l2'))
+    monkeypatch.setattr(db.collection, '_ready', True)
+    monkeypatch.setattr(utils.embedding_model, '_value', FakeModel())
+    monkeypatch.setattr(utils.embedding_model, '_ready', True)
+
+    single = client.post('/query', json={'query': QUERIES[0], 'symbol': 'aapl', 'n_results': 2}).get_json()
+    batched = client.post('/query', json={'queries': [{'query': QUERIES[0]}, {'query': QUERIES[2]}],
+                                          'n_results': 1}).get_json()
+
+    assert single['query'] == QUERIES[0]
+    assert len(single['results']) == 2
+    assert single['results'][0]['id'] == 'AAPL:OVERVIEW:0'
+    assert [[hit['id'] for hit in item['results']] for item in batched['results']] == \
+        [['AAPL:OVERVIEW:0'], ['NVDA:NEWS_SENTIMENT:5']]
@@ -0,0 +1,174 @@
+# tests/test_stock_cache.py
+#
+# Per-endpoint hit and miss counts of the cached stock routes in app.py,
+# served from benchmarks/stub_server.py instead of Alpha Vantage.
+# /stocks/top_movers is left out: it also writes to Cosmos DB. The last
+# tests run app.py and app-new.py (the routes blueprint) on one backend.
+#
+#   python -m pytest tests
+
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+os.environ.setdefault('UPSTREAM_RATE_PER_MINUTE', '0')
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'simple')
+
+import pytest  # noqa: E402
+
+import stock_cache  # noqa: E402
+from cache_backends import SQLiteLRUCache  # noqa: E402
+import upstream  # noqa: E402
+from stub_server import StubServer  # noqa: E402
+
+
+def _bars(count, adjusted=False):
+    bars = {}
+    for i in range(count):
+        price = 100 + i
+        bar = {'1. open': f'{price:.2f}', '2. high': f'{price + 1:.2f}', '3. low': f'{price - 1:.2f}',
+               '4. close': f'{price + 0.5:.2f}'}
+        if adjusted:
+            bar.update({'5. adjusted close': f'{price + 0.5:.2f}', '6. volume': '1000',
+                        '7. dividend amount': '0.0000'})
+        else:
+            bar['5. volume'] = '1000'
+        bars[f'{2020 + i // 336}-{1 + i // 28 % 12:02d}-{1 + i % 28:02d}'] = bar
+    return bars
+
+
+def payload(params):
+    function = params.get('function')
+    symbol = params.get('symbol', params.get('tickers', 'TEST'))
+    if function == 'GLOBAL_QUOTE':
+        return {'Global Quote': {'01. symbol': symbol, '05. price': '123.4500'}}
+    if function == 'TIME_SERIES_DAILY':
+        return {'Meta Data': {'2. Symbol': symbol}, 'Time Series (Daily)': _bars(60)}
+    if function == 'TIME_SERIES_MONTHLY_ADJUSTED':
+        return {'Meta Data': {'2. Symbol': symbol}, 'Monthly Adjusted Time Series': _bars(24, adjusted=True)}
+    if function == 'NEWS_SENTIMENT':
+        return {'items': '1', 'feed': [{'title': f'{symbol} beats estimates', 'url': f'https://example.com/{symbol}',
+                                        'time_published': '20241015T120000', 'source': 'Reuters',
+                                        'overall_sentiment_score': 0.3}]}
+    return {'Symbol': symbol, 'function': function, 'data': []}
+
+
+# endpoint -> (query string, the same request spelled differently, another symbol)
+REQUESTS = {
+    'quote': ('symbol=AAPL', 'symbol=aapl&_=1', 'symbol=MSFT'),
+    'overview': ('symbol=AAPL', 'symbol=%20aapl', 'symbol=MSFT'),
+    'income_statement': ('symbol=AAPL', 'symbol=aapl', 'symbol=MSFT'),
+    'insider_transactions': ('symbol=AAPL', 'symbol=Aapl', 'symbol=MSFT'),
+    'news': ('symbol=AAPL', 'symbol=aapl&utm_source=x', 'symbol=MSFT'),
+    'daily': ('symbol=AAPL', 'symbol=aapl&outputsize=compact', 'symbol=MSFT'),
+    'time_series': ('symbol=AAPL', 'symbol=aapl&function=TIME_SERIES_DAILY&format=rows', 'symbol=MSFT'),
+    'time_series_monthly': ('symbol=AAPL&resample=q', 'symbol=aapl&resample=Q', 'symbol=MSFT&resample=Q'),
+    'indicators': ('symbol=AAPL&indicators=SMA:5', 'symbol=aapl&indicators=sma:5', 'symbol=MSFT&indicators=sma:5'),
+}
+
+
+@pytest.fixture
+def client():
+    import app as app_module
+
+    with StubServer(payload) as stub:
+        previous = upstream._client
+        upstream._client = upstream.UpstreamClient(base_url=stub.url)
+        # Outside a context the cache resolves to whichever app was initialised last.
+        with app_module.app.app_context():
+            stock_cache.cache.clear()
+        with stock_cache._stats_lock:
+            stock_cache._stats.clear()
+        try:
+            with app_module.app.test_client() as http:
+                http.stub = stub
+                yield http
+        finally:
+            upstream._client.close()
+            upstream._client = previous
+
+
+@pytest.mark.parametrize('endpoint', sorted(REQUESTS))
+def test_hits_and_misses_per_endpoint(client, endpoint):
+    first, same, other = REQUESTS[endpoint]
+
+    statuses = [client.get(f'/stocks/{endpoint}?{query}') for query in (first, same, first, other, same)]
+    assert [r.status_code for r in statuses] == [200] * 5
+    assert [r.headers['X-Cache'] for r in statuses] == ['MISS', 'HIT', 'HIT', 'MISS', 'HIT']
+
+    counters = stock_cache.stats()[endpoint]
+    assert (counters['hits'], counters['misses']) == (3, 2)
+    assert counters['hit_rate'] == pytest.approx(0.6)
+    assert client.stub.calls == 2
+
+
+def test_endpoints_do_not_share_entries(client):
+    for endpoint in ('overview', 'income_statement', 'insider_transactions'):
+        assert client.get(f'/stocks/{endpoint}?symbol=AAPL').headers['X-Cache'] == 'MISS'
+    assert client.stub.calls == 3
+    assert all(counters['hits'] == 0 for counters in stock_cache.stats().values())
+
+
+@pytest.mark.parametrize('query', ['format=ROWS', 'function=time_series_daily', 'outputsize=COMPACT'])
+def test_values_the_view_rejects_are_not_served_from_the_valid_entry(client, query):
+    assert client.get('/stocks/time_series?symbol=AAPL').status_code == 200
+
+    response = client.get(f'/stocks/time_series?symbol=AAPL&{query}')
+    assert response.status_code == 400
+    assert response.headers['X-Cache'] == 'MISS'
+    assert stock_cache.stats()['time_series']['hits'] == 0
+
+
+def test_cache_key_normalizes_only_the_symbol_and_case_insensitive_params():
+    assert stock_cache.cache_key('time_series', ' aapl ', {'format': 'rows'}) == \
+        stock_cache.cache_key('time_series', 'AAPL', {'format': 'rows'})
+    assert stock_cache.cache_key('time_series', 'AAPL', {'format': 'ROWS'}) != \
+        stock_cache.cache_key('time_series', 'AAPL', {'format': 'rows'})
+    assert stock_cache.cache_key('news', 'AAPL', {'rank': 'TRUE'}) == \
+        stock_cache.cache_key('news', 'AAPL', {'rank': 'true'})
+    assert stock_cache.cache_key('time_series', 'AAPL', {'resample': 'w'}) == \
+        stock_cache.cache_key('time_series', 'AAPL', {'resample': 'W'})
+
+
+def load_app_new():
+    spec = importlib.util.spec_from_file_location('app_new', os.path.join(ROOT, 'app-new.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.app
+
+
+@pytest.fixture
+def both_apps(tmp_path, monkeypatch):
+    import app as app_module
+    import routes
+
+    apps = [app_module.app, load_app_new()]
+    shared = SQLiteLRUCache(str(tmp_path / 'stock_cache.sqlite3'))
+    for flask_app in apps:
+        monkeypatch.setitem(flask_app.extensions['cache'], stock_cache.cache, shared)
+    monkeypatch.setattr(routes.embedding_pipeline, 'submit', lambda *args, **kwargs: None)
+
+    with StubServer(payload) as stub:
+        previous = upstream._client
+        upstream._client = upstream.UpstreamClient(base_url=stub.url)
+        try:
+            yield [flask_app.test_client() for flask_app in apps]
+        finally:
+            upstream._client.close()
+            upstream._client = previous
+
+
+@pytest.mark.parametrize('endpoint', ['time_series', 'daily', 'news', 'quote'])
+def test_apps_sharing_a_backend_keep_their_own_entries(both_apps, endpoint):
+    app_client, routes_client = both_apps
+
+    first = [client.get(f'/stocks/{endpoint}?symbol=AAPL') for client in (app_client, routes_client)]
+    again = [client.get(f'/stocks/{endpoint}?symbol=AAPL') for client in (app_client, routes_client)]
+
+    assert [r.headers['X-Cache'] for r in first] == ['MISS', 'MISS']
+    assert [r.headers['X-Cache'] for r in again] == ['HIT', 'HIT']
+    assert [r.get_json() for r in again] == [r.get_json() for r in first]
+    assert stock_cache.cache_key(endpoint, 'AAPL', namespace='routes') != stock_cache.cache_key(endpoint, 'AAPL')
@@ -0,0 +1,145 @@
+# tests/test_timeseries.py
+#
+# timeseries.Bars: resampling against hand-folded OHLCV bars, slice bounds,
+# and JSON output that strict parsers accept when a column holds NaN or
+# infinities.
+#
+#   python -m pytest tests
+
+import json
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'simple')
+
+import numpy as np  # noqa: E402
+import pytest  # noqa: E402
+
+import timeseries  # noqa: E402
+from timeseries import Bars  # noqa: E402
+
+DATES = ['2024-02-28',                                              # Wed
+         '2024-03-27', '2024-03-28', '2024-03-29', '2024-03-31',    # Wed Thu Fri Sun
+         '2024-04-01', '2024-04-05', '2024-04-07',                  # Mon Fri Sun
+         '2024-04-08', '2024-04-09']                                # Mon Tue
+OPEN = [10.0, 11.0, 12.5, 12.0, 13.0, 14.0, 13.5, 15.0, 16.0, 15.5]
+HIGH = [11.0, 12.0, 14.0, 13.0, 13.5, 15.0, 17.0, 15.5, 16.5, 16.0]
+LOW = [9.0, 10.5, 12.0, 11.0, 12.5, 13.0, 13.0, 14.5, 15.0, 14.0]
+CLOSE = [10.5, 11.5, 13.0, 12.5, 13.2, 14.5, 16.0, 15.2, 15.8, 15.1]
+VOLUME = [100, 200, 300, 400, 500, 600, 700, 800, 900, 1000]
+
+# Rule -> the bars each output bar folds, by index into DATES.
+FOLDS = {
+    # Weeks run Monday to Sunday: both Sundays close the week before them.
+    'W': [[0], [1, 2, 3, 4], [5, 6, 7], [8, 9]],
+    'M': [[0], [1, 2, 3, 4], [5, 6, 7, 8, 9]],
+    'Q': [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]],
+}
+
+
+def make_bars():
+    return Bars(np.array(DATES, dtype='datetime64[D]'), {
+        'open': np.array(OPEN), 'high': np.array(HIGH), 'low': np.array(LOW),
+        'close': np.array(CLOSE), 'volume': np.array(VOLUME, dtype=np.int64),
+    })
+
+
+def strict_loads(text):
+    def reject(constant):
+        raise ValueError(f'{constant} is not JSON')
+    return json.loads(text, parse_constant=reject)
+
+
+@pytest.mark.parametrize('rule', sorted(FOLDS))
+def test_resample_folds_ohlcv_per_period(rule):
+    resampled = make_bars().resample(rule)
+
+    groups = FOLDS[rule]
+    assert resampled.date_strings() == [DATES[group[-1]] for group in groups]
+    assert resampled.columns['open'].tolist() == [OPEN[group[0]] for group in groups]
+    assert resampled.columns['high'].tolist() == [max(HIGH[i] for i in group) for group in groups]
+    assert resampled.columns['low'].tolist() == [min(LOW[i] for i in group) for group in groups]
+    assert resampled.columns['close'].tolist() == [CLOSE[group[-1]] for group in groups]
+    assert resampled.columns['volume'].tolist() == [sum(VOLUME[i] for i in group) for group in groups]
+    assert resampled.columns['volume'].dtype == np.int64
+
+
+def test_resample_sums_dividends_and_keeps_the_last_adjusted_close():
+    bars = Bars(np.array(['2024-01-31', '2024-02-29', '2024-03-28'], dtype='datetime64[D]'), {
+        'adjusted_close': np.array([1.0, 2.0, 3.0]), 'dividend_amount': np.array([0.0, 0.24, 0.0]),
+    })
+
+    quarter = bars.resample('Q')
+
+    assert quarter.date_strings() == ['2024-03-28']
+    assert quarter.columns['adjusted_close'].tolist() == [3.0]
+    assert quarter.columns['dividend_amount'].tolist() == [0.24]
+
+
+def test_resample_rejects_unknown_rules_and_passes_empty_bars_through():
+    with pytest.raises(ValueError):
+        make_bars().resample('D')
+    empty = timeseries.parse({}, timeseries.OHLCV_FIELDS)
+    assert len(empty.resample('W')) == 0
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    (None, None, DATES),
+    ('2024-03-28', '2024-04-05', DATES[2:7]),              # both bounds inclusive
+    ('2024-03-30', '2024-04-06', DATES[4:7]),              # bounds between bars
+    ('2024-01-01', '2024-02-28', DATES[:1]),
+    ('2024-04-09', None, DATES[-1:]),
+    (None, '2024-02-27', []),
+    ('2024-04-10', None, []),
+    ('2024-04-05', '2024-04-01', []),
+])
+def test_slice_bounds(start, end, expected):
+    as_date = lambda value: None if value is None else np.datetime64(value, 'D')  # noqa: E731
+
+    assert make_bars().slice(as_date(start), as_date(end)).date_strings() == expected
+
+
+def test_apply_window_slices_then_resamples_then_limits():
+    bars = timeseries.apply_window(make_bars(), start=np.datetime64('2024-03-28'), resample='W', limit=2)
+
+    assert bars.date_strings() == ['2024-04-07', '2024-04-09']
+    assert bars.columns['volume'].tolist() == [600 + 700 + 800, 900 + 1000]
+
+
+@pytest.mark.parametrize('layout', timeseries.FORMATS)
+def test_to_json_is_valid_with_non_finite_values(layout):
+    bars = make_bars()
+    bars.columns['close'][[1, 4, 8]] = [np.nan, np.inf, -np.inf]
+
+    payload = strict_loads(bars.to_json('AAPL', layout))
+
+    if layout == 'rows':
+        closes = [row['close'] for row in payload['data']]
+        assert payload['data'][0] == {'time': '2024-02-28', 'open': 10.0, 'high': 11.0, 'low': 9.0,
+                                      'close': 10.5, 'volume': 100}
+    else:
+        closes = payload['columns']['close']
+        assert payload['columns']['time'] == DATES
+    assert closes == [None if i in (1, 4, 8) else close for i, close in enumerate(CLOSE)]
+    assert payload['symbol'] == 'AAPL'
+
+
+@pytest.mark.parametrize('layout', timeseries.FORMATS)
+def test_to_json_matches_payload(layout):
+    bars = make_bars()
+    bars.columns['open'][2] = np.nan
+
+    assert strict_loads(bars.to_json('AAPL', layout)) == bars.payload('AAPL', layout)
+
+
+def test_non_finite_upstream_strings_parse_and_serialise_as_null():
+    series = {'2024-04-02': {'1. open': '1.0', '2. high': 'NaN', '3. low': '-inf', '4. close': '1.5',
+                             '5. volume': '10'}}
+
+    bars = timeseries.parse(series, timeseries.OHLCV_FIELDS)
+
+    assert strict_loads(bars.to_json('AAPL'))['data'] == [
+        {'time': '2024-04-02', 'open': 1.0, 'high': None, 'low': None, 'close': 1.5, 'volume': 10}]
+    assert timeseries.json_values(bars.columns['low']) == [None]
@@ -0,0 +1,281 @@
+# timeseries.py
+
+import json
+
+import numpy as np
+
+import config
+import stock_cache
+import upstream
+
+# Output column, Alpha Vantage field, dtype.
+OHLCV_FIELDS = (
+    ('open', '1. open', np.float64),
+    ('high', '2. high', np.float64),
+    ('low', '3. low', np.float64),
+    ('close', '4. close', np.float64),
+    ('volume', '5. volume', np.int64),
+)
+
+ADJUSTED_FIELDS = (
+    ('open', '1. open', np.float64),
+    ('high', '2. high', np.float64),
+    ('low', '3. low', np.float64),
+    ('close', '4. close', np.float64),
+    ('adjusted_close', '5. adjusted close', np.float64),
+    ('volume', '6. volume', np.int64),
+    ('dividend_amount', '7. dividend amount', np.float64),
+)
+
+# Upstream function -> (payload key holding the bars, fields).
+SERIES = {
+    'TIME_SERIES_DAILY': ('Time Series (Daily)', OHLCV_FIELDS),
+    'TIME_SERIES_WEEKLY': ('Weekly Time Series', OHLCV_FIELDS),
+    'TIME_SERIES_MONTHLY': ('Monthly Time Series', OHLCV_FIELDS),
+    'TIME_SERIES_MONTHLY_ADJUSTED': ('Monthly Adjusted Time Series', ADJUSTED_FIELDS),
+}
+
+FORMATS = ('rows', 'columns')
+
+# How each field folds into a coarser bar when resampling.
+AGGREGATES = {
+    'open': 'first',
+    'high': 'max',
+    'low': 'min',
+    'close': 'last',
+    'adjusted_close': 'last',
+    'volume': 'sum',
+    'dividend_amount': 'sum',
+}
+
+RESAMPLE_RULES = ('W', 'M', 'Q')
+
+# Weekly and monthly series that can be derived from a full daily series
+# instead of spending a quota unit on their own upstream call.
+DERIVED = {
+    'TIME_SERIES_WEEKLY': 'W',
+    'TIME_SERIES_MONTHLY': 'M',
+}
+
+
+class Bars:
+    """A price series held column-wise: one sorted datetime64[D] index and
+    one NumPy array per field.
+
+    Built once from the upstream payload and cached in that form, so every
+    response after the first skips string parsing and sorting, and both JSON
+    layouts are produced with a single ``tolist()`` per column.
+    """
+
+    __slots__ = ('dates', 'columns')
+
+    def __init__(self, dates, columns):
+        self.dates = dates
+        self.columns = columns
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def fields(self):
+        return list(self.columns)
+
+    def slice(self, start=None, end=None):
+        """Bars dated within ``[start, end]``, found by binary search on the index."""
+        lo = 0 if start is None else np.searchsorted(self.dates, start, side='left')
+        hi = len(self.dates) if end is None else np.searchsorted(self.dates, end, side='right')
+        return self._take(slice(lo, hi))
+
+    def tail(self, limit):
+        return self._take(slice(max(len(self.dates) - limit, 0), None))
+
+    def _take(self, index):
+        return Bars(self.dates[index], {name: values[index] for name, values in self.columns.items()})
+
+    def resample(self, rule):
+        """Fold bars into weekly (``W``, Monday to Sunday), monthly (``M``) or
+        quarterly (``Q``) OHLCV bars.
+
+        Each output bar is dated on the last trading day of its period, as
+        Alpha Vantage's weekly and monthly series are. A period starts wherever
+        the period label changes between neighbouring dates, and every field
+        is then reduced over the runs in one ``reduceat`` call.
+        """
+        if rule not in RESAMPLE_RULES:
+            raise ValueError(f'Unknown resample rule: {rule}')
+        if not len(self.dates):
+            return self
+
+        if rule == 'W':
+            # Day 0 of datetime64 is a Thursday; shift so weeks start on Monday.
+            labels = (self.dates.astype(np.int64) + 3) // 7
+        else:
+            labels = self.dates.astype('datetime64[M]').astype(np.int64)
+            if rule == 'Q':
+                labels = labels // 3
+
+        starts = np.flatnonzero(np.r_[True, labels[1:] != labels[:-1]])
+        ends = np.r_[starts[1:] - 1, len(labels) - 1]
+        columns = {}
+        for name, values in self.columns.items():
+            how = AGGREGATES.get(name, 'last')
+            if how == 'first':
+                columns[name] = values[starts]
+            elif how == 'last':
+                columns[name] = values[ends]
+            elif how == 'max':
+                columns[name] = np.maximum.reduceat(values, starts)
+            elif how == 'min':
+                columns[name] = np.minimum.reduceat(values, starts)
+            else:
+                columns[name] = np.add.reduceat(values, starts)
+        return Bars(self.dates[ends], columns)
+
+    def date_strings(self):
+        return np.datetime_as_string(self.dates, unit='D').tolist()
+
+    def to_columns(self):
+        result = {'time': self.date_strings()}
+        for name, values in self.columns.items():
+            result[name] = json_values(values)
+        return result
+
+    def to_rows(self):
+        names = ['time'] + self.fields
+        values = [self.date_strings()] + [json_values(column) for column in self.columns.values()]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def payload(self, symbol, layout='rows'):
+        if layout == 'columns':
+            return {'symbol': symbol, 'columns': self.to_columns()}
+        return {'symbol': symbol, 'data': self.to_rows()}
+
+    def rows_json(self):
+        # Format each row from a template instead of building a dict per bar
+        # and walking it with json.dumps. repr() of a finite float is valid
+        # JSON; a column holding NaN or infinities writes those as null.
+        names = ['time'] + self.fields
+        template = '{' + ','.join(f'"{name}":%s' for name in names) + '}'
+        values = [[f'"{date}"' for date in self.date_strings()]]
+        for column in self.columns.values():
+            if _finite(column):
+                values.append(list(map(repr, column.tolist())))
+            else:
+                values.append(['null' if value is None else repr(value) for value in json_values(column)])
+        return '[' + ','.join([template % row for row in zip(*values)]) + ']'
+
+    def to_json(self, symbol, layout='rows'):
+        """Serialise straight to a compact JSON string, same shape as ``payload``."""
+        if layout == 'columns':
+            return json.dumps(self.payload(symbol, layout), separators=(',', ':'))
+        return f'{{"symbol":{json.dumps(symbol)},"data":{self.rows_json()}}}'
+
+
+def _finite(values):
+    return values.dtype.kind != 'f' or bool(np.isfinite(values).all())
+
+
+def json_values(values):
+    """``values.tolist()`` with NaN and infinities, which upstream can send as
+    "NaN" or "inf" and JSON has no spelling for, as None."""
+    if _finite(values):
+        return values.tolist()
+    finite = np.isfinite(values)
+    return [value if ok else None for value, ok in zip(values.tolist(), finite.tolist())]
+
+
+def parse(series, fields):
+    """Turn Alpha Vantage's ``{date: {"1. open": "...", ...}}`` into ``Bars``."""
+    if not series:
+        return Bars(np.array([], dtype='datetime64[D]'),
+                    {name: np.array([], dtype=dtype) for name, _, dtype in fields})
+
+    dates = np.array(list(series), dtype='datetime64[D]')
+    rows = list(series.values())
+    order = np.argsort(dates, kind='stable')
+    columns = {}
+    for name, source, dtype in fields:
+        # NumPy parses the numeric strings itself, in C.
+        columns[name] = np.array([row[source] for row in rows], dtype=dtype)[order]
+    return Bars(dates[order], columns)
+
+
+def from_payload(data, function):
+    key, fields = SERIES[function]
+    if key not in data:
+        return None
+    return parse(data[key], fields)
+
+
+def parse_window(args):
+    """Read ``start``, ``end``, ``limit`` and ``resample`` from a request's
+    query string. Raises ValueError with a client-facing message."""
+    window = {}
+    for name in ('start', 'end'):
+        value = args.get(name)
+        if value:
+            try:
+                window[name] = np.datetime64(value, 'D')
+            except ValueError:
+                raise ValueError(f'Invalid {name} date: {value} (expected YYYY-MM-DD)')
+
+    limit = args.get('limit')
+    if limit:
+        try:
+            window['limit'] = int(limit)
+        except ValueError:
+            raise ValueError(f'Invalid limit: {limit}')
+        if window['limit'] < 1:
+            raise ValueError('limit must be positive')
+
+    rule = (args.get('resample') or '').upper()
+    if rule:
+        if rule not in RESAMPLE_RULES:
+            raise ValueError(f'Invalid resample: {rule} (expected one of {", ".join(RESAMPLE_RULES)})')
+        window['resample'] = rule
+    return window
+
+
+def apply_window(bars, start=None, end=None, limit=None, resample=None):
+    """Trim to the date range, resample, then keep the most recent ``limit`` bars."""
+    if start is not None or end is not None:
+        bars = bars.slice(start, end)
+    if resample:
+        bars = bars.resample(resample)
+    if limit:
+        bars = bars.tail(limit)
+    return bars
+
+
+def bars_key(function, symbol, outputsize):
+    return stock_cache.cache_key('bars', symbol, {'function': function, 'outputsize': outputsize})
+
+
+def load(function, symbol, apikey=None, outputsize='compact', endpoint='time_series'):
+    """Return cached ``Bars`` for a symbol, fetching and parsing them on a miss.
+
+    Returns None when the upstream payload has no series (unknown symbol,
+    quota note). ``upstream.UpstreamError`` and ``upstream.RateLimited`` are
+    left for the route to handle. The parsed arrays are cached for the
+    endpoint's TTL under a key of their own, so every output layout shares
+    one upstream call and one parse. Weekly and monthly series are resampled
+    from a cached full daily series when there is one.
+    """
+    symbol = stock_cache.normalize_symbol(symbol)
+    key = bars_key(function, symbol, outputsize)
+    bars = stock_cache.cache.get(key)
+    if bars is not None:
+        return bars
+
+    if function in DERIVED:
+        daily = stock_cache.cache.get(bars_key('TIME_SERIES_DAILY', symbol, 'full'))
+        if daily is not None:
+            return daily.resample(DERIVED[function])
+
+    params = {'function': function, 'symbol': symbol, 'apikey': apikey or config.API_KEY}
+    if outputsize != 'compact':
+        params['outputsize'] = outputsize
+    bars = from_payload(upstream.fetch_json(params), function)
+    if bars is not None:
+        stock_cache.cache.set(key, bars, timeout=stock_cache.ttl_for(endpoint))
+    return bars
@@ -0,0 +1,156 @@
+# upstream.py
+
+import contextlib
+import logging
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import config
+from ratelimit import BACKGROUND, INTERACTIVE, RateLimited, scheduler_from_config
+from singleflight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+_context = threading.local()
+
+
+class UpstreamError(Exception):
+    """Raised when Alpha Vantage can't be reached or returns a non-200 response."""
+
+
+class UpstreamClient:
+    """Keep-alive HTTP client shared by every Alpha Vantage call in the process.
+
+    A single ``requests.Session`` holds a pooled connection per host, so repeated
+    calls reuse the TCP+TLS connection instead of paying a handshake each time.
+    Connection errors and 5xx responses are retried with exponential backoff.
+    Concurrent ``fetch_json`` calls for the same request are coalesced so that
+    only one of them reaches Alpha Vantage, and that one waits for a token from
+    the rate-limit scheduler before it is sent.
+    """
+
+    def __init__(self, base_url=None, pool_size=None, connect_timeout=None,
+                 read_timeout=None, max_retries=None, backoff_factor=None, scheduler=None):
+        self.base_url = base_url or config.ALPHA_VANTAGE_URL
+        self.pool_size = pool_size or config.UPSTREAM_POOL_SIZE
+        self.timeout = (
+            connect_timeout if connect_timeout is not None else config.UPSTREAM_CONNECT_TIMEOUT,
+            read_timeout if read_timeout is not None else config.UPSTREAM_READ_TIMEOUT,
+        )
+        retries = Retry(
+            total=max_retries if max_retries is not None else config.UPSTREAM_MAX_RETRIES,
+            backoff_factor=backoff_factor if backoff_factor is not None else config.UPSTREAM_BACKOFF_FACTOR,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size,
+                              max_retries=retries, pool_block=True)
+
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self.flight = SingleFlight()
+        self.scheduler = scheduler or scheduler_from_config()
+
+    def get(self, params):
+        try:
+            return self.session.get(self.base_url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise UpstreamError(str(e)) from e
+
+    def fetch_json(self, params, coalesce=True, priority=None):
+        if priority is None:
+            priority = current_priority()
+        if not coalesce:
+            return self._fetch_json(params, priority)
+        return self.flight.do(request_key(params), lambda: self._fetch_json(params, priority))
+
+    def _fetch_json(self, params, priority):
+        if self.scheduler is not None:
+            self.scheduler.acquire(priority)
+
+        response = self.get(params)
+
+        logger.debug('Alpha Vantage %s -> %s', params.get('function'), response.status_code)
+
+        if response.status_code != 200:
+            raise UpstreamError(f'Alpha Vantage returned HTTP {response.status_code}')
+
+        try:
+            data = response.json()
+        except ValueError as e:
+            raise UpstreamError('Alpha Vantage returned a non-JSON body') from e
+
+        if is_quota_response(data):
+            # Every call until the quota window resets would get the same
+            # answer, so stop sending them and tell callers when to come back.
+            cooldown = config.UPSTREAM_QUOTA_COOLDOWN
+            if self.scheduler is not None:
+                self.scheduler.block(cooldown)
+            raise RateLimited(data.get('Note') or data.get('Information'), cooldown)
+
+        return data
+
+    def stats(self):
+        stats = {'singleflight': self.flight.stats()}
+        if self.scheduler is not None:
+            stats['scheduler'] = self.scheduler.stats()
+        return stats
+
+    def close(self):
+        self.session.close()
+
+
+@contextlib.contextmanager
+def default_priority(level):
+    """Run upstream fetches on this thread at ``level`` unless a call passes its own."""
+    previous = getattr(_context, 'priority', None)
+    _context.priority = level
+    try:
+        yield
+    finally:
+        _context.priority = previous
+
+
+def current_priority():
+    level = getattr(_context, 'priority', None)
+    return INTERACTIVE if level is None else level
+
+
+def is_quota_response(data):
+    if not isinstance(data, dict):
+        return False
+    if 'Note' in data:
+        return True
+    return 'rate limit' in str(data.get('Information', '')).lower()
+
+
+def request_key(params):
+    # The API key doesn't change what Alpha Vantage returns, so leave it out.
+    return tuple(sorted((k, str(v)) for k, v in params.items() if k != 'apikey'))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = UpstreamClient()
+    return _client
+
+
+def fetch_json(params, coalesce=True, priority=None):
+    return get_client().fetch_json(params, coalesce=coalesce, priority=priority)
+
+
+def stats():
+    return get_client().stats()
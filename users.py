@@ -0,0 +1,78 @@
+# users.py
+
+import azure.cosmos.exceptions as exceptions
+from azure.cosmos.partition_key import NonePartitionKeyValue
+
+
+def request_charge(container):
+    """RU charge of the last operation ``container`` sent, or 0.0 if unknown."""
+    try:
+        headers = container.client_connection.last_response_headers
+        return float(headers.get('x-ms-request-charge', 0))
+    except (AttributeError, TypeError, ValueError):
+        return 0.0
+
+
+class UserRepository:
+    """Reads and writes user documents by partition key.
+
+    Users are stored with ``id == partitionKey == email``, so every lookup is
+    a single-partition point read (~1 RU) instead of a cross-partition query
+    that fans out to every physical partition.
+
+    Documents created by the old auth blueprint have no ``partitionKey`` and
+    live in the undefined partition; with ``legacy_fallback`` a miss is
+    retried there with a second point read before reporting "not found".
+    """
+
+    def __init__(self, container, legacy_fallback=True):
+        self.container = container
+        self.legacy_fallback = legacy_fallback
+
+    def get(self, email):
+        if not email:
+            return None
+        try:
+            return self.container.read_item(item=email, partition_key=email)
+        except exceptions.CosmosResourceNotFoundError:
+            pass
+
+        if not self.legacy_fallback:
+            return None
+        try:
+            return self.container.read_item(item=email, partition_key=NonePartitionKeyValue)
+        except exceptions.CosmosResourceNotFoundError:
+            return None
+
+    def exists(self, email):
+        return self.get(email) is not None
+
+    def create(self, user):
+        user = dict(user, id=user['email'], partitionKey=user['email'])
+        return self.container.create_item(body=user)
+
+    def replace(self, user):
+        return self.container.replace_item(item=user['id'], body=user)
+
+    @staticmethod
+    def partition_key(user):
+        """The partition ``user`` was read from: its email, or the undefined
+        partition for legacy documents."""
+        return user.get('partitionKey', NonePartitionKeyValue)
+
+    def update_password(self, user, hashed_password):
+        return self.container.patch_item(
+            item=user['id'],
+            partition_key=self.partition_key(user),
+            patch_operations=[{'op': 'set', 'path': '/password', 'value': hashed_password}],
+        )
+
+    def remove_portfolio(self, user):
+        """Drop the embedded portfolio array of a user not yet migrated to
+        per-position holdings."""
+        return self.container.patch_item(
+            item=user['id'],
+            partition_key=self.partition_key(user),
+            patch_operations=[{'op': 'remove', 'path': '/portfolio'}],
+        )
+
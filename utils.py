@@ -1,9 +1,32 @@
 # utils.py
 
-from sentence_transformers import SentenceTransformer
+import config
+from lazy import Lazy
 
-# Initialize Embeddings model
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+EMBEDDING_MODEL = config.EMBED_MODEL
+
+
+def load_embedding_model():
+    """The configured embedding backend (see embedding_backends.py): the
+    shared embedding server's when EMBED_SERVER_ADDRESS is set, otherwise
+    one loaded in this process."""
+    if config.EMBED_SERVER_ADDRESS:
+        from embedding_server import RemoteBackend
+
+        return RemoteBackend()
+    import embedding_backends
+
+    return embedding_backends.load_backend(model_name=EMBEDDING_MODEL)
+
+
+# Initialize Embeddings model on first use
+embedding_model = Lazy(load_embedding_model, 'embedding model')
 
 def generate_embedding(text):
     return embedding_model.encode([text])[0].tolist()
+
+
+def encode_batch(texts):
+    """Embeddings for ``texts`` from a single ``encode`` call, which runs the
+    model over at most ``EMBED_BATCH_SIZE`` of them at a time."""
+    return embedding_model.encode(list(texts), batch_size=min(max(len(texts), 1), config.EMBED_BATCH_SIZE)).tolist()
@@ -0,0 +1,151 @@
+# vector_store.py
+#
+# Writes embedded stock data to the Chroma collection.
+#
+# Chunks are upserted, so a refetch replaces what is stored under an id
+# instead of failing or being ignored as collection.add would, and every
+# stored chunk carries the time it was written as ``as_of``. Each payload
+# (``doc_id``) has exactly one current set of chunks: those from its latest
+# fetch. Chunks that drop out of it, like articles that leave a news feed,
+# are retired.
+#
+# With VECTOR_STORE_VERSIONS > 0, a replaced or retired chunk is kept as a
+# history version under ``<id>@<as_of>`` with ``current: False``. The newest
+# VECTOR_STORE_VERSIONS per id are kept, and versions are pruned
+# VECTOR_STORE_HISTORY_TTL seconds after they were superseded. The current
+# set stays one entry per id; history stays bounded by count and age.
+
+import logging
+import threading
+import time
+
+import config
+from stock_cache import normalize_symbol
+
+logger = logging.getLogger(__name__)
+
+VERSION_SEPARATOR = '@'
+
+
+def document_id(symbol, *parts):
+    """The Chroma id for a payload: ``document_id('aapl', 'Daily', 'compact')``
+    -> ``'AAPL_daily_compact'``."""
+    return '_'.join([normalize_symbol(symbol)] + [str(part).strip().lower() for part in parts if part])
+
+
+class VectorStoreWriter:
+    """Bulk upserts with ``as_of`` metadata, retirement of chunks a payload no
+    longer contains, and optional bounded history; see the module docstring.
+
+    ``collection`` may be a ``Lazy``; it is only touched on the first write.
+    """
+
+    def __init__(self, collection, versions=None, history_ttl=None, prune_interval=None):
+        self.collection = collection
+        self.versions = config.VECTOR_STORE_VERSIONS if versions is None else versions
+        self.history_ttl = config.VECTOR_STORE_HISTORY_TTL if history_ttl is None else history_ttl
+        self.prune_interval = config.VECTOR_STORE_PRUNE_INTERVAL if prune_interval is None else prune_interval
+        # doc_id -> the chunk ids its latest payload was split into.
+        self._current = {}
+        self._lock = threading.Lock()
+        self._last_prune = time.time()
+        self._stats = {'upserted': 0, 'archived': 0, 'retired': 0, 'pruned': 0}
+
+    def write(self, ids, embeddings, documents, metadatas, now=None):
+        """Upsert the current version of each chunk in one call."""
+        now = time.time() if now is None else now
+        metadatas = [dict(metadata, key=chunk_id, as_of=int(now), current=True)
+                     for chunk_id, metadata in zip(ids, metadatas)]
+        if self.versions > 0:
+            self._archive(ids, now)
+        self.collection.upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+        self._count('upserted', len(ids))
+        if self.versions > 0 or self.history_ttl > 0:
+            self.maybe_prune(now)
+
+    def retire(self, chunk_ids_by_doc, now=None):
+        """Retire stored chunks of each ``doc_id`` that aren't among its newest
+        chunk ids. Returns the ids that are no longer current."""
+        now = time.time() if now is None else now
+        with self._lock:
+            changed = {doc_id: set(chunk_ids) for doc_id, chunk_ids in chunk_ids_by_doc.items()
+                       if self._current.get(doc_id) != frozenset(chunk_ids)}
+        if not changed:
+            return []
+
+        stored = self.collection.get(where={'$and': [{'doc_id': {'$in': list(changed)}}, {'current': True}]},
+                                     include=['metadatas'])
+        stale = [chunk_id for chunk_id, metadata in zip(stored['ids'], stored['metadatas'])
+                 if chunk_id not in changed.get(metadata.get('doc_id'), (chunk_id,))]
+        # Documents stored before payloads were chunked sit under the bare doc_id.
+        legacy = [doc_id for doc_id, chunk_ids in changed.items() if doc_id not in chunk_ids]
+        if legacy:
+            stale += self.collection.get(ids=legacy, include=[])['ids']
+
+        if stale:
+            if self.versions > 0:
+                self._archive(stale, now)
+            self.collection.delete(ids=stale)
+            self._count('retired', len(stale))
+        with self._lock:
+            for doc_id, chunk_ids in changed.items():
+                self._current[doc_id] = frozenset(chunk_ids)
+        return stale
+
+    def _archive(self, ids, now):
+        existing = self.collection.get(ids=list(ids), include=['embeddings', 'documents', 'metadatas'])
+        if not existing['ids']:
+            return
+        archived_ids, metadatas = [], []
+        for chunk_id, metadata in zip(existing['ids'], existing['metadatas']):
+            metadata = dict(metadata or {}, key=chunk_id, current=False, superseded_at=int(now))
+            metadata.setdefault('as_of', int(now))
+            archived_ids.append(f'{chunk_id}{VERSION_SEPARATOR}{metadata["as_of"]}')
+            metadatas.append(metadata)
+        self.collection.upsert(ids=archived_ids, embeddings=existing['embeddings'],
+                               documents=existing['documents'], metadatas=metadatas)
+        self._count('archived', len(archived_ids))
+        self._trim(existing['ids'])
+
+    def _trim(self, keys):
+        """Keep only the newest ``versions`` history entries for each key."""
+        history = self.collection.get(where={'$and': [{'key': {'$in': list(keys)}}, {'current': False}]},
+                                      include=['metadatas'])
+        by_key = {}
+        for version_id, metadata in zip(history['ids'], history['metadatas']):
+            by_key.setdefault(metadata['key'], []).append((metadata.get('superseded_at', 0), version_id))
+        excess = [version_id for versions in by_key.values()
+                  for _, version_id in sorted(versions, reverse=True)[self.versions:]]
+        if excess:
+            self.collection.delete(ids=excess)
+            self._count('pruned', len(excess))
+
+    def maybe_prune(self, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            if now - self._last_prune < self.prune_interval:
+                return 0
+            self._last_prune = now
+        return self.prune(now)
+
+    def prune(self, now=None):
+        """Delete history versions superseded more than ``history_ttl`` ago."""
+        if self.history_ttl <= 0:
+            return 0
+        now = time.time() if now is None else now
+        expired = self.collection.get(where={'$and': [{'current': False},
+                                                      {'superseded_at': {'$lt': int(now - self.history_ttl)}}]},
+                                      include=[])['ids']
+        if expired:
+            self.collection.delete(ids=expired)
+            self._count('pruned', len(expired))
+        return len(expired)
+
+    def _count(self, name, n):
+        with self._lock:
+            self._stats[name] += n
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, versions=self.versions, history_ttl=self.history_ttl,
+                        tracked_documents=len(self._current))